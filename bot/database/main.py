@@ -1,4 +1,5 @@
-from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from bot.misc.util import CONFIG
 
@@ -13,7 +14,29 @@ else:
         f'@postgres_db_container/{CONFIG.postgres_db}'
     )
 
+# Параметры пула соединений (общий на процесс)
+POOL_SIZE = 20
+MAX_OVERFLOW = 10
+POOL_RECYCLE = 1800
+
+# Размер LRU-кэша скомпилированных запросов (по умолчанию 500)
+QUERY_CACHE_SIZE = 1200
+
+_engine: AsyncEngine | None = None
+
 
 def engine():
-    engine = create_async_engine(ENGINE)
-    return engine
+    # Один движок и пул на процесс: каждый вызов раньше создавал новый пул
+    # и открывал новое соединение с БД
+    global _engine
+    if _engine is None:
+        _engine = create_async_engine(
+            ENGINE,
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=POOL_SIZE,
+            max_overflow=MAX_OVERFLOW,
+            pool_pre_ping=True,
+            pool_recycle=POOL_RECYCLE,
+            query_cache_size=QUERY_CACHE_SIZE,
+        )
+    return _engine
@@ -34,16 +34,18 @@ async def delete_static_user_bd(name):
 
 
 async def delete_promo_code(id_promo):
+    """Удаляет промокод одним запросом (DELETE ... RETURNING), возвращает его текст"""
     async with AsyncSession(autoflush=False, bind=engine()) as db:
-        statement = select(PromoCode).filter(PromoCode.id == id_promo)
+        # Использования удаляются каскадом по FK person_promocode_association
+        statement = delete(PromoCode).where(
+            PromoCode.id == id_promo
+        ).returning(PromoCode.text)
         result = await db.execute(statement)
-        promo_code = result.scalar_one_or_none()
-
-        if promo_code is not None:
-            await db.delete(promo_code)
-            await db.commit()
-        else:
+        promo_text = result.scalar_one_or_none()
+        if promo_text is None:
             raise ModuleNotFoundError
+        await db.commit()
+        return promo_text
 
 
 async def delete_group(group_id):
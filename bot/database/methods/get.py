@@ -6,7 +6,7 @@ import pandas as pd
 from sqlalchemy import and_, or_, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import joinedload, selectinload, raiseload
 
 from bot.database.main import engine
 from bot.database.models.main import (
@@ -16,6 +16,7 @@ from bot.database.models.main import (
     StaticPersons,
     PromoCode,
     WithdrawalRequests, Groups, SuperOffer, AffiliateStatistics,
+    MailingJobs, MailingTargets,
     message_button_association
 )
 from bot.misc.util import CONFIG
@@ -87,6 +88,90 @@ async def get_no_subscription():
         return persons
 
 
+def _mailing_recipients(option: str, server_id: int = None, vpn_type: int = None):
+    """
+    Запрос tgid получателей рассылки.
+    option: all / sub / no / vpn_type / server — как в меню рассылки
+    """
+    statement = select(Persons.tgid).filter(Persons.tgid.isnot(None))
+    if option == 'sub':
+        statement = statement.filter(Persons.banned == False)
+    elif option == 'no':
+        statement = statement.filter(Persons.banned == True)
+    elif option == 'vpn_type':
+        statement = statement.join(Servers, Persons.server == Servers.id).filter(Servers.type_vpn == vpn_type)
+    elif option == 'server':
+        statement = statement.filter(Persons.server == server_id)
+    return statement
+
+
+async def get_unfinished_mailing_jobs():
+    async with AsyncSession(autoflush=False, bind=engine()) as db:
+        statement = select(MailingJobs).filter(MailingJobs.finished == False).order_by(MailingJobs.id)
+        result = await db.execute(statement)
+        return result.scalars().all()
+
+
+async def get_pending_mailing_tgids(job_id: int, limit: int = 1000):
+    """Очередная пачка неотправленных получателей задания (по частичному индексу)"""
+    async with AsyncSession(autoflush=False, bind=engine()) as db:
+        statement = select(MailingTargets.tgid).filter(
+            MailingTargets.job_id == job_id,
+            MailingTargets.status == MailingTargets.PENDING
+        ).order_by(MailingTargets.tgid).limit(limit)
+        result = await db.execute(statement)
+        return result.scalars().all()
+
+
+async def get_mailing_job_counts(job_id: int):
+    """Row(total, sent, failed) по получателям задания"""
+    async with AsyncSession(autoflush=False, bind=engine()) as db:
+        statement = select(
+            func.count().label('total'),
+            func.count().filter(MailingTargets.status == MailingTargets.SENT).label('sent'),
+            func.count().filter(MailingTargets.status == MailingTargets.FAILED).label('failed'),
+        ).filter(MailingTargets.job_id == job_id)
+        result = await db.execute(statement)
+        return result.one()
+
+
+async def get_users_count(banned: bool = None):
+    async with AsyncSession(autoflush=False, bind=engine()) as db:
+        statement = select(func.count(Persons.id))
+        if banned is not None:
+            statement = statement.filter(Persons.banned == banned)
+        result = await db.execute(statement)
+        return result.scalar()
+
+
+async def get_users_stats_rows():
+    """
+    Поля пользователей для подсчёта статистики в админке.
+    Возвращает Row (без ORM-объектов и identity map), атрибуты совпадают с Persons
+    """
+    async with AsyncSession(autoflush=False, bind=engine()) as db:
+        statement = select(
+            Persons.subscription,
+            Persons.banned,
+            Persons.payment_method_id,
+            Persons.retention,
+            Persons.free_trial_used
+        )
+        result = await db.execute(statement)
+        return result.all()
+
+
+async def get_users_for_renew_notification():
+    """Пользователи с подпиской без автооплаты: Row(tgid, subscription)"""
+    async with AsyncSession(autoflush=False, bind=engine()) as db:
+        statement = select(Persons.tgid, Persons.subscription).filter(
+            Persons.payment_method_id.is_(None),
+            Persons.subscription.isnot(None)
+        )
+        result = await db.execute(statement)
+        return result.all()
+
+
 async def get_payments():
     async with AsyncSession(autoflush=False, bind=engine()) as db:
         statement = select(Payments).options(
@@ -122,13 +207,13 @@ async def get_server_id(id_server):
         return server
 
 
-async def get_free_servers(group_name, type_vpn):
+async def get_free_servers(group_id, type_vpn):
     async with AsyncSession(autoflush=False, bind=engine()) as db:
         statement = select(Servers).filter(
             and_(
                 Servers.space < int(CONFIG.max_people_server),
                 Servers.work,
-                Servers.group == group_name,
+                Servers.group_id == group_id,
                 Servers.type_vpn == type_vpn
             )
         )
@@ -149,25 +234,44 @@ async def get_all_static_user():
         return all_static_user
 
 
-async def get_all_promo_code():
+async def get_all_promo_code_with_counts():
+    """Все промокоды с числом использований одним запросом: [(PromoCode, usage_count)]"""
+    async with AsyncSession(autoflush=False, bind=engine()) as db:
+        statement = select(
+            PromoCode,
+            func.count(message_button_association.c.users_id)
+        ).outerjoin(
+            message_button_association,
+            message_button_association.c.promocode_id == PromoCode.id
+        ).group_by(
+            PromoCode.id
+        ).options(
+            raiseload('*')
+        )
+        result = await db.execute(statement)
+        return result.all()
+
+
+async def get_promo_by_id(promo_id: int):
     async with AsyncSession(autoflush=False, bind=engine()) as db:
         statement = select(PromoCode).options(
-            joinedload(PromoCode.person)
+            raiseload('*')
+        ).filter(
+            PromoCode.id == promo_id
         )
         result = await db.execute(statement)
-        promo_code = result.unique().scalars().all()
-        return promo_code
+        return result.scalar_one_or_none()
 
 
 async def get_promo_code(text_promo):
     async with AsyncSession(autoflush=False, bind=engine()) as db:
         statement = select(PromoCode).options(
-            joinedload(PromoCode.person)
+            selectinload(PromoCode.person)
         ).filter(
             PromoCode.text == text_promo
         )
         result = await db.execute(statement)
-        promo_code = result.unique().scalar_one_or_none()
+        promo_code = result.scalar_one_or_none()
         return promo_code
 
 
@@ -203,36 +307,47 @@ async def get_count_referral_user(tgid):
 
 async def get_referral_balance(tgid):
     async with AsyncSession(autoflush=False, bind=engine()) as db:
-        statement = select(Persons).filter(Persons.tgid == tgid)
+        statement = select(Persons.referral_balance).filter(Persons.tgid == tgid)
         result = await db.execute(statement)
-        person = result.scalar_one_or_none()
-        return person.referral_balance
+        return result.scalar_one()
+
+
+# Поля заявки на вывод, которые показывает админка: Row без ORM-объектов,
+# поэтому связь person не может подгрузиться лениво
+APPLICATION_REFERRAL_COLUMNS = (
+    WithdrawalRequests.id,
+    WithdrawalRequests.amount,
+    WithdrawalRequests.payment_info,
+    WithdrawalRequests.communication,
+    WithdrawalRequests.user_tgid,
+    WithdrawalRequests.check_payment,
+)
 
 
 async def get_all_application_referral():
     async with AsyncSession(autoflush=False, bind=engine()) as db:
-        statement = select(WithdrawalRequests)
+        statement = select(*APPLICATION_REFERRAL_COLUMNS).order_by(WithdrawalRequests.id)
         result = await db.execute(statement)
-        return result.scalars().all()
+        return result.all()
 
 
 async def get_application_referral_check_false():
     async with AsyncSession(autoflush=False, bind=engine()) as db:
-        statement = select(WithdrawalRequests).filter(
+        statement = select(*APPLICATION_REFERRAL_COLUMNS).filter(
             WithdrawalRequests.check_payment == False
-        )
+        ).order_by(WithdrawalRequests.id)
         result = await db.execute(statement)
-        return result.scalars().all()
+        return result.all()
 
 
 async def get_person_lang(telegram_id):
     async with AsyncSession(autoflush=False, bind=engine()) as db:
-        statement = select(Persons).filter(Persons.tgid == telegram_id)
+        statement = select(Persons.lang).filter(Persons.tgid == telegram_id)
         result = await db.execute(statement)
-        person = result.scalar_one_or_none()
-        if person is None:
+        row = result.one_or_none()
+        if row is None:
             return CONFIG.languages
-        return person.lang
+        return row.lang
 
 
 async def get_all_groups():
@@ -272,10 +387,7 @@ async def get_group_name(group_name):
 
 async def get_users_group(group_id):
     async with AsyncSession(autoflush=False, bind=engine()) as db:
-        statement = select(Groups).filter(Groups.id == group_id)
-        result = await db.execute(statement)
-        group = result.scalar_one_or_none()
-        statement = select(Persons).filter(Persons.group == group.name)
+        statement = select(Persons).filter(Persons.group_id == group_id)
         result = await db.execute(statement)
         return result.scalars().all()
 
@@ -664,98 +776,51 @@ async def get_daily_statistics_aggregated():
     """
     import time
     from datetime import date
-    from sqlalchemy import case, cast, Date
 
     current_time = int(time.time())
     today = date.today()
 
+    active = and_(Persons.subscription > current_time, Persons.banned == False)
+    autopay = and_(active, Persons.payment_method_id.isnot(None))
+    with_referral = Persons.referral_balance > 0
+
     async with AsyncSession(autoflush=False, bind=engine()) as db:
-        # Один запрос для всей статистики
+        # Один проход по users: агрегаты с FILTER вместо отдельных запросов
         stmt = select(
             # Активные пользователи сегодня
-            func.count(
-                case(
-                    (func.date(Persons.last_interaction) == today, Persons.id),
-                    else_=None
-                )
+            func.count().filter(
+                func.date(Persons.last_interaction) == today
             ).label('today_active_persons_count'),
             # Активные подписки
-            func.count(
-                case(
-                    (and_(
-                        Persons.subscription > current_time,
-                        Persons.banned == False
-                    ), Persons.id),
-                    else_=None
-                )
-            ).label('active_subscriptions_count'),
+            func.count().filter(active).label('active_subscriptions_count'),
             # Сумма активных подписок
             func.coalesce(
-                func.sum(
-                    case(
-                        (and_(
-                            Persons.subscription > current_time,
-                            Persons.banned == False,
-                            Persons.subscription_price.isnot(None)
-                        ), Persons.subscription_price),
-                        else_=0
-                    )
-                ), 0
+                func.sum(Persons.subscription_price).filter(active), 0
             ).label('active_subscriptions_sum'),
             # Активные подписки с автоплатежом
-            func.count(
-                case(
-                    (and_(
-                        Persons.subscription > current_time,
-                        Persons.banned == False,
-                        Persons.payment_method_id.isnot(None)
-                    ), Persons.id),
-                    else_=None
-                )
-            ).label('active_autopay_subscriptions_count'),
+            func.count().filter(autopay).label('active_autopay_subscriptions_count'),
             # Сумма подписок с автоплатежом
             func.coalesce(
-                func.sum(
-                    case(
-                        (and_(
-                            Persons.subscription > current_time,
-                            Persons.banned == False,
-                            Persons.payment_method_id.isnot(None),
-                            Persons.subscription_price.isnot(None)
-                        ), Persons.subscription_price),
-                        else_=0
-                    )
-                ), 0
+                func.sum(Persons.subscription_price).filter(autopay), 0
             ).label('active_autopay_subscriptions_sum'),
             # Пользователи с реферальным балансом
-            func.count(
-                case(
-                    (Persons.referral_balance > 0, Persons.id),
-                    else_=None
-                )
-            ).label('referral_balance_persons_count'),
+            func.count().filter(with_referral).label('referral_balance_persons_count'),
             # Сумма реферальных балансов
             func.coalesce(
-                func.sum(
-                    case(
-                        (Persons.referral_balance > 0, Persons.referral_balance),
-                        else_=0
-                    )
-                ), 0
+                func.sum(Persons.referral_balance).filter(with_referral), 0
             ).label('referral_balance_sum')
         )
 
-        result = await db.execute(stmt)
-        row = result.one()
+        row = (await db.execute(stmt)).one()
 
         return {
-            'today_active_persons_count': row[0] or 0,
-            'active_subscriptions_count': row[1] or 0,
-            'active_subscriptions_sum': int(row[2] or 0),
-            'active_autopay_subscriptions_count': row[3] or 0,
-            'active_autopay_subscriptions_sum': int(row[4] or 0),
-            'referral_balance_persons_count': row[5] or 0,
-            'referral_balance_sum': int(row[6] or 0)
+            'today_active_persons_count': row.today_active_persons_count,
+            'active_subscriptions_count': row.active_subscriptions_count,
+            'active_subscriptions_sum': int(row.active_subscriptions_sum),
+            'active_autopay_subscriptions_count': row.active_autopay_subscriptions_count,
+            'active_autopay_subscriptions_sum': int(row.active_autopay_subscriptions_sum),
+            'referral_balance_persons_count': row.referral_balance_persons_count,
+            'referral_balance_sum': int(row.referral_balance_sum)
         }
 
 
@@ -1,23 +1,23 @@
 import datetime
 import time
-from zoneinfo import ZoneInfo
 
-from sqlalchemy import select
+from sqlalchemy import literal, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from bot.database.main import engine
-from bot.database.methods.get import _get_person, _get_person_by_id
+from bot.database.methods.get import _get_person, _get_person_by_id, _mailing_recipients
 from bot.database.models.main import (
     Persons,
     Payments,
     StaticPersons,
     PromoCode,
-    WithdrawalRequests, Groups, SuperOffer, DailyStatistics, AffiliateStatistics
+    WithdrawalRequests, Groups, SuperOffer, DailyStatistics, AffiliateStatistics,
+    MailingJobs, MailingTargets
 )
 
 
 async def add_new_person(from_user, username, subscription, ref_user, client_id, referral_utm=None):
-    moscow_tz = ZoneInfo("Europe/Moscow")
     async with AsyncSession(autoflush=False, bind=engine()) as db:
         # Если subscription > 0 - добавляем к текущему времени
         # Если subscription == 0 - оставляем 0 (пробный период активируется отдельно)
@@ -31,7 +31,7 @@ async def add_new_person(from_user, username, subscription, ref_user, client_id,
             referral_user_tgid=ref_user or None,
             referral_utm=referral_utm,
             client_id=client_id,
-            first_interaction=datetime.datetime.now(moscow_tz),
+            # first_interaction проставляет БД (server_default)
             banned=False  # Новый пользователь не забанен
         )
         db.add(tom)
@@ -132,33 +132,26 @@ async def crate_or_update_stats(day, today_active_persons_count: int, active_sub
                                 active_subscriptions_sum: int, active_autopay_subscriptions_count: int,
                                 active_autopay_subscriptions_sum: int, referral_balance_persons_count: int,
                                 referral_balance_sum):
+    values = {
+        'today_active_persons_count': today_active_persons_count,
+        'active_subscriptions_count': active_subscriptions_count,
+        'active_subscriptions_sum': active_subscriptions_sum,
+        'active_autopay_subscriptions_count': active_autopay_subscriptions_count,
+        'active_autopay_subscriptions_sum': active_autopay_subscriptions_sum,
+        'referral_balance_persons_count': referral_balance_persons_count,
+        'referral_balance_sum': referral_balance_sum,
+    }
     async with AsyncSession(autoflush=False, bind=engine()) as session:
-        # Попытка получить запись за текущий день
-        stats: DailyStatistics = (
-            await session.execute(select(DailyStatistics).where(DailyStatistics.date == day))).scalars().first()
-        if stats:
-            stats.today_active_persons_count = today_active_persons_count
-            stats.active_subscriptions_count = active_subscriptions_count
-            stats.active_subscriptions_sum = active_subscriptions_sum
-            stats.active_autopay_subscriptions_count = active_autopay_subscriptions_count
-            stats.active_autopay_subscriptions_sum = active_autopay_subscriptions_sum
-            stats.referral_balance_persons_count = referral_balance_persons_count
-            stats.referral_balance_sum = referral_balance_sum
-            await session.commit()
-            return True
-
-        stats = DailyStatistics()
-        stats.date = day
-        stats.today_active_persons_count = today_active_persons_count
-        stats.active_subscriptions_count = active_subscriptions_count
-        stats.active_subscriptions_sum = active_subscriptions_sum
-        stats.active_autopay_subscriptions_count = active_autopay_subscriptions_count
-        stats.active_autopay_subscriptions_sum = active_autopay_subscriptions_sum
-        stats.referral_balance_persons_count = referral_balance_persons_count
-        stats.referral_balance_sum = referral_balance_sum
-        session.add(stats)
+        # UPSERT по уникальной дате: одна запись за день без предварительного SELECT.
+        # xmax = 0 только у только что вставленной строки
+        stmt = pg_insert(DailyStatistics).values(date=day, **values).on_conflict_do_update(
+            index_elements=[DailyStatistics.date],
+            set_=values
+        ).returning(text('xmax = 0'))
+        inserted = (await session.execute(stmt)).scalar_one()
         await session.commit()
-        return False
+        # True - запись за день уже была и обновлена, False - создана новая
+        return not inserted
 
 
 async def create_affiliate_statistics(client_fullname: str, client_tg_id: int, referral_tg_id: int, payment_amount: int,
@@ -175,3 +168,44 @@ async def create_affiliate_statistics(client_fullname: str, client_tg_id: int, r
 
         session.add(stat)
         await session.commit()
+
+
+async def add_mailing_job(
+        option: str,
+        server_id: int,
+        vpn_type: int,
+        text: str,
+        photo_file_id: str,
+        created_by: int,
+        lang: str,
+        progress_message_id: int = None
+):
+    """
+    Создаёт задание рассылки и список получателей в одной транзакции.
+    Получатели копируются INSERT ... SELECT на стороне БД, без выгрузки в Python.
+    Возвращает (id задания, количество получателей)
+    """
+    async with AsyncSession(autoflush=False, bind=engine()) as db:
+        job = MailingJobs(
+            option=option,
+            server_id=server_id,
+            vpn_type=vpn_type,
+            text=text,
+            photo_file_id=photo_file_id,
+            created_by=created_by,
+            lang=lang,
+            progress_message_id=progress_message_id
+        )
+        db.add(job)
+        await db.flush()
+        recipients = _mailing_recipients(option, server_id, vpn_type).add_columns(
+            literal(job.id)
+        )
+        result = await db.execute(
+            pg_insert(MailingTargets)
+            .from_select(['tgid', 'job_id'], recipients)
+            .on_conflict_do_nothing()
+        )
+        job_id = job.id
+        await db.commit()
+        return job_id, result.rowcount
@@ -2,14 +2,14 @@ import time
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 
-from sqlalchemy import select, update
+from sqlalchemy import select, update, func
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import selectinload
 
 from bot.database.main import engine
 from bot.database.methods.get import _get_person, _get_person_by_id, _get_server, get_super_offer
 from bot.database.methods.insert import add_super_offer
-from bot.database.models.main import Persons, WithdrawalRequests
+from bot.database.models.main import Persons, Servers, WithdrawalRequests, MailingJobs, MailingTargets
 
 
 async def add_balance_person(tgid, deposit):
@@ -53,13 +53,20 @@ async def delete_payment_method_id_person(tgid):
         return False
 
 async def reduce_balance_person(deposit, tgid):
+    """
+    Списать deposit с баланса одним UPDATE: проверка и списание атомарны,
+    поэтому два параллельных списания не уводят баланс в минус.
+    False - пользователя нет или на балансе меньше deposit
+    """
+    deposit = int(deposit)
     async with AsyncSession(autoflush=False, bind=engine()) as db:
-        person = await _get_person(db, tgid)
-        if person is not None:
-            person.balance -= int(deposit)
-            await db.commit()
-            return True
-        return False
+        result = await db.execute(
+            update(Persons)
+            .where(Persons.tgid == tgid, Persons.balance >= deposit)
+            .values(balance=Persons.balance - deposit)
+        )
+        await db.commit()
+        return result.rowcount == 1
 
 
 async def reduce_referral_balance_person(amount, tgid):
@@ -362,6 +369,40 @@ async def server_space_update(name, new_space):
         return False
 
 
+async def server_space_update_many(spaces: dict):
+    """Обновляет space у нескольких серверов одним запросом: {server.id: space}"""
+    if not spaces:
+        return
+    async with AsyncSession(autoflush=False, bind=engine()) as db:
+        await db.execute(
+            update(Servers),
+            [{'id': server_id, 'space': space} for server_id, space in spaces.items()]
+        )
+        await db.commit()
+
+
+async def mailing_targets_set_status(job_id: int, tgids: list, status: int):
+    if not tgids:
+        return
+    async with AsyncSession(autoflush=False, bind=engine()) as db:
+        await db.execute(
+            update(MailingTargets)
+            .where(MailingTargets.job_id == job_id, MailingTargets.tgid.in_(tgids))
+            .values(status=status)
+        )
+        await db.commit()
+
+
+async def mailing_job_finish(job_id: int):
+    async with AsyncSession(autoflush=False, bind=engine()) as db:
+        await db.execute(
+            update(MailingJobs)
+            .where(MailingJobs.id == job_id)
+            .values(finished=True, finished_at=func.now())
+        )
+        await db.commit()
+
+
 async def add_user_in_server(telegram_id, server):
     async with AsyncSession(autoflush=False, bind=engine()) as db:
         person = await db.execute(
@@ -376,9 +417,9 @@ async def add_pomo_code_person(tgid, promo_code):
     async with AsyncSession(autoflush=False, bind=engine()) as db:
         async with db.begin():
             statement = select(Persons).options(
-                joinedload(Persons.promocode)).filter(Persons.tgid == tgid)
+                selectinload(Persons.promocode)).filter(Persons.tgid == tgid)
             result = await db.execute(statement)
-            person = result.unique().scalar_one_or_none()
+            person = result.scalar_one_or_none()
 
             if person is not None:
                 # person.balance += int(promo_code.add_balance)
@@ -423,14 +464,15 @@ async def update_lang(lang, tgid):
         return False
 
 
-async def persons_add_group(list_input, name_group=None):
+async def persons_add_group(list_input, group=None):
     async with AsyncSession(autoflush=False, bind=engine()) as db:
         statement = select(Persons).filter(Persons.tgid.in_(list_input))
         result = await db.execute(statement)
         persons = result.scalars().all()
         if persons is not None:
             for person in persons:
-                person.group = name_group
+                person.group = group.name if group is not None else None
+                person.group_id = group.id if group is not None else None
                 person.server = None
             await db.commit()
             return len(persons)
@@ -2,23 +2,43 @@
 Win-back промокоды - методы для работы с БД
 Возврат ушедших клиентов через персональные скидки
 """
+import asyncio
 import time
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, AsyncIterator
 from zoneinfo import ZoneInfo
 
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import select, update, func, and_, or_, lambda_stmt
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from bot.database.main import engine
 from bot.database.models.main import WinbackPromo, WinbackPromoUsage, Persons
 
+_MSK = ZoneInfo("Europe/Moscow")
+SEGMENT_BATCH_LIMIT = 10_000  # Размер пачки при постраничной выборке сегмента
+
+# Кэш get_churned_users_stats: админка перезапрашивает статистику
+# при каждом открытии меню, а за полминуты она почти не меняется
+CHURNED_STATS_TTL = 30  # секунд
+_churned_stats_cache: Dict[str, object] = {'ts': 0.0, 'value': None}
+_churned_stats_lock = asyncio.Lock()
+
 
 # ============================================
 # CRUD для WinbackPromo
 # ============================================
 
+def normalize_promo_code(code: str) -> str:
+    """
+    Промокоды хранятся в верхнем регистре без пробелов по краям
+    (CHECK ck_winback_promo_code_normalized), поэтому поиск по code
+    идёт обычным уникальным индексом без upper() в запросе.
+    """
+    return code.strip().upper()
+
+
 async def create_winback_promo(
     code: str,
     discount_percent: int,
@@ -32,13 +52,13 @@ async def create_winback_promo(
     async with AsyncSession(autoflush=False, bind=engine()) as db:
         # Проверить уникальность кода
         existing = await db.execute(
-            select(WinbackPromo).filter(WinbackPromo.code == code.upper())
+            select(WinbackPromo).filter(WinbackPromo.code == normalize_promo_code(code))
         )
         if existing.scalar_one_or_none():
             return None  # Код уже существует
 
         promo = WinbackPromo(
-            code=code.upper(),
+            code=normalize_promo_code(code),
             discount_percent=discount_percent,
             min_days_expired=min_days_expired,
             max_days_expired=max_days_expired,
@@ -66,7 +86,7 @@ async def get_winback_promo_by_code(code: str) -> Optional[WinbackPromo]:
     """Получить промокод по коду"""
     async with AsyncSession(autoflush=False, bind=engine()) as db:
         result = await db.execute(
-            select(WinbackPromo).filter(WinbackPromo.code == code.upper())
+            select(WinbackPromo).filter(WinbackPromo.code == normalize_promo_code(code))
         )
         return result.scalar_one_or_none()
 
@@ -97,7 +117,7 @@ async def update_winback_promo(
         for key, value in kwargs.items():
             if hasattr(promo, key):
                 if key == 'code':
-                    value = value.upper()
+                    value = normalize_promo_code(value)
                 setattr(promo, key, value)
 
         await db.commit()
@@ -138,33 +158,73 @@ async def toggle_winback_promo(promo_id: int) -> Optional[bool]:
 # Работа с использованием промокодов
 # ============================================
 
+# Запросы горячего пути собираются через lambda_stmt: SQLAlchemy кэширует
+# построенный запрос по месту определения лямбды, а значения из замыкания
+# (user_tgid, code) подставляет как параметры при каждом вызове.
+# Срок действия сверяется со временем БД (func.now()), а не процесса бота.
+
+def _active_usage_stmt(user_tgid: int):
+    """Неиспользованный и не истёкший промокод пользователя"""
+    return lambda_stmt(
+        lambda: select(WinbackPromoUsage)
+        .options(selectinload(WinbackPromoUsage.promo))
+        .filter(
+            WinbackPromoUsage.user_tgid == user_tgid,
+            WinbackPromoUsage.used_at.is_(None),  # Не использован
+            WinbackPromoUsage.expires_at > func.now()  # Не истёк
+        )
+        .order_by(WinbackPromoUsage.sent_at.desc())
+    )
+
+
+def _usage_by_code_stmt(user_tgid: int, code: str):
+    """Активное использование конкретного промокода пользователем"""
+    return lambda_stmt(
+        lambda: select(WinbackPromoUsage)
+        .options(selectinload(WinbackPromoUsage.promo))
+        .filter(
+            WinbackPromoUsage.user_tgid == user_tgid,
+            WinbackPromoUsage.used_at.is_(None),
+            WinbackPromoUsage.expires_at > func.now()
+        )
+        .join(WinbackPromo)
+        .filter(WinbackPromo.code == code)
+    )
+
+
+def _person_subscription_stmt(user_tgid: int):
+    """Дата окончания подписки пользователя"""
+    return lambda_stmt(
+        lambda: select(Persons.subscription).filter(Persons.tgid == user_tgid)
+    )
+
+
 async def create_promo_usage(
     promo_id: int,
     user_tgid: int,
     valid_days: int
 ) -> Optional[WinbackPromoUsage]:
-    """Создать запись об отправке промокода пользователю"""
-    moscow_tz = ZoneInfo("Europe/Moscow")
-    async with AsyncSession(autoflush=False, bind=engine()) as db:
-        # Проверить, не отправляли ли уже этот промокод этому пользователю
-        existing = await db.execute(
-            select(WinbackPromoUsage).filter(
-                WinbackPromoUsage.promo_id == promo_id,
-                WinbackPromoUsage.user_tgid == user_tgid
-            )
-        )
-        if existing.scalar_one_or_none():
-            return None  # Уже отправляли
-
-        expires_at = datetime.now(moscow_tz) + timedelta(days=valid_days)
-        usage = WinbackPromoUsage(
-            promo_id=promo_id,
-            user_tgid=user_tgid,
-            expires_at=expires_at
-        )
-        db.add(usage)
+    """
+    Создать запись об отправке промокода пользователю.
+    Возвращает None, если этот промокод пользователю уже отправляли.
+    """
+    expires_at = datetime.now(_MSK) + timedelta(days=valid_days)
+    # Проверка "уже отправляли" и вставка - одним запросом
+    # по уникальному ключу (promo_id, user_tgid)
+    stmt = pg_insert(WinbackPromoUsage).values(
+        promo_id=promo_id,
+        user_tgid=user_tgid,
+        expires_at=expires_at
+    ).on_conflict_do_nothing(
+        index_elements=['promo_id', 'user_tgid']
+    ).returning(WinbackPromoUsage)
+
+    async with AsyncSession(
+            autoflush=False, bind=engine(), expire_on_commit=False
+    ) as db:
+        result = await db.execute(stmt)
+        usage = result.scalar_one_or_none()
         await db.commit()
-        await db.refresh(usage)
         return usage
 
 
@@ -173,20 +233,8 @@ async def get_active_promo_for_user(user_tgid: int) -> Optional[Dict]:
     Получить активный (неиспользованный, не истёкший) промокод для пользователя.
     Возвращает dict с promo и usage.
     """
-    moscow_tz = ZoneInfo("Europe/Moscow")
-    now = datetime.now(moscow_tz)
-
     async with AsyncSession(autoflush=False, bind=engine()) as db:
-        result = await db.execute(
-            select(WinbackPromoUsage)
-            .options(selectinload(WinbackPromoUsage.promo))
-            .filter(
-                WinbackPromoUsage.user_tgid == user_tgid,
-                WinbackPromoUsage.used_at.is_(None),  # Не использован
-                WinbackPromoUsage.expires_at > now  # Не истёк
-            )
-            .order_by(WinbackPromoUsage.sent_at.desc())
-        )
+        result = await db.execute(_active_usage_stmt(user_tgid))
         usage = result.scalar_one_or_none()
         if not usage:
             return None
@@ -209,45 +257,52 @@ async def apply_promo_discount(
     Применить промокод и получить скидку.
     Возвращает dict с информацией о скидке или None если промокод недействителен.
     """
-    moscow_tz = ZoneInfo("Europe/Moscow")
-    now = datetime.now(moscow_tz)
-
-    async with AsyncSession(autoflush=False, bind=engine()) as db:
-        # Найти активный промокод для пользователя
-        result = await db.execute(
-            select(WinbackPromoUsage)
-            .options(selectinload(WinbackPromoUsage.promo))
-            .filter(
-                WinbackPromoUsage.user_tgid == user_tgid,
-                WinbackPromoUsage.used_at.is_(None),
-                WinbackPromoUsage.expires_at > now
-            )
-            .join(WinbackPromo)
-            .filter(WinbackPromo.code == code.upper())
+    now = datetime.now(_MSK)
+    # Core-таблицы: ORM-вариант UPDATE не отдаёт в RETURNING
+    # колонки присоединённой таблицы winback_promos
+    usages = WinbackPromoUsage.__table__
+    promos = WinbackPromo.__table__
+    discount_amount = (original_price * promos.c.discount_percent) // 100
+
+    # Проверка промокода, расчёт скидки и отметка об использовании -
+    # одним UPDATE ... FROM winback_promos ... RETURNING.
+    # Условие used_at IS NULL не даёт применить промокод дважды
+    stmt = (
+        update(usages)
+        .where(
+            usages.c.promo_id == promos.c.id,
+            usages.c.user_tgid == user_tgid,
+            usages.c.used_at.is_(None),
+            usages.c.expires_at > func.now(),
+            promos.c.code == normalize_promo_code(code)
         )
-        usage = result.scalar_one_or_none()
-        if not usage:
-            return None
-
-        # Рассчитать скидку
-        discount_percent = usage.promo.discount_percent
-        discount_amount = int(original_price * discount_percent / 100)
-        final_price = original_price - discount_amount
-
-        # Обновить запись использования
-        usage.used_at = now
-        usage.original_price = original_price
-        usage.discount_amount = discount_amount
-        usage.final_price = final_price
+        .values(
+            used_at=now,
+            original_price=original_price,
+            discount_amount=discount_amount,
+            final_price=original_price - discount_amount
+        )
+        .returning(
+            promos.c.code,
+            promos.c.discount_percent,
+            usages.c.discount_amount,
+            usages.c.final_price
+        )
+    )
 
+    async with AsyncSession(autoflush=False, bind=engine()) as db:
+        result = await db.execute(stmt)
+        row = result.first()
         await db.commit()
+        if not row:
+            return None
 
         return {
-            'code': usage.promo.code,
-            'discount_percent': discount_percent,
-            'discount_amount': discount_amount,
+            'code': row.code,
+            'discount_percent': row.discount_percent,
+            'discount_amount': row.discount_amount,
             'original_price': original_price,
-            'final_price': final_price
+            'final_price': row.final_price
         }
 
 
@@ -258,15 +313,7 @@ async def check_promo_code(user_tgid: int, code: str) -> Optional[Dict]:
     """
     async with AsyncSession(autoflush=False, bind=engine()) as db:
         result = await db.execute(
-            select(WinbackPromoUsage)
-            .options(selectinload(WinbackPromoUsage.promo))
-            .filter(
-                WinbackPromoUsage.user_tgid == user_tgid,
-                WinbackPromoUsage.used_at.is_(None),
-                WinbackPromoUsage.expires_at > func.now()
-            )
-            .join(WinbackPromo)
-            .filter(WinbackPromo.code == code.upper())
+            _usage_by_code_stmt(user_tgid, normalize_promo_code(code))
         )
         usage = result.scalar_one_or_none()
         if not usage:
@@ -284,57 +331,91 @@ async def check_promo_code(user_tgid: int, code: str) -> Optional[Dict]:
 # Сегментация пользователей
 # ============================================
 
+def _churned_users_stmt(
+    min_days: int,
+    max_days: int,
+    exclude_already_sent_promo_id: Optional[int] = None,
+    current_time: Optional[int] = None
+):
+    """Запрос пользователей без подписки в указанном диапазоне дней (без порядка и лимита)"""
+    if current_time is None:
+        current_time = int(time.time())
+    min_timestamp = current_time - (max_days * 86400)  # Подписка истекла max_days назад
+    max_timestamp = current_time - (min_days * 86400)  # Подписка истекла min_days назад
+
+    stmt = select(Persons).filter(
+        Persons.subscription.isnot(None),
+        Persons.subscription < current_time,  # Подписка истекла
+        Persons.subscription >= min_timestamp,  # Не раньше max_days назад
+        Persons.subscription <= max_timestamp,  # Не позже min_days назад
+        Persons.banned == False,  # Не забанен
+        Persons.bot_blocked == False,  # Не заблокировал бота
+        Persons.retention > 0  # Хотя бы раз покупал
+    )
+
+    # Исключить тех, кому уже отправлен этот промокод
+    if exclude_already_sent_promo_id:
+        subq = select(WinbackPromoUsage.user_tgid).filter(
+            WinbackPromoUsage.promo_id == exclude_already_sent_promo_id
+        )
+        stmt = stmt.filter(Persons.tgid.notin_(subq))
+
+    return stmt
+
+
+def _paginate_by_tgid(stmt, limit: Optional[int], after_tgid: Optional[int]):
+    """Постраничная выборка по tgid: стабильный порядок и продолжение после after_tgid"""
+    stmt = stmt.order_by(Persons.tgid)
+    if after_tgid is not None:
+        stmt = stmt.filter(Persons.tgid > after_tgid)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
 async def get_churned_users_by_segment(
     min_days: int,
     max_days: int,
-    exclude_already_sent_promo_id: Optional[int] = None
+    exclude_already_sent_promo_id: Optional[int] = None,
+    current_time: Optional[int] = None,
+    limit: int = SEGMENT_BATCH_LIMIT,
+    after_tgid: Optional[int] = None
 ) -> List[Persons]:
     """
     Получить пользователей без подписки в указанном диапазоне дней.
     Исключает тех, кому уже отправлен указанный промокод.
     Исключает тех, кто заблокировал бота (bot_blocked=true).
-    """
-    current_time = int(time.time())
-    min_timestamp = current_time - (max_days * 86400)  # Подписка истекла max_days назад
-    max_timestamp = current_time - (min_days * 86400)  # Подписка истекла min_days назад
 
+    current_time: момент отсчёта (unix time), по умолчанию - текущее время
+    limit, after_tgid: не более limit пользователей с tgid > after_tgid
+    (по возрастанию tgid). Весь сегмент — через iter_segment_users,
+    размер — через count_segment_users
+    """
     async with AsyncSession(autoflush=False, bind=engine()) as db:
-        stmt = select(Persons).filter(
-            Persons.subscription.isnot(None),
-            Persons.subscription < current_time,  # Подписка истекла
-            Persons.subscription >= min_timestamp,  # Не раньше max_days назад
-            Persons.subscription <= max_timestamp,  # Не позже min_days назад
-            Persons.banned == False,  # Не забанен
-            or_(Persons.bot_blocked == False, Persons.bot_blocked.is_(None)),  # Не заблокировал бота
-            Persons.retention > 0  # Хотя бы раз покупал
-        )
-
-        # Исключить тех, кому уже отправлен этот промокод
-        if exclude_already_sent_promo_id:
-            subq = select(WinbackPromoUsage.user_tgid).filter(
-                WinbackPromoUsage.promo_id == exclude_already_sent_promo_id
+        result = await db.execute(
+            _paginate_by_tgid(
+                _churned_users_stmt(
+                    min_days, max_days, exclude_already_sent_promo_id, current_time
+                ),
+                limit, after_tgid
             )
-            stmt = stmt.filter(Persons.tgid.notin_(subq))
-
-        result = await db.execute(stmt)
+        )
         return list(result.scalars().all())
 
 
 async def get_user_days_without_subscription(user_tgid: int) -> Optional[int]:
     """Получить количество дней без подписки для пользователя"""
     async with AsyncSession(autoflush=False, bind=engine()) as db:
-        result = await db.execute(
-            select(Persons).filter(Persons.tgid == user_tgid)
-        )
-        person = result.scalar_one_or_none()
-        if not person or not person.subscription:
+        result = await db.execute(_person_subscription_stmt(user_tgid))
+        subscription = result.scalar_one_or_none()
+        if not subscription:
             return None
 
         current_time = int(time.time())
-        if person.subscription >= current_time:
+        if subscription >= current_time:
             return 0  # Подписка активна
 
-        days = (current_time - person.subscription) // 86400
+        days = (current_time - subscription) // 86400
         return days
 
 
@@ -343,7 +424,33 @@ async def get_churned_users_stats() -> dict:
     Получить статистику пользователей без активной подписки.
     Возвращает количество по сегментам.
     Исключает заблокировавших бота (bot_blocked=true).
+    Результат кэшируется на CHURNED_STATS_TTL секунд.
     """
+    if _churned_stats_is_fresh():
+        return dict(_churned_stats_cache['value'])
+
+    async with _churned_stats_lock:
+        # Пока ждали блокировку, кэш мог обновить другой запрос
+        if not _churned_stats_is_fresh():
+            value = await _compute_churned_users_stats()
+            _churned_stats_cache.update(ts=time.monotonic(), value=value)
+        return dict(_churned_stats_cache['value'])
+
+
+def invalidate_churned_users_stats():
+    """Сбросить кэш статистики ушедших пользователей"""
+    _churned_stats_cache['ts'] = 0.0
+
+
+def _churned_stats_is_fresh() -> bool:
+    return (
+        _churned_stats_cache['value'] is not None
+        and time.monotonic() - _churned_stats_cache['ts'] < CHURNED_STATS_TTL
+    )
+
+
+async def _compute_churned_users_stats() -> dict:
+    """Подсчитать статистику ушедших пользователей по сегментам"""
     current_time = int(time.time())
 
     async with AsyncSession(autoflush=False, bind=engine()) as db:
@@ -353,7 +460,7 @@ async def get_churned_users_stats() -> dict:
                 Persons.subscription.isnot(None),
                 Persons.subscription < current_time,
                 Persons.banned == False,
-                or_(Persons.bot_blocked == False, Persons.bot_blocked.is_(None)),
+                Persons.bot_blocked == False,
                 Persons.retention > 0
             )
         )
@@ -379,7 +486,7 @@ async def get_churned_users_stats() -> dict:
                     Persons.subscription >= min_timestamp,
                     Persons.subscription <= max_timestamp,
                     Persons.banned == False,
-                    or_(Persons.bot_blocked == False, Persons.bot_blocked.is_(None)),
+                    Persons.bot_blocked == False,
                     Persons.retention > 0
                 )
             )
@@ -390,17 +497,26 @@ async def get_churned_users_stats() -> dict:
 
 async def find_matching_promo_for_user(user_tgid: int) -> Optional[WinbackPromo]:
     """Найти подходящий промокод для пользователя по его сегменту"""
-    days = await get_user_days_without_subscription(user_tgid)
-    if days is None or days == 0:
-        return None  # Подписка активна или пользователь не найден
+    current_time = int(time.time())
+    # Дней без подписки - считается в том же запросе, что и подбор промокода
+    days = (current_time - Persons.subscription) // 86400
 
     async with AsyncSession(autoflush=False, bind=engine()) as db:
         result = await db.execute(
-            select(WinbackPromo).filter(
-                WinbackPromo.is_active == True,
+            select(WinbackPromo)
+            .join(Persons, and_(
+                Persons.tgid == user_tgid,
                 WinbackPromo.min_days_expired <= days,
                 WinbackPromo.max_days_expired >= days
-            ).order_by(WinbackPromo.discount_percent.desc())  # Сначала с большей скидкой
+            ))
+            .filter(
+                WinbackPromo.is_active == True,
+                Persons.subscription.isnot(None),
+                Persons.subscription != 0,
+                days > 0  # Подписка активна или истекла меньше суток назад
+            )
+            .order_by(WinbackPromo.discount_percent.desc())  # Сначала с большей скидкой
+            .limit(1)
         )
         return result.scalar_one_or_none()
 
@@ -409,147 +525,173 @@ async def find_matching_promo_for_user(user_tgid: int) -> Optional[WinbackPromo]
 # Статистика
 # ============================================
 
+def _promo_statistics_stmt():
+    """Промокоды вместе с агрегатами по использованиям — один запрос с GROUP BY"""
+    used = WinbackPromoUsage.used_at.isnot(None)
+    return (
+        select(
+            WinbackPromo,
+            func.count(WinbackPromoUsage.id).label('sent_count'),
+            func.count(WinbackPromoUsage.id).filter(used).label('used_count'),
+            func.coalesce(func.sum(WinbackPromoUsage.discount_amount).filter(used), 0).label('total_discount'),
+            func.coalesce(func.sum(WinbackPromoUsage.final_price).filter(used), 0).label('total_revenue'),
+        )
+        .outerjoin(WinbackPromoUsage, WinbackPromoUsage.promo_id == WinbackPromo.id)
+        .group_by(WinbackPromo.id)
+    )
+
+
+def _promo_statistics_row(row) -> Dict:
+    promo = row.WinbackPromo
+    sent_count = row.sent_count
+    used_count = row.used_count
+
+    # Конверсия
+    conversion_rate = (used_count / sent_count * 100) if sent_count > 0 else 0
+
+    return {
+        'promo': promo,
+        'code': promo.code,
+        'discount_percent': promo.discount_percent,
+        'segment': f"{promo.min_days_expired}-{promo.max_days_expired} дней",
+        'sent_count': sent_count,
+        'used_count': used_count,
+        'conversion_rate': round(conversion_rate, 1),
+        'total_discount': row.total_discount,
+        'total_revenue': row.total_revenue
+    }
+
+
 async def get_promo_statistics(promo_id: int) -> Dict:
     """Получить статистику по промокоду"""
     async with AsyncSession(autoflush=False, bind=engine()) as db:
-        promo = await db.execute(
-            select(WinbackPromo).filter(WinbackPromo.id == promo_id)
+        result = await db.execute(
+            _promo_statistics_stmt().filter(WinbackPromo.id == promo_id)
         )
-        promo = promo.scalar_one_or_none()
-        if not promo:
+        row = result.one_or_none()
+        if row is None:
             return {}
+        return _promo_statistics_row(row)
 
-        # Общее количество отправленных
-        sent_count = await db.execute(
-            select(func.count(WinbackPromoUsage.id)).filter(
-                WinbackPromoUsage.promo_id == promo_id
-            )
-        )
-        sent_count = sent_count.scalar() or 0
 
-        # Количество использованных
-        used_count = await db.execute(
-            select(func.count(WinbackPromoUsage.id)).filter(
-                WinbackPromoUsage.promo_id == promo_id,
-                WinbackPromoUsage.used_at.isnot(None)
-            )
+async def get_all_promos_statistics() -> List[Dict]:
+    """Получить статистику по всем промокодам"""
+    async with AsyncSession(autoflush=False, bind=engine()) as db:
+        result = await db.execute(
+            _promo_statistics_stmt().order_by(WinbackPromo.min_days_expired)
         )
-        used_count = used_count.scalar() or 0
+        return [_promo_statistics_row(row) for row in result.all()]
 
-        # Сумма скидок
-        total_discount = await db.execute(
-            select(func.sum(WinbackPromoUsage.discount_amount)).filter(
-                WinbackPromoUsage.promo_id == promo_id,
-                WinbackPromoUsage.used_at.isnot(None)
-            )
-        )
-        total_discount = total_discount.scalar() or 0
 
-        # Сумма оплат со скидкой
-        total_revenue = await db.execute(
-            select(func.sum(WinbackPromoUsage.final_price)).filter(
-                WinbackPromoUsage.promo_id == promo_id,
-                WinbackPromoUsage.used_at.isnot(None)
-            )
+def _welcome_users_stmt(
+    exclude_already_sent_promo_id: Optional[int] = None,
+    delay_days: int = 0,
+    current_time: Optional[int] = None
+):
+    """Запрос новых пользователей (retention=0) для welcome промокода (без порядка и лимита)"""
+    stmt = select(Persons).filter(
+        Persons.retention == 0,  # Никогда не покупали
+        or_(Persons.subscription_active == False, Persons.subscription_active.is_(None)),  # Нет активной подписки
+        Persons.banned == False,  # Не забанен
+        Persons.bot_blocked == False,  # Не заблокировал бота
+    )
+
+    # Фильтр по задержке после регистрации
+    if delay_days > 0:
+        # Выбираем пользователей, которые зарегистрировались минимум delay_days дней назад
+        if current_time is None:
+            now = datetime.now(_MSK)
+        else:
+            now = datetime.fromtimestamp(current_time, _MSK)
+        cutoff_date = now - timedelta(days=delay_days)
+        stmt = stmt.filter(
+            Persons.first_interaction.isnot(None),
+            Persons.first_interaction <= cutoff_date
         )
-        total_revenue = total_revenue.scalar() or 0
-
-        # Конверсия
-        conversion_rate = (used_count / sent_count * 100) if sent_count > 0 else 0
-
-        return {
-            'promo': promo,
-            'code': promo.code,
-            'discount_percent': promo.discount_percent,
-            'segment': f"{promo.min_days_expired}-{promo.max_days_expired} дней",
-            'sent_count': sent_count,
-            'used_count': used_count,
-            'conversion_rate': round(conversion_rate, 1),
-            'total_discount': total_discount,
-            'total_revenue': total_revenue
-        }
 
+    # Исключить тех, кому уже отправлен этот промокод
+    if exclude_already_sent_promo_id:
+        subq = select(WinbackPromoUsage.user_tgid).filter(
+            WinbackPromoUsage.promo_id == exclude_already_sent_promo_id
+        )
+        stmt = stmt.filter(Persons.tgid.notin_(subq))
 
-async def get_all_promos_statistics() -> List[Dict]:
-    """Получить статистику по всем промокодам"""
-    promos = await get_all_winback_promos()
-    stats = []
-    for promo in promos:
-        stat = await get_promo_statistics(promo.id)
-        stats.append(stat)
-    return stats
+    return stmt
 
 
 async def get_new_users_for_welcome_promo(
     exclude_already_sent_promo_id: Optional[int] = None,
-    delay_days: int = 0
+    delay_days: int = 0,
+    current_time: Optional[int] = None,
+    limit: int = SEGMENT_BATCH_LIMIT,
+    after_tgid: Optional[int] = None
 ) -> List[Persons]:
     """
     Получить новых пользователей (retention=0) для welcome промокодов.
     Исключает тех, кому уже отправлен промокод и заблокировавших бота.
 
     delay_days: задержка в днях после регистрации (0 = отправлять сразу)
+    current_time: момент отсчёта (unix time), по умолчанию - текущее время
+    limit, after_tgid: не более limit пользователей с tgid > after_tgid
+    (по возрастанию tgid). Весь сегмент — через iter_segment_users,
+    размер — через count_segment_users
     """
-    moscow_tz = ZoneInfo("Europe/Moscow")
     async with AsyncSession(autoflush=False, bind=engine()) as db:
-        stmt = select(Persons).filter(
-            Persons.retention == 0,  # Никогда не покупали
-            or_(Persons.subscription_active == False, Persons.subscription_active.is_(None)),  # Нет активной подписки
-            Persons.banned == False,  # Не забанен
-            or_(Persons.bot_blocked == False, Persons.bot_blocked.is_(None)),  # Не заблокировал бота
-        )
+        result = await db.execute(_paginate_by_tgid(
+            _welcome_users_stmt(exclude_already_sent_promo_id, delay_days, current_time),
+            limit, after_tgid
+        ))
+        return list(result.scalars().all())
 
-        # Фильтр по задержке после регистрации
-        if delay_days > 0:
-            # Выбираем пользователей, которые зарегистрировались минимум delay_days дней назад
-            cutoff_date = datetime.now(moscow_tz) - timedelta(days=delay_days)
-            stmt = stmt.filter(
-                Persons.first_interaction.isnot(None),
-                Persons.first_interaction <= cutoff_date
-            )
 
-        # Исключить тех, кому уже отправлен этот промокод
-        if exclude_already_sent_promo_id:
-            subq = select(WinbackPromoUsage.user_tgid).filter(
-                WinbackPromoUsage.promo_id == exclude_already_sent_promo_id
-            )
-            stmt = stmt.filter(Persons.tgid.notin_(subq))
+def _segment_stmt(promo: WinbackPromo, current_time: Optional[int] = None):
+    """Получатели промокода, ещё не получившие его: welcome — новые, winback — ушедшие"""
+    promo_type = getattr(promo, 'promo_type', 'winback') or 'winback'
+    if promo_type == 'welcome':
+        return _welcome_users_stmt(
+            exclude_already_sent_promo_id=promo.id,
+            delay_days=getattr(promo, 'delay_days', 0) or 0,
+            current_time=current_time
+        )
+    return _churned_users_stmt(
+        promo.min_days_expired, promo.max_days_expired,
+        exclude_already_sent_promo_id=promo.id,
+        current_time=current_time
+    )
+
 
+async def count_segment_users(promo: WinbackPromo, current_time: Optional[int] = None) -> int:
+    """Размер сегмента промокода одним COUNT(*), без загрузки пользователей"""
+    async with AsyncSession(autoflush=False, bind=engine()) as db:
+        stmt = select(func.count()).select_from(
+            _segment_stmt(promo, current_time).with_only_columns(Persons.tgid).subquery()
+        )
         result = await db.execute(stmt)
-        return list(result.scalars().all())
+        return result.scalar_one()
 
 
-async def get_users_for_autosend() -> Dict[int, List[Persons]]:
+async def iter_segment_users(
+    promo: WinbackPromo,
+    current_time: Optional[int] = None
+) -> AsyncIterator[Persons]:
     """
-    Получить пользователей для автоматической рассылки промокодов.
-    Поддерживает оба типа: 'winback' (ушедшие) и 'welcome' (новые).
-    Возвращает dict: {promo_id: [users]}
+    Все получатели промокода пачками по SEGMENT_BATCH_LIMIT (keyset по tgid).
+    Каждая пачка читается в своей сессии, которая закрывается до того, как
+    пользователи отдаются вызывающему: долгая рассылка не держит соединение
+    и открытую транзакцию.
     """
-    result = {}
-
-    # Получить все активные промокоды с автоотправкой
-    promos = await get_all_winback_promos(active_only=True)
-    auto_promos = [p for p in promos if p.auto_send]
-
-    for promo in auto_promos:
-        promo_type = getattr(promo, 'promo_type', 'winback') or 'winback'
-
-        if promo_type == 'welcome':
-            # Для welcome промокодов - новые пользователи (retention=0)
-            delay_days = getattr(promo, 'delay_days', 0) or 0
-            users = await get_new_users_for_welcome_promo(
-                exclude_already_sent_promo_id=promo.id,
-                delay_days=delay_days
-            )
-        else:
-            # Для winback промокодов - ушедшие пользователи
-            users = await get_churned_users_by_segment(
-                min_days=promo.min_days_expired,
-                max_days=promo.max_days_expired,
-                exclude_already_sent_promo_id=promo.id
+    if current_time is None:
+        current_time = int(time.time())
+    stmt = _segment_stmt(promo, current_time)
+    after_tgid = None
+    while True:
+        async with AsyncSession(autoflush=False, bind=engine()) as db:
+            result = await db.execute(
+                _paginate_by_tgid(stmt, SEGMENT_BATCH_LIMIT, after_tgid)
             )
-
-        if users:
-            result[promo.id] = users
-
-    return result
+            users = list(result.scalars().all())
+        for person in users:
+            yield person
+        if len(users) < SEGMENT_BATCH_LIMIT:
+            break
+        after_tgid = users[-1].tgid
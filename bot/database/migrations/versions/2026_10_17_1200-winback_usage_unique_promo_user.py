@@ -0,0 +1,38 @@
+"""Unique (promo_id, user_tgid) on winback_promo_usages
+
+Revision ID: winback_usage_unique
+Revises: add_traffic_monitoring
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'winback_usage_unique'
+down_revision: Union[str, None] = 'add_traffic_monitoring'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Remove duplicate sends left by concurrent autosend runs:
+    # keep the used record if there is one, otherwise the earliest
+    op.execute("""
+        DELETE FROM winback_promo_usages a
+        USING winback_promo_usages b
+        WHERE a.promo_id = b.promo_id
+          AND a.user_tgid = b.user_tgid
+          AND a.id <> b.id
+          AND a.used_at IS NULL
+          AND (b.used_at IS NOT NULL OR b.id < a.id)
+    """)
+    op.create_unique_constraint(
+        'uq_winback_promo_user', 'winback_promo_usages', ['promo_id', 'user_tgid']
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_winback_promo_user', 'winback_promo_usages', type_='unique')
@@ -0,0 +1,30 @@
+"""Keep winback promo codes upper-case and trimmed
+
+Revision ID: winback_code_normalized
+Revises: winback_usage_unique
+Create Date: 2026-10-17 12:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'winback_code_normalized'
+down_revision: Union[str, None] = 'winback_usage_unique'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Lookups compare code with an already normalized value, so the plain
+    # unique index on code serves them as long as stored codes are normalized
+    op.execute("UPDATE winback_promos SET code = upper(trim(code)) WHERE code <> upper(trim(code))")
+    op.create_check_constraint(
+        'ck_winback_promo_code_normalized', 'winback_promos', 'code = upper(trim(code))'
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('ck_winback_promo_code_normalized', 'winback_promos', type_='check')
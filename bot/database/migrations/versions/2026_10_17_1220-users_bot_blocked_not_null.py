@@ -0,0 +1,29 @@
+"""Make users.bot_blocked NOT NULL DEFAULT false
+
+Revision ID: bot_blocked_not_null
+Revises: winback_code_normalized
+Create Date: 2026-10-17 12:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bot_blocked_not_null'
+down_revision: Union[str, None] = 'winback_code_normalized'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # NULL meant "not blocked"; with the column NOT NULL the segment queries
+    # filter on bot_blocked = false instead of (false OR IS NULL)
+    op.execute("UPDATE users SET bot_blocked = false WHERE bot_blocked IS NULL")
+    op.alter_column('users', 'bot_blocked', nullable=False, server_default=sa.text('false'))
+
+
+def downgrade() -> None:
+    op.alter_column('users', 'bot_blocked', nullable=True, server_default=None)
@@ -0,0 +1,39 @@
+"""Partial index on users(subscription) for active subscribers
+
+Revision ID: users_active_subs_index
+Revises: bot_blocked_not_null
+Create Date: 2026-10-17 12:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'users_active_subs_index'
+down_revision: Union[str, None] = 'bot_blocked_not_null'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Built concurrently so the users table stays writable during the build;
+    # IF NOT EXISTS keeps it compatible with bot/db/migrations/002
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'idx_users_active_subs', 'users', ['subscription'],
+            postgresql_where=sa.text('subscription_active AND NOT subscription_expired AND NOT bot_blocked'),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'idx_users_active_subs', table_name='users',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
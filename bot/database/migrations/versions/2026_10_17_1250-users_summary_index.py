@@ -0,0 +1,39 @@
+"""Covering index on users(subscription, balance, tgid)
+
+Revision ID: users_summary_index
+Revises: users_active_subs_index
+Create Date: 2026-10-17 12:50:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'users_summary_index'
+down_revision: Union[str, None] = 'users_active_subs_index'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Admin summary lists select only tgid/subscription/balance; with all three
+    # in one index the planner can answer them with an index-only scan.
+    # VACUUM fills the visibility map so the heap is not visited.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'idx_users_summary', 'users', ['subscription', 'balance', 'tgid'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.execute('VACUUM ANALYZE users')
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'idx_users_summary', table_name='users',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,44 @@
+"""Integer group_id FK on users and servers
+
+Revision ID: group_id_fk
+Revises: users_summary_index
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'group_id_fk'
+down_revision: Union[str, None] = 'users_summary_index'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Joins and filters by group move to an integer key; the name column
+    # stays for display and keeps its FK to groups.name
+    for table in ('users', 'servers'):
+        op.add_column(table, sa.Column('group_id', sa.Integer(), nullable=True))
+        op.create_foreign_key(
+            f'fk_{table}_group_id', table, 'groups',
+            ['group_id'], ['id'], ondelete='SET NULL'
+        )
+        op.execute(f"""
+            UPDATE {table} t SET group_id = g.id
+            FROM groups g
+            WHERE t."group" = g.name
+        """)
+    op.create_index('ix_users_group_server', 'users', ['group_id', 'server'])
+    op.create_index('ix_servers_group_id', 'servers', ['group_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_servers_group_id', table_name='servers')
+    op.drop_index('ix_users_group_server', table_name='users')
+    for table in ('users', 'servers'):
+        op.drop_constraint(f'fk_{table}_group_id', table, type_='foreignkey')
+        op.drop_column(table, 'group_id')
@@ -0,0 +1,58 @@
+"""Server-side defaults and NOT NULL for constant users columns
+
+Revision ID: users_server_defaults
+Revises: group_id_fk
+Create Date: 2026-10-17 13:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from bot.misc.util import CONFIG
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'users_server_defaults'
+down_revision: Union[str, None] = 'group_id_fk'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# column -> server default (bot_blocked already got its default in bot_blocked_not_null)
+USERS_DEFAULTS = {
+    'banned': 'false',
+    'notion_oneday': 'false',
+    'balance': '0',
+    'retention': '0',
+    'referral_balance': '0',
+    'subscription_active': 'false',
+    'free_trial_used': 'false',
+    'subscription_expired': 'false',
+    'total_traffic_bytes': '0',
+    'traffic_limit_bytes': '536870912000',
+}
+
+
+def upgrade() -> None:
+    # The constants were Python-side defaults sent with every INSERT;
+    # Postgres fills them now. Existing NULLs get the same value first
+    for column, default in USERS_DEFAULTS.items():
+        op.execute(f"UPDATE users SET {column} = {default} WHERE {column} IS NULL")
+        op.alter_column('users', column, nullable=False, server_default=sa.text(default))
+
+    # price keeps its Python default (it comes from config) but may not be NULL
+    op.execute(
+        sa.text("UPDATE super_offer SET price = :price WHERE price IS NULL")
+        .bindparams(price=int(CONFIG.month_cost[0]))
+    )
+    op.alter_column('super_offer', 'price', nullable=False)
+
+
+def downgrade() -> None:
+    op.alter_column('super_offer', 'price', nullable=True)
+    for column, default in USERS_DEFAULTS.items():
+        # traffic_limit_bytes had this server default before as well
+        server_default = sa.text(default) if column == 'traffic_limit_bytes' else None
+        op.alter_column('users', column, nullable=True, server_default=server_default)
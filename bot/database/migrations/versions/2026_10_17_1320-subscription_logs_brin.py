@@ -0,0 +1,35 @@
+"""BRIN index on subscription_logs.accessed_at
+
+Revision ID: sublogs_accessed_brin
+Revises: users_server_defaults
+Create Date: 2026-10-17 13:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'sublogs_accessed_brin'
+down_revision: Union[str, None] = 'users_server_defaults'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Append-only log with monotonically growing accessed_at: a BRIN index
+    # keeps min/max per block range and is a tiny fraction of the btree.
+    # The btree may exist under the migration name or the create_all name
+    op.execute('DROP INDEX IF EXISTS idx_subscription_logs_time')
+    op.execute('DROP INDEX IF EXISTS ix_subscription_logs_accessed_at')
+    op.create_index(
+        'ix_sublogs_accessed_brin', 'subscription_logs', ['accessed_at'],
+        postgresql_using='brin',
+        postgresql_with={'pages_per_range': 32},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sublogs_accessed_brin', table_name='subscription_logs')
+    op.create_index('idx_subscription_logs_time', 'subscription_logs', ['accessed_at'])
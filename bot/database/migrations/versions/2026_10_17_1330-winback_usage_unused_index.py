@@ -0,0 +1,32 @@
+"""Partial index on unused winback promo usages
+
+Revision ID: winback_usage_unused_index
+Revises: sublogs_accessed_brin
+Create Date: 2026-10-17 13:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'winback_usage_unused_index'
+down_revision: Union[str, None] = 'sublogs_accessed_brin'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Every promo lookup asks for user_tgid = ? AND used_at IS NULL AND
+    # expires_at > now(); used rows never match, so they stay out of the index.
+    # (promo_id, user_tgid) is already indexed by uq_winback_promo_user
+    op.create_index(
+        'ix_wpu_unused', 'winback_promo_usages', ['user_tgid', 'expires_at'],
+        postgresql_where=sa.text('used_at IS NULL'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_wpu_unused', table_name='winback_promo_usages')
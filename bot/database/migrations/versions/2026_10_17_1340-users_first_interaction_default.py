@@ -0,0 +1,27 @@
+"""Server-side default for users.first_interaction
+
+Revision ID: first_interaction_default
+Revises: winback_usage_unused_index
+Create Date: 2026-10-17 13:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'first_interaction_default'
+down_revision: Union[str, None] = 'winback_usage_unused_index'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The registration time is recorded by Postgres instead of being sent from Python
+    op.alter_column('users', 'first_interaction', server_default=sa.text('clock_timestamp()'))
+
+
+def downgrade() -> None:
+    op.alter_column('users', 'first_interaction', server_default=None)
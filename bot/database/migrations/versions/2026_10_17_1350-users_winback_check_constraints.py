@@ -0,0 +1,57 @@
+"""CHECK constraints on users.balance, users.retention and winback_promos.discount_percent
+
+Revision ID: value_check_constraints
+Revises: first_interaction_default
+Create Date: 2026-10-17 13:50:00.000000
+
+"""
+import logging
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+log = logging.getLogger('alembic.runtime.migration')
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'value_check_constraints'
+down_revision: Union[str, None] = 'first_interaction_default'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+CONSTRAINTS = (
+    ('ck_users_balance_non_negative', 'users', 'balance >= 0'),
+    ('ck_users_retention_non_negative', 'users', 'retention >= 0'),
+    ('ck_winback_promo_discount_range', 'winback_promos', 'discount_percent BETWEEN 0 AND 100'),
+)
+
+# Existing rows that would fail VALIDATE are clamped into range
+CLAMPS = (
+    ('users', 'balance', 'balance < 0', '0'),
+    ('users', 'retention', 'retention < 0', '0'),
+    ('winback_promos', 'discount_percent', 'discount_percent NOT BETWEEN 0 AND 100',
+     'LEAST(GREATEST(discount_percent, 0), 100)'),
+)
+
+
+def upgrade() -> None:
+    # Clamp existing rows first: an UPDATE is checked against every constraint
+    # already on the table, NOT VALID ones included
+    conn = op.get_bind()
+    for table, column, violation, value in CLAMPS:
+        result = conn.execute(sa.text(f"UPDATE {table} SET {column} = {value} WHERE {violation}"))
+        if result.rowcount:
+            log.warning("Clamped %s rows of %s.%s into range", result.rowcount, table, column)
+    # Added NOT VALID first so the ACCESS EXCLUSIVE lock is held only for the
+    # catalog update; VALIDATE then scans existing rows under a weaker lock
+    for name, table, condition in CONSTRAINTS:
+        op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} CHECK ({condition}) NOT VALID")
+    for name, table, _ in CONSTRAINTS:
+        op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}")
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(CONSTRAINTS):
+        op.drop_constraint(name, table, type_='check')
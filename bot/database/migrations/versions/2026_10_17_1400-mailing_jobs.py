@@ -0,0 +1,57 @@
+"""mailing_jobs and mailing_targets tables for the background mailing worker
+
+Revision ID: mailing_jobs
+Revises: value_check_constraints
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'mailing_jobs'
+down_revision: Union[str, None] = 'value_check_constraints'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'mailing_jobs',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('option', sa.String(length=20), nullable=False),
+        sa.Column('server_id', sa.Integer(), nullable=True),
+        sa.Column('vpn_type', sa.Integer(), nullable=True),
+        sa.Column('text', sa.String(length=4096), nullable=True),
+        sa.Column('photo_file_id', sa.String(length=255), nullable=True),
+        sa.Column('created_by', sa.BigInteger(), nullable=False),
+        sa.Column('lang', sa.String(length=10), nullable=False),
+        sa.Column('progress_message_id', sa.Integer(), nullable=True),
+        sa.Column('finished', sa.Boolean(), server_default='false', nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('finished_at', sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    op.create_table(
+        'mailing_targets',
+        sa.Column('job_id', sa.Integer(), nullable=False),
+        sa.Column('tgid', sa.BigInteger(), nullable=False),
+        sa.Column('status', sa.SmallInteger(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['job_id'], ['mailing_jobs.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('job_id', 'tgid')
+    )
+    # The worker only ever reads pending targets
+    op.create_index(
+        'ix_mailing_targets_pending', 'mailing_targets', ['job_id', 'tgid'],
+        postgresql_where=sa.text('status = 0')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_mailing_targets_pending', table_name='mailing_targets')
+    op.drop_table('mailing_targets')
+    op.drop_table('mailing_jobs')
@@ -1,8 +1,12 @@
+from pathlib import Path
+
+from alembic.config import Config
+from alembic.script import ScriptDirectory
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.orm import relationship
 from sqlalchemy import Column, Integer, String, ForeignKey, Table, \
-    UniqueConstraint, BigInteger, TIMESTAMP, DateTime, func, Date
-from sqlalchemy import Float, Boolean
+    UniqueConstraint, CheckConstraint, BigInteger, TIMESTAMP, DateTime, func, Date, Index, text
+from sqlalchemy import Float, Boolean, SmallInteger, inspect
 
 from bot.database.main import engine
 from bot.misc.util import CONFIG
@@ -16,57 +20,59 @@ class SuperOffer(Base):
     __tablename__ = 'super_offer'
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     days = Column(Integer, default=31)
-    price = Column(Integer, default=CONFIG.month_cost[0])
+    price = Column(Integer, nullable=False, default=CONFIG.month_cost[0])
 
 
 class Groups(Base):
     __tablename__ = 'groups'
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     name = Column(String, unique=True)
-    servers = relationship('Servers', back_populates="group_tabel")
-    users = relationship('Persons', back_populates="group_tabel")
+    servers = relationship('Servers', back_populates="group_tabel", foreign_keys='Servers.group_id')
+    users = relationship('Persons', back_populates="group_tabel", foreign_keys='Persons.group_id')
 
 
 class Persons(Base):
     __tablename__ = 'users'
+    # Значения server_default возвращаются через RETURNING сразу при INSERT
+    __mapper_args__ = {'eager_defaults': True}
     id = Column(Integer, primary_key=True, index=True)
     tgid = Column(BigInteger, unique=True)
     client_id = Column(String, nullable=True)  # Добавил поле с ClientID
-    banned = Column(Boolean, default=False)
-    bot_blocked = Column(Boolean, default=False)  # Пользователь заблокировал бота
+    banned = Column(Boolean, nullable=False, server_default=text('false'))
+    bot_blocked = Column(Boolean, nullable=False, server_default=text('false'))  # Пользователь заблокировал бота
     bot_blocked_at = Column(TIMESTAMP(timezone=True), nullable=True)  # Когда заблокировал бота
-    notion_oneday = Column(Boolean, default=False)
-    subscription = Column(BigInteger)
+    notion_oneday = Column(Boolean, nullable=False, server_default=text('false'))
+    subscription = Column(BigInteger)  # Unix time окончания подписки (индекс — idx_users_summary)
     subscription_months = Column(Integer, nullable=True)  # На сколько месяцев пользователь оформил последнюю подписку
     subscription_price = Column(Integer, nullable=True)  # По какой цене пользователь оформил последнюю подписку
     payment_method_id = Column(String, nullable=True)  # ID по которому проводится автооплата
-    balance = Column(Integer, default=0)
+    balance = Column(Integer, nullable=False, server_default=text('0'))
     username = Column(String)
     fullname = Column(String)
-    retention = Column(Integer, default=0)  # Сколько раз покупал подписку
-    first_interaction = Column(TIMESTAMP(timezone=True), nullable=True)  # Дата первого взаимодействия
+    retention = Column(Integer, nullable=False, server_default=text('0'))  # Сколько раз покупал подписку
+    first_interaction = Column(TIMESTAMP(timezone=True), nullable=True, server_default=text('clock_timestamp()'))  # Дата первого взаимодействия
     last_interaction = Column(TIMESTAMP(timezone=True), nullable=True)  # Дата последнего взаимодействия
     referral_user_tgid = Column(BigInteger, nullable=True)
     referral_utm = Column(String, nullable=True)  # UTM-метка реферальной ссылки
-    referral_balance = Column(Integer, default=0)
+    referral_balance = Column(Integer, nullable=False, server_default=text('0'))
     lang = Column(String, default=CONFIG.languages)
     lang_tg = Column(String, nullable=True)
     # Subscription system fields
-    subscription_active = Column(Boolean, default=False)  # Активна ли subscription подписка
+    subscription_active = Column(Boolean, nullable=False, server_default=text('false'))  # Активна ли subscription подписка
     subscription_token = Column(String(255), nullable=True, unique=True, index=True)  # HMAC токен для subscription URL
     subscription_created_at = Column(TIMESTAMP(timezone=True), nullable=True)  # Когда создан токен
     subscription_updated_at = Column(TIMESTAMP(timezone=True), nullable=True)  # Когда обновлен токен
-    free_trial_used = Column(Boolean, default=False)  # Использовал ли пользователь бесплатный пробный период
+    free_trial_used = Column(Boolean, nullable=False, server_default=text('false'))  # Использовал ли пользователь бесплатный пробный период
     traffic_source = Column(String, nullable=True)  # Источник трафика (откуда узнал о боте)
-    subscription_expired = Column(Boolean, default=False)  # Истекла ли подписка (мягкое ограничение, не бан)
+    subscription_expired = Column(Boolean, nullable=False, server_default=text('false'))  # Истекла ли подписка (мягкое ограничение, не бан)
     # Autopay retry fields
     autopay_retry_count = Column(Integer, default=0)  # Количество неудачных попыток автооплаты
     autopay_last_attempt = Column(TIMESTAMP(timezone=True), nullable=True)  # Время последней попытки автооплаты
     # Traffic monitoring fields
-    total_traffic_bytes = Column(BigInteger, default=0)  # Суммарный трафик со всех серверов
+    total_traffic_bytes = Column(BigInteger, nullable=False, server_default=text('0'))  # Суммарный трафик со всех серверов
     traffic_offset_bytes = Column(BigInteger, default=0)  # Offset для сброса трафика (при оплате)
     traffic_reset_date = Column(TIMESTAMP(timezone=True), nullable=True)  # Дата последнего сброса трафика
-    traffic_limit_bytes = Column(BigInteger, default=536870912000)  # Лимит трафика (500GB по умолчанию)
+    traffic_limit_bytes = Column(BigInteger, nullable=False, server_default=text('536870912000'))  # Лимит трафика (500GB по умолчанию)
     previous_traffic_bytes = Column(BigInteger, default=0)  # Предыдущее значение трафика (для отслеживания активности)
     daily_traffic_start_bytes = Column(BigInteger, default=0)  # Трафик на начало дня (для суточной статистики)
     traffic_last_change = Column(TIMESTAMP(timezone=True), nullable=True)  # Когда последний раз менялся трафик
@@ -98,8 +104,12 @@ class Persons(Base):
     group = Column(
         String,
         ForeignKey("groups.name", ondelete='SET NULL'),
-        nullable=True)
-    group_tabel = relationship(Groups, back_populates="users")
+        nullable=True)  # Имя группы (для отображения)
+    group_id = Column(
+        Integer,
+        ForeignKey("groups.id", ondelete='SET NULL'),
+        nullable=True)  # Группа для JOIN и фильтров
+    group_tabel = relationship(Groups, back_populates="users", foreign_keys=[group_id])
     payment = relationship('Payments', back_populates='payment_id')
     promocode = relationship(
         'PromoCode',
@@ -112,6 +122,19 @@ class Persons(Base):
     )
     subscription_logs = relationship('SubscriptionLogs', back_populates='user')
 
+    __table_args__ = (
+        # Частичный индекс только по активным подписчикам для ежедневных подсчётов
+        Index(
+            'idx_users_active_subs', 'subscription',
+            postgresql_where=text('subscription_active AND NOT subscription_expired AND NOT bot_blocked')
+        ),
+        # Покрывающий индекс для списков в админке (index-only scan по tgid/subscription/balance)
+        Index('idx_users_summary', 'subscription', 'balance', 'tgid'),
+        Index('ix_users_group_server', 'group_id', 'server'),
+        CheckConstraint('balance >= 0', name='ck_users_balance_non_negative'),
+        CheckConstraint('retention >= 0', name='ck_users_retention_non_negative'),
+    )
+
 
 class Servers(Base):
     __tablename__ = 'servers'
@@ -133,8 +156,13 @@ class Servers(Base):
     group = Column(
         String,
         ForeignKey("groups.name", ondelete='SET NULL'),
-        nullable=True)
-    group_tabel = relationship(Groups, back_populates="servers")
+        nullable=True)  # Имя группы (для отображения)
+    group_id = Column(
+        Integer,
+        ForeignKey("groups.id", ondelete='SET NULL'),
+        nullable=True,
+        index=True)  # Группа для JOIN и фильтров
+    group_tabel = relationship(Groups, back_populates="servers", foreign_keys=[group_id])
     users = relationship(Persons, back_populates="server_table")
     static = relationship("StaticPersons", back_populates="server_table")
 
@@ -261,10 +289,19 @@ class SubscriptionLogs(Base):
     ip_address = Column(String(45), nullable=True)  # IPv4 or IPv6
     user_agent = Column(String(255), nullable=True)
     servers_count = Column(Integer, nullable=True)  # Сколько серверов было в ответе
-    accessed_at = Column(TIMESTAMP(timezone=True), nullable=False, default=func.now(), index=True)
+    accessed_at = Column(TIMESTAMP(timezone=True), nullable=False, default=func.now())
 
     user = relationship("Persons", back_populates="subscription_logs")
 
+    __table_args__ = (
+        # Таблица только дописывается, accessed_at растёт монотонно — BRIN в разы меньше btree
+        Index(
+            'ix_sublogs_accessed_brin', 'accessed_at',
+            postgresql_using='brin',
+            postgresql_with={'pages_per_range': 32}
+        ),
+    )
+
 
 class WinbackPromo(Base):
     """
@@ -291,6 +328,11 @@ class WinbackPromo(Base):
     # Связь с использованиями
     usages = relationship("WinbackPromoUsage", back_populates="promo", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        CheckConstraint('code = upper(trim(code))', name='ck_winback_promo_code_normalized'),
+        CheckConstraint('discount_percent BETWEEN 0 AND 100', name='ck_winback_promo_discount_range'),
+    )
+
 
 class WinbackPromoUsage(Base):
     """
@@ -312,6 +354,16 @@ class WinbackPromoUsage(Base):
     # Связь с промокодом
     promo = relationship("WinbackPromo", back_populates="usages")
 
+    __table_args__ = (
+        # Индекс уникального ограничения обслуживает и поиск по promo_id
+        UniqueConstraint('promo_id', 'user_tgid', name='uq_winback_promo_user'),
+        # Поиск действующего неиспользованного промокода пользователя
+        Index(
+            'ix_wpu_unused', 'user_tgid', 'expires_at',
+            postgresql_where=text('used_at IS NULL')
+        ),
+    )
+
 
 class DashboardLogs(Base):
     """Логи действий в веб-кабинете."""
@@ -364,7 +416,75 @@ class MtprotoProxyIps(Base):
     )
 
 
+class MailingJobs(Base):
+    """
+    Задание рассылки из админки.
+    Отправляет фоновый воркер (bot/misc/mailing_worker.py), прогресс хранится
+    в mailing_targets — после перезапуска бота рассылка продолжается.
+    """
+    __tablename__ = "mailing_jobs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    option = Column(String(20), nullable=False)  # all / sub / no / vpn_type / server
+    server_id = Column(Integer, nullable=True)
+    vpn_type = Column(Integer, nullable=True)
+    text = Column(String(4096), nullable=True)  # Текст сообщения или подпись к фото
+    photo_file_id = Column(String(255), nullable=True)
+    created_by = Column(BigInteger, nullable=False)  # tgid админа, ему уходит результат
+    lang = Column(String(10), nullable=False)
+    progress_message_id = Column(Integer, nullable=True)  # Сообщение админу с прогрессом
+    finished = Column(Boolean, nullable=False, default=False, server_default='false')
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    finished_at = Column(TIMESTAMP(timezone=True), nullable=True)
+
+
+class MailingTargets(Base):
+    """Получатели рассылки и статус отправки каждому"""
+    __tablename__ = "mailing_targets"
+
+    PENDING = 0
+    SENT = 1
+    FAILED = 2
+
+    job_id = Column(Integer, ForeignKey("mailing_jobs.id", ondelete='CASCADE'), primary_key=True)
+    tgid = Column(BigInteger, primary_key=True)
+    status = Column(SmallInteger, nullable=False, default=PENDING, server_default='0')
+
+    __table_args__ = (
+        # Воркер выбирает только неотправленных — частичный индекс остаётся маленьким
+        Index(
+            'ix_mailing_targets_pending', 'job_id', 'tgid',
+            postgresql_where=text('status = 0')
+        ),
+    )
+
+
+MIGRATIONS_DIR = Path(__file__).resolve().parents[1] / 'migrations'
+
+
+def _alembic_head() -> str:
+    """Последняя ревизия из bot/database/migrations (читается с диска, без БД)"""
+    config = Config()
+    config.set_main_option('script_location', str(MIGRATIONS_DIR))
+    return ScriptDirectory.from_config(config).get_current_head()
+
+
+async def _schema_is_current(conn) -> bool:
+    """Схема уже на последней ревизии Alembic — create_all не нужен"""
+    has_version_table = await conn.run_sync(
+        lambda sync_conn: inspect(sync_conn).has_table('alembic_version')
+    )
+    if not has_version_table:
+        return False
+    result = await conn.execute(text('SELECT version_num FROM alembic_version'))
+    return result.scalar() == _alembic_head()
+
+
 async def create_all_table():
     async_engine = engine()
     async with async_engine.begin() as conn:
+        # На БД под Alembic вместо проверки каждой таблицы достаточно одной ревизии;
+        # новая или отстающая БД (dev, тесты) создаётся через create_all как раньше
+        if await _schema_is_current(conn):
+            return
         await conn.run_sync(Base.metadata.create_all)
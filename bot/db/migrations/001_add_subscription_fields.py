@@ -8,6 +8,7 @@ import asyncpg
 import logging
 import sys
 import os
+from typing import Optional
 
 # Add bot path
 sys.path.insert(0, '/root/github_repos/VPN_BOT')
@@ -16,6 +17,30 @@ logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
 
+# Общий пул соединений на весь запуск скрипта, создаётся при первом обращении
+_pool: Optional[asyncpg.Pool] = None
+
+
+async def get_pool() -> asyncpg.Pool:
+    """
+    Пул соединений к БД (тестовая), общий для миграции, проверки и отката
+    """
+    global _pool
+    if _pool is None:
+        _pool = await asyncpg.create_pool(
+            host='localhost',
+            port=5432,
+            user='postgres',
+            password=os.environ.get('POSTGRES_PASSWORD', 'postgres'),
+            database='VPNHubBotDB_TEST',
+            min_size=1,
+            max_size=2,
+            # JIT только замедляет первые короткие запросы к каталогу
+            server_settings={'jit': 'off'}
+        )
+    return _pool
+
+
 async def run_migration():
     """
     Добавить поля для subscription системы
@@ -24,78 +49,66 @@ async def run_migration():
     log.info("Starting migration: add_subscription_fields")
     log.info("="*60)
 
-    # Подключение к БД (тестовая)
-    conn = await asyncpg.connect(
-        host='localhost',
-        port=5432,
-        user='postgres',
-        password=os.environ.get('POSTGRES_PASSWORD', 'postgres'),
-        database='VPNHubBotDB_TEST'
-    )
-
-    try:
-        # 1. Добавить поля в users
-        log.info("1. Adding subscription fields to users table...")
-        await conn.execute("""
-            ALTER TABLE users
-            ADD COLUMN IF NOT EXISTS subscription_token VARCHAR(255),
-            ADD COLUMN IF NOT EXISTS subscription_created_at TIMESTAMP,
-            ADD COLUMN IF NOT EXISTS subscription_updated_at TIMESTAMP;
-        """)
-        log.info("   ✅ Added subscription fields to users table")
-
-        # 2. Создать индекс
-        log.info("2. Creating index on subscription_token...")
-        await conn.execute("""
-            CREATE UNIQUE INDEX IF NOT EXISTS idx_users_subscription_token
-            ON users(subscription_token) WHERE subscription_token IS NOT NULL;
-        """)
-        log.info("   ✅ Created index on subscription_token")
-
-        # 3. Создать таблицу логов
-        log.info("3. Creating subscription_logs table...")
-        await conn.execute("""
-            CREATE TABLE IF NOT EXISTS subscription_logs (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                ip_address VARCHAR(45),
-                user_agent VARCHAR(255),
-                servers_count INTEGER,
-                accessed_at TIMESTAMP DEFAULT NOW()
-            );
-        """)
-        log.info("   ✅ Created subscription_logs table")
-
-        # 4. Индексы для логов
-        log.info("4. Creating indexes on subscription_logs...")
-        await conn.execute("""
-            CREATE INDEX IF NOT EXISTS idx_subscription_logs_user
-            ON subscription_logs(user_id);
-
-            CREATE INDEX IF NOT EXISTS idx_subscription_logs_time
-            ON subscription_logs(accessed_at);
-        """)
-        log.info("   ✅ Created indexes on subscription_logs")
-
-        # 5. Добавить поля в user_keys (опционально)
-        log.info("5. Adding fields to user_keys table...")
-        await conn.execute("""
-            ALTER TABLE user_keys
-            ADD COLUMN IF NOT EXISTS created_on_demand BOOLEAN DEFAULT false,
-            ADD COLUMN IF NOT EXISTS key_type INTEGER DEFAULT 1;
-        """)
-        log.info("   ✅ Added fields to user_keys table")
-        log.info("   Note: key_type: 0=Outline, 1=VLESS, 2=Shadowsocks")
-
-        log.info("="*60)
-        log.info("✅ Migration completed successfully!")
-        log.info("="*60)
-
-    except Exception as e:
-        log.error(f"❌ Migration failed: {e}")
-        raise
-    finally:
-        await conn.close()
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        try:
+            # Весь DDL в одной транзакции: при ошибке схема откатывается целиком
+            async with conn.transaction():
+                # 1. Добавить поля в users
+                log.info("1. Adding subscription fields to users table...")
+                await conn.execute("""
+                    ALTER TABLE users
+                    ADD COLUMN IF NOT EXISTS subscription_token VARCHAR(255),
+                    ADD COLUMN IF NOT EXISTS subscription_created_at TIMESTAMP,
+                    ADD COLUMN IF NOT EXISTS subscription_updated_at TIMESTAMP;
+                """)
+                log.info("   ✅ Added subscription fields to users table")
+
+                # 2. Создать таблицу логов
+                log.info("2. Creating subscription_logs table...")
+                await conn.execute("""
+                    CREATE TABLE IF NOT EXISTS subscription_logs (
+                        id SERIAL PRIMARY KEY,
+                        user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+                        ip_address VARCHAR(45),
+                        user_agent VARCHAR(255),
+                        servers_count INTEGER,
+                        accessed_at TIMESTAMP DEFAULT NOW()
+                    );
+                """)
+                log.info("   ✅ Created subscription_logs table")
+
+                # 3. Все индексы одной командой
+                log.info("3. Creating indexes on users and subscription_logs...")
+                await conn.execute("""
+                    CREATE UNIQUE INDEX IF NOT EXISTS idx_users_subscription_token
+                    ON users(subscription_token) WHERE subscription_token IS NOT NULL;
+
+                    CREATE INDEX IF NOT EXISTS idx_subscription_logs_user
+                    ON subscription_logs(user_id);
+
+                    CREATE INDEX IF NOT EXISTS idx_subscription_logs_time
+                    ON subscription_logs(accessed_at);
+                """)
+                log.info("   ✅ Created indexes")
+
+                # 4. Добавить поля в user_keys (опционально)
+                log.info("4. Adding fields to user_keys table...")
+                await conn.execute("""
+                    ALTER TABLE user_keys
+                    ADD COLUMN IF NOT EXISTS created_on_demand BOOLEAN DEFAULT false,
+                    ADD COLUMN IF NOT EXISTS key_type INTEGER DEFAULT 1;
+                """)
+                log.info("   ✅ Added fields to user_keys table")
+                log.info("   Note: key_type: 0=Outline, 1=VLESS, 2=Shadowsocks")
+
+            log.info("="*60)
+            log.info("✅ Migration completed successfully!")
+            log.info("="*60)
+
+        except Exception as e:
+            log.error(f"❌ Migration failed: {e}")
+            raise
 
 
 async def verify_migration():
@@ -106,75 +119,57 @@ async def verify_migration():
     log.info("Verifying migration...")
     log.info("="*60)
 
-    conn = await asyncpg.connect(
-        host='localhost',
-        port=5432,
-        user='postgres',
-        password=os.environ.get('POSTGRES_PASSWORD', 'postgres'),
-        database='VPNHubBotDB_TEST'
-    )
-
-    try:
-        # Проверить поля в users
-        result = await conn.fetch("""
-            SELECT column_name, data_type
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        # Все проверки одним запросом: (check, name, detail)
+        rows = await conn.fetch("""
+            SELECT 'users_column' AS check, column_name::text AS name, data_type::text AS detail
             FROM information_schema.columns
             WHERE table_name = 'users'
             AND column_name IN ('subscription_token', 'subscription_created_at', 'subscription_updated_at')
-            ORDER BY column_name;
+            UNION ALL
+            SELECT 'table', table_name::text, NULL
+            FROM information_schema.tables
+            WHERE table_name = 'subscription_logs'
+            UNION ALL
+            SELECT 'index', indexname::text, NULL
+            FROM pg_indexes
+            WHERE tablename IN ('users', 'subscription_logs')
+            AND indexname LIKE '%subscription%'
+            UNION ALL
+            SELECT 'user_keys_column', column_name::text, data_type::text
+            FROM information_schema.columns
+            WHERE table_name = 'user_keys'
+            AND column_name IN ('created_on_demand', 'key_type')
+            ORDER BY 1, 2;
         """)
+        found = {}
+        for row in rows:
+            found.setdefault(row['check'], []).append(row)
 
         log.info("1. Fields in users table:")
-        for row in result:
-            log.info(f"   ✅ {row['column_name']}: {row['data_type']}")
-
-        # Проверить таблицу subscription_logs
-        exists = await conn.fetchval("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables
-                WHERE table_name = 'subscription_logs'
-            );
-        """)
+        for row in found.get('users_column', []):
+            log.info(f"   ✅ {row['name']}: {row['detail']}")
 
-        if exists:
+        if found.get('table'):
             log.info("2. Table subscription_logs:")
             log.info(f"   ✅ EXISTS")
         else:
             log.error("2. Table subscription_logs:")
             log.error(f"   ❌ NOT EXISTS")
 
-        # Проверить индексы
-        indexes = await conn.fetch("""
-            SELECT indexname
-            FROM pg_indexes
-            WHERE tablename IN ('users', 'subscription_logs')
-            AND indexname LIKE '%subscription%'
-            ORDER BY indexname;
-        """)
-
         log.info("3. Indexes:")
-        for idx in indexes:
-            log.info(f"   ✅ {idx['indexname']}")
-
-        # Проверить поля в user_keys
-        result = await conn.fetch("""
-            SELECT column_name, data_type
-            FROM information_schema.columns
-            WHERE table_name = 'user_keys'
-            AND column_name IN ('created_on_demand', 'key_type')
-            ORDER BY column_name;
-        """)
+        for row in found.get('index', []):
+            log.info(f"   ✅ {row['name']}")
 
         log.info("4. Fields in user_keys table:")
-        for row in result:
-            log.info(f"   ✅ {row['column_name']}: {row['data_type']}")
+        for row in found.get('user_keys_column', []):
+            log.info(f"   ✅ {row['name']}: {row['detail']}")
 
         log.info("="*60)
         log.info("✅ Verification completed!")
         log.info("="*60)
 
-    finally:
-        await conn.close()
 
 
 async def rollback_migration():
@@ -185,15 +180,8 @@ async def rollback_migration():
     log.info("Rolling back migration: add_subscription_fields")
     log.info("="*60)
 
-    conn = await asyncpg.connect(
-        host='localhost',
-        port=5432,
-        user='postgres',
-        password=os.environ.get('POSTGRES_PASSWORD', 'postgres'),
-        database='VPNHubBotDB_TEST'
-    )
-
-    try:
+    pool = await get_pool()
+    async with pool.acquire() as conn:
         await conn.execute("DROP TABLE IF EXISTS subscription_logs;")
         log.info("✅ Dropped subscription_logs table")
 
@@ -216,15 +204,20 @@ async def rollback_migration():
         log.info("✅ Rollback completed")
         log.info("="*60)
 
+
+async def main(action: str):
+    try:
+        if action == "rollback":
+            await rollback_migration()
+        elif action == "verify":
+            await verify_migration()
+        else:
+            await run_migration()
+            await verify_migration()
     finally:
-        await conn.close()
+        if _pool is not None:
+            await _pool.close()
 
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1 and sys.argv[1] == "rollback":
-        asyncio.run(rollback_migration())
-    elif len(sys.argv) > 1 and sys.argv[1] == "verify":
-        asyncio.run(verify_migration())
-    else:
-        asyncio.run(run_migration())
-        asyncio.run(verify_migration())
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else "migrate"))
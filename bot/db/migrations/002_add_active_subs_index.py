@@ -0,0 +1,132 @@
+"""
+Migration: Add partial index for active subscribers
+Date: 2026-10-17
+"""
+import asyncio
+import asyncpg
+import logging
+import sys
+import os
+
+# Add bot path
+sys.path.insert(0, '/root/github_repos/VPN_BOT')
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+async def run_migration():
+    """
+    Создать частичный индекс по активным подписчикам
+    """
+    log.info("="*60)
+    log.info("Starting migration: add_active_subs_index")
+    log.info("="*60)
+
+    # Подключение к БД (тестовая)
+    conn = await asyncpg.connect(
+        host='localhost',
+        port=5432,
+        user='postgres',
+        password=os.environ.get('POSTGRES_PASSWORD', 'postgres'),
+        database='VPNHubBotDB_TEST'
+    )
+
+    try:
+        # CONCURRENTLY нельзя выполнять внутри транзакции,
+        # asyncpg без явного transaction() работает в autocommit
+        log.info("1. Creating partial index idx_users_active_subs...")
+        await conn.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_active_subs
+            ON users(subscription)
+            WHERE subscription_active = true
+              AND subscription_expired = false
+              AND bot_blocked = false;
+        """)
+        log.info("   ✅ Created index idx_users_active_subs")
+
+        log.info("="*60)
+        log.info("✅ Migration completed successfully!")
+        log.info("="*60)
+
+    except Exception as e:
+        log.error(f"❌ Migration failed: {e}")
+        raise
+    finally:
+        await conn.close()
+
+
+async def verify_migration():
+    """
+    Проверить что миграция выполнена
+    """
+    log.info("\n" + "="*60)
+    log.info("Verifying migration...")
+    log.info("="*60)
+
+    conn = await asyncpg.connect(
+        host='localhost',
+        port=5432,
+        user='postgres',
+        password=os.environ.get('POSTGRES_PASSWORD', 'postgres'),
+        database='VPNHubBotDB_TEST'
+    )
+
+    try:
+        indexdef = await conn.fetchval("""
+            SELECT indexdef
+            FROM pg_indexes
+            WHERE tablename = 'users'
+            AND indexname = 'idx_users_active_subs';
+        """)
+
+        log.info("1. Index idx_users_active_subs:")
+        if indexdef:
+            log.info(f"   ✅ {indexdef}")
+        else:
+            log.error(f"   ❌ NOT EXISTS")
+
+        log.info("="*60)
+        log.info("✅ Verification completed!")
+        log.info("="*60)
+
+    finally:
+        await conn.close()
+
+
+async def rollback_migration():
+    """
+    Откат миграции (для тестов)
+    """
+    log.info("="*60)
+    log.info("Rolling back migration: add_active_subs_index")
+    log.info("="*60)
+
+    conn = await asyncpg.connect(
+        host='localhost',
+        port=5432,
+        user='postgres',
+        password=os.environ.get('POSTGRES_PASSWORD', 'postgres'),
+        database='VPNHubBotDB_TEST'
+    )
+
+    try:
+        await conn.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_users_active_subs;")
+        log.info("✅ Dropped index idx_users_active_subs")
+
+        log.info("="*60)
+        log.info("✅ Rollback completed")
+        log.info("="*60)
+
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "rollback":
+        asyncio.run(rollback_migration())
+    elif len(sys.argv) > 1 and sys.argv[1] == "verify":
+        asyncio.run(verify_migration())
+    else:
+        asyncio.run(run_migration())
+        asyncio.run(verify_migration())
@@ -5,9 +5,8 @@ from bot.misc.util import CONFIG
 
 
 class IsAdmin(Filter):
-    def __init__(self):
-        config = CONFIG
-        self.admins_ids = config.admins_ids
+    # Список админов задаётся в конфиге и не меняется во время работы
+    admins_ids = frozenset(CONFIG.admins_ids)
 
     async def __call__(self, event: Union[Message, CallbackQuery]) -> bool:
         return event.from_user.id in self.admins_ids
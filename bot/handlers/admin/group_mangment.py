@@ -180,7 +180,7 @@ async def add_group_users(message: Message, state: FSMContext) -> None:
             await delete_key(user)
         users_id.append(user.tgid)
     if data['action'] == 'add':
-        count_users = await persons_add_group(users_id, group.name)
+        count_users = await persons_add_group(users_id, group)
         message_user = _('admin_group_user_add_success', lang)
     else:
         count_users = await persons_add_group(users_id)
@@ -1,35 +1,48 @@
+import asyncio
 import io
 import logging
+import re
+import time
+import traceback
+from functools import lru_cache
 
 from aiogram import Router, F
 from aiogram.fsm.state import StatesGroup, State
-from aiogram.types import Message, CallbackQuery, BufferedInputFile, ReplyKeyboardRemove
+from aiogram.types import Message, CallbackQuery, BufferedInputFile, ReplyKeyboardRemove, \
+    InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.utils.formatting import Text, Bold, Spoiler, Code
+from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram_dialog import DialogManager, StartMode
 
 from bot.filters.main import IsAdmin
+from bot.middlewares.lang import LangMiddleware
 from bot.database.methods.get import (
     get_all_server,
     get_server,
+    get_server_id,
     get_person_id,
-    get_all_user,
-    get_all_subscription,
-    get_no_subscription,
-    get_users_by_server_and_vpn_type
+    get_users_count,
+    get_total_payments,
+    get_traffic_statistics,
+    get_all_static_user,
+    get_all_groups
 )
+from bot.database.methods.insert import add_mailing_job
 from bot.database.methods.update import (
     server_work_update,
-    server_space_update,
+    server_space_update_many,
     update_delete_users_server
 )
-from bot.handlers.admin.group_mangment import group_management
+from bot.handlers.admin.group_mangment import group_management, Group
 from bot.handlers.admin.referal_admin import referral_router
 from bot.handlers.admin.super_offer_dialog import SuperOfferSG
 from bot.handlers.admin.user_management import (
     user_management_router,
-    string_user
+    string_user,
+    EditUser,
+    StaticUser
 )
 from bot.handlers.admin.state_servers import state_admin_router
 from bot.handlers.admin.state_servers import AddServer, RemoveServer
@@ -56,19 +69,97 @@ from bot.keyboards.reply.admin_reply import (
     back_server_menu, back_admin_menu
 )
 from bot.keyboards.reply.user_reply import user_menu
+from bot.misc.VPN import ServerManagerPool
 from bot.misc.VPN.ServerManager import ServerManager
-from bot.misc.language import Localization, get_lang
+from bot.misc.language import Localization
+from bot.misc.mailing_worker import wake_mailing_worker
 from bot.misc.util import CONFIG
-from bot.misc.callbackData import ServerWork, ServerUserList, MissingMessage, AdminMenuNav
+from bot.misc.callbackData import ServerWork, ServerUserList, MissingMessage, AdminMenuNav, RegenerateKeys
+from bot.misc.traffic_monitor import get_all_bypass_traffic, get_bypass_servers, format_bytes
 
 log = logging.getLogger(__name__)
 
 _ = Localization.text
 btn_text = Localization.get_reply_button
 
+# Сколько ключей Outline удаляем с сервера одновременно
+DELETE_CLIENTS_CONCURRENCY = 10
+# Сколько секунд не опрашиваем сервер после неудачного подключения
+SERVER_DOWN_TTL = 30
+_server_down_until: dict[int, float] = {}
+# Ключ клиента бота — tgid только из ASCII-цифр
+# (str.isdigit пропускает и '²', на котором падает int)
+_DIGIT_RE = re.compile(r'^[0-9]+$')
+
+# Вход в админку и возврат в неё — один обработчик
+ADMIN_PANEL_TEXTS = frozenset(
+    btn_text('admin_panel_btn') + btn_text('admin_back_admin_menu_btn')
+)
+
+# Держим ссылки на фоновые задачи, иначе их может собрать GC
+_bg_tasks: set[asyncio.Task] = set()
+
+
+async def _safe_delete(message: Message) -> None:
+    try:
+        await message.delete()
+    except Exception as e:
+        log.info(f'Could not delete message {message.message_id}: {e}')
+
+
+def delete_in_background(message: Message) -> None:
+    """Удаляет сообщение, не задерживая ответ обработчика"""
+    task = asyncio.create_task(_safe_delete(message))
+    _bg_tasks.add(task)
+    task.add_done_callback(_bg_tasks.discard)
+
+
+# Клавиатура без состояния — один экземпляр на модуль
+REMOVE_KEYBOARD = ReplyKeyboardRemove()
+
+# Подписи для карточки сервера
+_VPN_NAME = {k: v.NAME_VPN for k, v in ServerManager.VPN_TYPES.items()}
+_SCHEME = {True: 'Https', False: 'Http'}
+_PANEL = {'alireza': 'Alireza 🕹'}
+
+REGENERATE_INTRO_TEXT = (
+    "🔄 Регенерация ключей VPN\n\n"
+    "Этот инструмент позволяет массово обновить VPN ключи пользователей "
+    "после изменения портов или других настроек серверов.\n\n"
+    "📋 Процесс:\n"
+    "1. Выбор серверов\n"
+    "2. Выбор протоколов (Outline/Vless/Shadowsocks)\n"
+    "3. Подтверждение\n"
+    "4. Автоматическая регенерация и отправка новых ключей\n\n"
+    "⚠️ Убедитесь, что изменения на серверах уже применены!"
+)
+
+
+@lru_cache(maxsize=2)
+def regenerate_keys_kb(back: bool) -> InlineKeyboardMarkup:
+    """Клавиатура запуска регенерации ключей, статична — строим один раз"""
+    kb = InlineKeyboardBuilder()
+    kb.row(
+        InlineKeyboardButton(
+            text='🚀 Начать регенерацию',
+            callback_data=RegenerateKeys(action='start').pack()
+        )
+    )
+    if back:
+        kb.row(
+            InlineKeyboardButton(
+                text='⬅️ Назад',
+                callback_data=AdminMenuNav(menu='main').pack()
+            )
+        )
+    return kb.as_markup()
+
+
 admin_router = Router()
 admin_router.message.filter(IsAdmin())
 admin_router.callback_query.filter(IsAdmin())
+admin_router.message.middleware(LangMiddleware())
+admin_router.callback_query.middleware(LangMiddleware())
 admin_router.include_routers(
     user_management_router,
     state_admin_router,
@@ -83,16 +174,12 @@ class StateMailing(StatesGroup):
     input_text = State()
 
 
-@admin_router.message(
-    (F.text.in_(btn_text('admin_panel_btn'))) |
-    (F.text.in_(btn_text('admin_back_admin_menu_btn')))
-)
-async def admin_panel(message: Message, state: FSMContext) -> None:
-    lang = await get_lang(message.from_user.id, state)
+@admin_router.message(F.text.in_(ADMIN_PANEL_TEXTS))
+async def admin_panel(message: Message, state: FSMContext, lang: str) -> None:
     # Убираем reply keyboard и показываем inline меню
     await message.answer(
         _('bot_control', lang),
-        reply_markup=ReplyKeyboardRemove()
+        reply_markup=REMOVE_KEYBOARD
     )
     await message.answer(
         "📊 Выберите раздел:",
@@ -106,12 +193,8 @@ async def start_super_offer_dialog(message: Message, state: FSMContext, dialog_m
 
 
 # todo: Server management
-@admin_router.message(
-    F.text.in_(btn_text('admin_servers_btn'))
-    or F.text == F.text.in_(btn_text('admin_back_users_menu_btn'))
-)
-async def command(message: Message, state: FSMContext) -> None:
-    lang = await get_lang(message.from_user.id, state)
+@admin_router.message(F.text.in_(btn_text('admin_servers_btn')))
+async def command(message: Message, state: FSMContext, lang: str) -> None:
     await message.answer(
         _('servers_control', lang),
         reply_markup=await server_menu(lang)
@@ -119,8 +202,7 @@ async def command(message: Message, state: FSMContext) -> None:
 
 
 @admin_router.message(F.text.in_(btn_text('admin_server_cancellation')))
-async def back_server_menu_bot(message: Message, state: FSMContext) -> None:
-    lang = await get_lang(message.from_user.id, state)
+async def back_server_menu_bot(message: Message, state: FSMContext, lang: str) -> None:
     await state.clear()
     await message.answer(
         _('servers_control', lang),
@@ -130,37 +212,47 @@ async def back_server_menu_bot(message: Message, state: FSMContext) -> None:
 
 # todo:Вывод серверов
 @admin_router.message(F.text.in_(btn_text('admin_server_show_all_btn')))
-async def server_menu_bot(message: Message, state: FSMContext) -> None:
-    lang = await get_lang(message.from_user.id, state)
+async def server_menu_bot(message: Message, state: FSMContext, lang: str) -> None:
+    await show_all_servers(message, lang)
+
+
+async def show_all_servers(message: Message, lang: str, back_menu: bool = False) -> None:
+    """
+    Карточки всех серверов: сначала заглушки «подключение…»,
+    затем параллельный опрос серверов и замена заглушек карточками.
+    back_menu — добавить кнопку возврата в inline-меню серверов
+    """
+    back_markup = await admin_back_inline_menu('servers', lang) if back_menu else None
     all_server = await get_all_server()
     if len(all_server) == 0:
-        await message.answer(_('servers_none', lang))
+        await message.answer(_('servers_none', lang), reply_markup=back_markup)
         return
     await message.answer(_('list_all_servers', lang))
-    space = 0
-    for server in all_server:
-        old_m = await message.answer(_('connect_continue', lang))
-        try:
-            client_server = await get_static_client(server)
-            space = len(client_server)
-            if not await server_space_update(server.name, space):
-                raise ("Failed to update the data about "
-                       "the free space on the server")
-            connect = True
-        except Exception as e:
-            log.error(e, 'error connecting to server')
-            connect = False
-        text_server = await get_server_info(server, space, connect, lang)
-        try:
-            await message.bot.delete_message(message.chat.id, old_m.message_id)
-        except Exception as e:
-            log.error('error deleting message from server')
+    old_messages = [
+        await message.answer(_('connect_continue', lang))
+        for server in all_server
+    ]
+    servers_space = await get_servers_space(all_server)
+    for old_m, server, (space, connect) in zip(old_messages, all_server, servers_space):
+        await show_server_card(old_m, server, space, connect, lang)
+    if back_menu:
         await message.answer(
-            **text_server.as_kwargs(),
-            reply_markup=await server_control(server.work, server.name, lang),
+            "⬅️ Вернуться в меню серверов",
+            reply_markup=back_markup
         )
 
 
+async def show_server_card(old_m, server, space, connect, lang):
+    """Заменяет сообщение «подключение…» карточкой сервера"""
+    text_server = await get_server_info(server, space, connect, lang)
+    reply_markup = await server_control(server.work, server.name, lang)
+    try:
+        await old_m.edit_text(**text_server.as_kwargs(), reply_markup=reply_markup)
+    except Exception as e:
+        log.error(f'error editing server message: {e}')
+        await old_m.answer(**text_server.as_kwargs(), reply_markup=reply_markup)
+
+
 async def get_server_info(server, space, connect, lang):
     if connect:
         space_text = _('space_server_text', lang).format(
@@ -177,44 +269,37 @@ async def get_server_info(server, space, connect, lang):
         work_text = _("server_use_s", lang)
     else:
         work_text = _("server_not_use_s", lang)
+    parts = [
+        _('server_name_s', lang), Code(server.name), '\n',
+        _('server_adress_s', lang), Code(server.ip), '\n',
+        _('server_password_vds_s', lang), Spoiler(server.vds_password),
+        '\n', _('server_group_s', lang), Bold(group),
+        '\n', _('server_type_vpn_s', lang), _VPN_NAME[server.type_vpn], '\n',
+    ]
     if server.type_vpn == 0:
-        return Text(
-            _('server_name_s', lang), Code(server.name), '\n',
-            _('server_adress_s', lang), Code(server.ip), '\n',
-            _('server_password_vds_s', lang), Spoiler(server.vds_password),
-            '\n', _('server_group_s', lang), Bold(group),
-            '\n', _('server_type_vpn_s', lang),
-            ServerManager.VPN_TYPES.get(server.type_vpn).NAME_VPN, '\n',
-            _('server_outline_connect_s', lang), Code(server.outline_link),
-            '\n', work_text, '\n', space_text
-        )
+        parts += [
+            _('server_outline_connect_s', lang), Code(server.outline_link), '\n',
+        ]
     else:
-        return Text(
-            _('server_name_s', lang), Code(server.name), '\n',
-            _('server_adress_s', lang), Code(server.ip), '\n',
-            _('server_password_vds_s', lang), Spoiler(server.vds_password),
-            '\n', _('server_group_s', lang), Bold(group),
-            '\n', _('server_type_vpn_s', lang),
-            ServerManager.VPN_TYPES.get(server.type_vpn).NAME_VPN, '\n',
+        parts += [
             _('server_type_connect_s', lang),
-            f'{"Https" if server.connection_method else "Http"}', '\n',
+            _SCHEME[bool(server.connection_method)], '\n',
             _('server_panel_control_s', lang),
-            f'{"Alireza 🕹" if server.panel == "alireza" else "Sanaei 🖲"}',
-            '\n',
+            _PANEL.get(server.panel, 'Sanaei 🖲'), '\n',
             _('server_id_connect_s', lang), Bold(server.inbound_id), '\n',
             _('server_login_s', lang), Bold(server.login), '\n',
             _('server_password_s', lang), Spoiler(server.password), '\n',
-            work_text, '\n', space_text
-        )
+        ]
+    return Text(*parts, work_text, '\n', space_text)
 
 
 @admin_router.callback_query(ServerWork.filter())
 async def callback_work_server(
         call: CallbackQuery,
         state: FSMContext,
-        callback_data: ServerWork
+        callback_data: ServerWork,
+        lang: str
 ):
-    lang = await get_lang(call.from_user.id, state)
     text_working = _('server_use_active', lang).format(
         name_server=callback_data.name_server
     )
@@ -227,54 +312,95 @@ async def callback_work_server(
     await call.answer()
 
 
-async def get_static_client(server):
-    server_manager = ServerManager(server)
-    await server_manager.login()
-    return await server_manager.get_all_user()
+async def get_static_client(server, force_refresh: bool = False):
+    """
+    Клиенты сервера. Недоступный сервер запоминается на SERVER_DOWN_TTL секунд,
+    чтобы каждое открытие списка серверов не ждало таймаута;
+    force_refresh — всё равно сходить на сервер (явное действие админа)
+    """
+    if not force_refresh and time.monotonic() < _server_down_until.get(server.id, 0):
+        raise ConnectionError(f'server {server.name} is marked as down')
+    try:
+        clients = await ServerManagerPool.call(server, 'get_all_user')
+    except Exception:
+        _server_down_until[server.id] = time.monotonic() + SERVER_DOWN_TTL
+        raise
+    if clients is None:
+        # ServerManager глушит ошибки подключения и возвращает None
+        _server_down_until[server.id] = time.monotonic() + SERVER_DOWN_TTL
+        raise ConnectionError(f'server {server.name} is not responding')
+    _server_down_until.pop(server.id, None)
+    return clients
+
+
+async def get_server_space(server):
+    """Возвращает (space, connect): число клиентов на сервере и удалось ли подключиться"""
+    try:
+        client_server = await get_static_client(server)
+        return len(client_server), True
+    except Exception as e:
+        log.error(f'error connecting to server {server.name}: {e}')
+        return 0, False
+
+
+async def get_servers_space(all_server):
+    """
+    Опрашивает все серверы одновременно, а не по очереди,
+    и одним запросом сохраняет занятость доступных серверов
+    """
+    servers_space = await asyncio.gather(
+        *(get_server_space(server) for server in all_server)
+    )
+    await server_space_update_many({
+        server.id: space
+        for server, (space, connect) in zip(all_server, servers_space)
+        if connect
+    })
+    return servers_space
 
 
-async def get_text_client(all_client, bot_client, lang):
-    text_client = ''
+async def get_text_client(all_client: set, bot_client, lang) -> bytes:
+    # Пишем сразу в буфер: без склейки одной большой строки и повторного encode
+    text_client = io.BytesIO()
     count = 1
     for client in bot_client:
-        text_client += await string_user(client, count, lang)
+        text_client.write((await string_user(client, count, lang)).encode())
         count += 1
-        all_client.remove(str(client.tgid))
+        all_client.discard(str(client.tgid))
     for unknown_client in all_client:
-        text_client += _('not_found_key', lang).format(
+        text_client.write(_('not_found_key', lang).format(
             unknown_client=unknown_client
-        )
-    return text_client
+        ).encode())
+    return text_client.getvalue()
 
 
 @admin_router.callback_query(ServerUserList.filter())
 async def call_list_server(
         call: CallbackQuery,
         callback_data: ServerUserList,
-        state: FSMContext
+        state: FSMContext,
+        lang: str
 ):
-    lang = await get_lang(call.from_user.id, state)
     server = await get_server(callback_data.name_server)
     try:
-        client_stats = await get_static_client(server)
+        client_stats = await get_static_client(server, force_refresh=True)
     except Exception as e:
         await call.message.answer(_('server_not_connect_admin', lang))
         await call.answer()
         log.error(e, 'server not connect')
         return
     try:
+        # Один проход: множество всех ключей и id клиентов бота
         if server.type_vpn == 0:
-            client_id = []
-            all_client = list({client.name for client in client_stats})
-            for client in client_stats:
-                if client.name.isdigit():
-                    client_id.append(int(client.name))
+            names = [client.name for client in client_stats]
         else:
-            client_id = []
-            all_client = list({client['email'] for client in client_stats})
-            for client in client_stats:
-                if client['email'].isdigit():
-                    client_id.append(int(client['email']))
+            names = [client['email'] for client in client_stats]
+        all_client = set()
+        client_id = []
+        for name in names:
+            all_client.add(name)
+            if name and name[0].isdigit() and _DIGIT_RE.match(name):
+                client_id.append(int(name))
         bot_client = await get_person_id(client_id)
         if not callback_data.action:
             await delete_users_server(call.message, server, bot_client, lang)
@@ -290,12 +416,11 @@ async def call_list_server(
         await call.answer()
         log.error(e, 'error get users BD')
         return
-    if text_client == '':
+    if not text_client:
         await call.message.answer(_('file_server_user_none', lang))
         await call.answer()
         return
-    file_stream = io.BytesIO(text_client.encode()).getvalue()
-    input_file = BufferedInputFile(file_stream, 'Clients_server.txt')
+    input_file = BufferedInputFile(text_client, 'Clients_server.txt')
     try:
         await call.message.answer_document(
             input_file,
@@ -309,15 +434,33 @@ async def call_list_server(
 
 
 async def delete_users_server(m, server, users, lang):
-    server_manager = ServerManager(server)
-    await server_manager.login()
-    for user in users:
+    semaphore = asyncio.Semaphore(DELETE_CLIENTS_CONCURRENCY)
+    # Массовое удаление идёт на отдельной свежей сессии, чтобы не занимать
+    # закэшированную сессию сервера на всё время удаления
+    async with ServerManagerPool.fresh_manager(server) as server_manager:
+        async def delete_client(user):
+            async with semaphore:
+                return await server_manager.delete_client(user.tgid)
+
         try:
-            await server_manager.delete_client(user.tgid)
+            if server.type_vpn == 0:
+                # Ключи Outline удаляются независимыми запросами — параллельно
+                results = await asyncio.gather(
+                    *(delete_client(user) for user in users)
+                )
+            else:
+                # x-ui на каждое удаление перезаписывает настройки inbound целиком,
+                # параллельные запросы затирают друг друга — только по очереди
+                results = [
+                    await server_manager.delete_client(user.tgid)
+                    for user in users
+                ]
         except Exception as e:
             log.error(e, 'not delete users server')
             await m.answer(_('error_delete_all_users_server', lang))
             return False
+    if not all(results):
+        log.warning(f'{results.count(False)} clients were not deleted from server {server.name}')
     await update_delete_users_server(server)
     return True
 
@@ -326,8 +469,7 @@ async def delete_users_server(m, server, users, lang):
     StateFilter(None),
     F.text.in_(btn_text('admin_server_add_btn'))
 )
-async def add_server_bot(message: Message, state: FSMContext) -> None:
-    lang = await get_lang(message.from_user.id, state)
+async def add_server_bot(message: Message, state: FSMContext, lang: str) -> None:
     await message.answer(
         _('input_name_server_admin', lang),
         reply_markup=await back_server_menu(lang))
@@ -335,8 +477,7 @@ async def add_server_bot(message: Message, state: FSMContext) -> None:
 
 
 @admin_router.message(F.text.in_(btn_text('admin_server_delete_btn')))
-async def delete_server_bot(message: Message, state: FSMContext) -> None:
-    lang = await get_lang(message.from_user.id, state)
+async def delete_server_bot(message: Message, state: FSMContext, lang: str) -> None:
     await message.answer(
         _('input_name_server_admin', lang),
         reply_markup=await back_server_menu(lang)
@@ -346,8 +487,7 @@ async def delete_server_bot(message: Message, state: FSMContext) -> None:
 
 # todo: Mailing list management
 @admin_router.message(F.text.in_(btn_text('admin_send_message_users_btn')))
-async def out_message_bot(message: Message, state: FSMContext) -> None:
-    lang = await get_lang(message.from_user.id, state)
+async def out_message_bot(message: Message, state: FSMContext, lang: str) -> None:
     await message.answer(
         _('who_should_i_send', lang),
         reply_markup=await missing_user_menu(lang)
@@ -355,35 +495,11 @@ async def out_message_bot(message: Message, state: FSMContext) -> None:
 
 
 @admin_router.message(F.text == '🔄 Регенерация ключей')
-async def regenerate_keys_menu(message: Message, state: FSMContext) -> None:
+async def regenerate_keys_menu(message: Message, state: FSMContext, lang: str) -> None:
     """Обработчик кнопки регенерации ключей"""
-    from bot.misc.callbackData import RegenerateKeys
-
-    lang = await get_lang(message.from_user.id, state)
-
-    # Создаем inline кнопку для запуска
-    from aiogram.utils.keyboard import InlineKeyboardBuilder
-    from aiogram.types import InlineKeyboardButton
-
-    kb = InlineKeyboardBuilder()
-    kb.row(
-        InlineKeyboardButton(
-            text='🚀 Начать регенерацию',
-            callback_data=RegenerateKeys(action='start').pack()
-        )
-    )
-
     await message.answer(
-        "🔄 Регенерация ключей VPN\n\n"
-        "Этот инструмент позволяет массово обновить VPN ключи пользователей "
-        "после изменения портов или других настроек серверов.\n\n"
-        "📋 Процесс:\n"
-        "1. Выбор серверов\n"
-        "2. Выбор протоколов (Outline/Vless/Shadowsocks)\n"
-        "3. Подтверждение\n"
-        "4. Автоматическая регенерация и отправка новых ключей\n\n"
-        "⚠️ Убедитесь, что изменения на серверах уже применены!",
-        reply_markup=kb.as_markup()
+        REGENERATE_INTRO_TEXT,
+        reply_markup=regenerate_keys_kb(back=False)
     )
 
 
@@ -391,8 +507,8 @@ async def regenerate_keys_menu(message: Message, state: FSMContext) -> None:
 async def update_message_bot(
         call: CallbackQuery,
         callback_data: MissingMessage,
-        state: FSMContext) -> None:
-    lang = await get_lang(call.from_user.id, state)
+        state: FSMContext,
+        lang: str) -> None:
 
     # Показать меню выбора типа VPN
     if callback_data.option == 'by_vpn_type':
@@ -424,7 +540,6 @@ async def update_message_bot(
         vpn_type=callback_data.vpn_type
     )
 
-    from bot.keyboards.inline.admin_inline import admin_back_inline_menu
     await call.message.edit_text(
         _('input_message_or_image', lang),
         reply_markup=await admin_back_inline_menu('mailing', lang)
@@ -434,89 +549,45 @@ async def update_message_bot(
 
 
 @admin_router.message(StateMailing.input_text)
-async def mailing_text(message: Message, state: FSMContext):
-    lang = await get_lang(message.from_user.id, state)
+async def mailing_text(message: Message, state: FSMContext, lang: str):
     try:
         data = await state.get_data()
         option = data.get('option')
         server_id = data.get('server_id', 0)
         vpn_type = data.get('vpn_type', -1)
 
-        # Определяем список пользователей в зависимости от опции
-        if option == 'all':
-            users = await get_all_user()
-        elif option == 'sub':
-            users = await get_all_subscription()
-        elif option == 'no':
-            users = await get_no_subscription()
-        elif option == 'vpn_type':
-            # Рассылка по типу VPN
-            users = await get_users_by_server_and_vpn_type(vpn_type=vpn_type)
+        if option == 'vpn_type':
             vpn_names = {0: 'Outline', 1: 'Vless', 2: 'Shadowsocks'}
             log.info(f'Рассылка для пользователей с VPN типом: {vpn_names.get(vpn_type)}')
         elif option == 'server':
-            # Рассылка по серверу
-            users = await get_users_by_server_and_vpn_type(server_id=server_id)
-            from bot.database.methods.get import get_server as get_server_id
             server = await get_server_id(server_id)
             log.info(f'Рассылка для пользователей сервера: {server.name if server else server_id}')
-        else:
-            users = await get_all_user()
-
-        count_not_suc = 0
+        elif option not in ('all', 'sub', 'no'):
+            option = 'all'
 
-        # Отправка сообщений (с ReplyKeyboardRemove для скрытия старой клавиатуры)
+        # Рассылку отправляет фоновый воркер: создаём задание и сразу отвечаем,
+        # прогресс и результат придут отдельными сообщениями
         if message.photo:
-            photo = message.photo[-1]
-            caption = message.caption if message.caption else ''
-            for user in users:
-                try:
-                    await message.bot.send_photo(
-                        user.tgid,
-                        photo.file_id,
-                        caption=caption,
-                        reply_markup=ReplyKeyboardRemove()
-                    )
-                except Exception as e:
-                    log.info(e, 'user block bot')
-                    count_not_suc += 1
-                    continue
+            text = message.caption if message.caption else ''
+            photo_file_id = message.photo[-1].file_id
         else:
-            for user in users:
-                try:
-                    await message.bot.send_message(
-                        user.tgid, message.text,
-                        reply_markup=ReplyKeyboardRemove()
-                    )
-                except Exception as e:
-                    log.info(e, 'user block bot')
-                    count_not_suc += 1
-                    continue
-
-        # Результат рассылки
-        result_text = _('result_mailing_text', lang).format(
-            all_count=len(users),
-            suc_count=len(users) - count_not_suc,
-            count_not_suc=count_not_suc
-        )
-
-        # Добавляем информацию о фильтрах
-        if option == 'vpn_type':
-            vpn_names = {0: 'Outline 🪐', 1: 'Vless 🐊', 2: 'Shadowsocks 🦈'}
-            result_text += f'\n\n📡 Фильтр: {vpn_names.get(vpn_type, "Неизвестный")}'
-        elif option == 'server':
-            from bot.database.methods.get import get_server as get_server_id
-            server = await get_server_id(server_id)
-            result_text += f'\n\n🌍 Фильтр: Сервер {server.name if server else server_id}'
-
-        from bot.keyboards.inline.admin_inline import admin_main_inline_menu
-        await message.answer(
-            result_text,
-            reply_markup=await admin_main_inline_menu(lang)
+            text = message.text
+            photo_file_id = None
+        progress = await message.answer('📨 Рассылка поставлена в очередь')
+        job_id, all_count = await add_mailing_job(
+            option,
+            server_id,
+            vpn_type,
+            text,
+            photo_file_id,
+            created_by=message.chat.id,
+            lang=lang,
+            progress_message_id=progress.message_id
         )
+        wake_mailing_worker()
+        log.info(f'Mailing #{job_id} queued for {all_count} users')
     except Exception as e:
         log.error(e, 'error mailing')
-        from bot.keyboards.inline.admin_inline import admin_main_inline_menu
         await message.answer(
             _('error_mailing_text', lang),
             reply_markup=await admin_main_inline_menu(lang)
@@ -533,10 +604,10 @@ async def admin_menu_navigation(
         call: CallbackQuery,
         callback_data: AdminMenuNav,
         state: FSMContext,
+        lang: str,
         dialog_manager: DialogManager = None
 ) -> None:
     """Обработчик навигации по inline админ меню"""
-    lang = await get_lang(call.from_user.id, state)
     menu = callback_data.menu
     action = callback_data.action
 
@@ -549,7 +620,7 @@ async def admin_menu_navigation(
 
     # Выход в пользовательское меню
     elif menu == 'exit':
-        await call.message.delete()
+        delete_in_background(call.message)
         users = await get_person_id([call.from_user.id])
         user = users[0] if users else None
         await call.message.answer(
@@ -565,7 +636,6 @@ async def admin_menu_navigation(
                 "✏️ Введите Telegram ID пользователя:",
                 reply_markup=await admin_back_inline_menu('main', lang)
             )
-            from bot.handlers.admin.user_management import EditUser
             await state.set_state(EditUser.show_user)
         else:
             await call.message.edit_text(
@@ -577,21 +647,20 @@ async def admin_menu_navigation(
     elif menu == 'show_users':
         if action == 'all':
             # Показать всех пользователей
-            users = await get_all_user()
+            users_count = await get_users_count()
             await call.message.edit_text(
-                f"👥 Всего пользователей: {len(users)}",
+                f"👥 Всего пользователей: {users_count}",
                 reply_markup=await admin_back_inline_menu('main', lang)
             )
         elif action == 'sub':
             # Показать подписчиков
-            users = await get_all_subscription()
+            users_count = await get_users_count(banned=False)
             await call.message.edit_text(
-                f"✅ Пользователей с подпиской: {len(users)}",
+                f"✅ Пользователей с подпиской: {users_count}",
                 reply_markup=await admin_back_inline_menu('main', lang)
             )
         elif action == 'payments':
             # Показать историю платежей
-            from bot.database.methods.get import get_total_payments
             try:
                 total = await get_total_payments()
                 await call.message.edit_text(
@@ -605,7 +674,6 @@ async def admin_menu_navigation(
                 )
         elif action == 'traffic_bypass':
             # Показать статистику трафика bypass серверов (суммарно)
-            from bot.misc.traffic_monitor import get_all_bypass_traffic, get_bypass_servers, format_bytes
             log.info(f"[traffic_bypass] Starting handler")
             try:
                 # Get traffic from all bypass servers (summed)
@@ -647,7 +715,6 @@ async def admin_menu_navigation(
                 )
                 log.info("[traffic_bypass] Message sent successfully")
             except Exception as e:
-                import traceback
                 log.error(f'Error getting bypass traffic stats: {e}')
                 log.error(traceback.format_exc())
                 await call.message.edit_text(
@@ -656,14 +723,13 @@ async def admin_menu_navigation(
                 )
         elif action in ('traffic_current', 'traffic_total'):
             # Показать статистику трафика
-            from bot.database.methods.get import get_traffic_statistics
             try:
                 # use_offset=True для текущего трафика (с момента оплаты)
                 # use_offset=False для всего накопленного трафика
                 use_offset = (action == 'traffic_current')
                 stats = await get_traffic_statistics(use_offset=use_offset)
 
-                def format_bytes(bytes_val):
+                def format_size(bytes_val):
                     if bytes_val >= 1024**4:
                         return f"{bytes_val / (1024**4):.2f} TB"
                     elif bytes_val >= 1024**3:
@@ -682,14 +748,14 @@ async def admin_menu_navigation(
                 text = (
                     f"{title}\n\n"
                     f"👥 Пользователей с трафиком: {stats['users_with_traffic']}\n"
-                    f"📈 Общий трафик: {format_bytes(stats['total_traffic'])}\n"
-                    f"📊 Средний трафик: {format_bytes(stats['avg_traffic'])}\n\n"
+                    f"📈 Общий трафик: {format_size(stats['total_traffic'])}\n"
+                    f"📊 Средний трафик: {format_size(stats['avg_traffic'])}\n\n"
                     f"🏆 <b>Топ-10 по трафику:</b>\n"
                 )
 
                 for i, user in enumerate(stats['top_users'][:10], 1):
                     username = f"@{user['username']}" if user['username'] else f"ID:{user['tgid']}"
-                    text += f"{i}. {username}: {format_bytes(user['traffic'])}\n"
+                    text += f"{i}. {username}: {format_size(user['traffic'])}\n"
 
                 await call.message.edit_text(
                     text,
@@ -715,13 +781,11 @@ async def admin_menu_navigation(
                 _('input_user_id_admin', lang),
                 reply_markup=await admin_back_inline_menu('static_users', lang)
             )
-            from bot.handlers.admin.user_management import StaticUser
             await state.set_state(StaticUser.input_id)
         elif action == 'show':
             # Показать статических пользователей
-            from bot.database.methods.get import get_all_static_users
             try:
-                static_users = await get_all_static_users()
+                static_users = await get_all_static_user()
                 text = f"📌 Статических пользователей: {len(static_users)}"
             except:
                 text = "📌 Статические пользователи"
@@ -739,41 +803,8 @@ async def admin_menu_navigation(
     elif menu == 'servers':
         if action == 'show':
             # Показать все серверы
-            await call.message.delete()
-            all_server = await get_all_server()
-            if len(all_server) == 0:
-                await call.message.answer(
-                    _('servers_none', lang),
-                    reply_markup=await admin_back_inline_menu('servers', lang)
-                )
-            else:
-                await call.message.answer(_('list_all_servers', lang))
-                space = 0
-                for server in all_server:
-                    old_m = await call.message.answer(_('connect_continue', lang))
-                    try:
-                        client_server = await get_static_client(server)
-                        space = len(client_server)
-                        if not await server_space_update(server.name, space):
-                            raise Exception("Failed to update server space")
-                        connect = True
-                    except Exception as e:
-                        log.error(e, 'error connecting to server')
-                        connect = False
-                    text_server = await get_server_info(server, space, connect, lang)
-                    try:
-                        await call.message.bot.delete_message(call.message.chat.id, old_m.message_id)
-                    except:
-                        pass
-                    await call.message.answer(
-                        **text_server.as_kwargs(),
-                        reply_markup=await server_control(server.work, server.name, lang),
-                    )
-                # Добавляем кнопку назад
-                await call.message.answer(
-                    "⬅️ Вернуться в меню серверов",
-                    reply_markup=await admin_back_inline_menu('servers', lang)
-                )
+            delete_in_background(call.message)
+            await show_all_servers(call.message, lang, back_menu=True)
         elif action == 'add':
             await call.message.edit_text(
                 _('input_name_server_admin', lang),
@@ -817,7 +848,6 @@ async def admin_menu_navigation(
     elif menu == 'groups':
         if action == 'show':
             # Показать группы
-            from bot.database.methods.get import get_all_groups
             try:
                 groups = await get_all_groups()
                 if groups:
@@ -835,8 +865,7 @@ async def admin_menu_navigation(
                 _('input_group_name', lang),
                 reply_markup=await admin_back_inline_menu('groups', lang)
             )
-            from bot.handlers.admin.group_mangment import AddGroup
-            await state.set_state(AddGroup.input_name)
+            await state.set_state(Group.name_input)
         else:
             await call.message.edit_text(
                 _('groups_menu', lang),
@@ -845,41 +874,15 @@ async def admin_menu_navigation(
 
     # Super Offer
     elif menu == 'super_offer':
-        await call.message.delete()
+        delete_in_background(call.message)
         if dialog_manager:
             await dialog_manager.start(SuperOfferSG.TEXT, mode=StartMode.RESET_STACK)
 
     # Регенерация ключей
     elif menu == 'regenerate':
-        from bot.misc.callbackData import RegenerateKeys
-        from aiogram.utils.keyboard import InlineKeyboardBuilder
-        from aiogram.types import InlineKeyboardButton
-
-        kb = InlineKeyboardBuilder()
-        kb.row(
-            InlineKeyboardButton(
-                text='🚀 Начать регенерацию',
-                callback_data=RegenerateKeys(action='start').pack()
-            )
-        )
-        kb.row(
-            InlineKeyboardButton(
-                text='⬅️ Назад',
-                callback_data=AdminMenuNav(menu='main').pack()
-            )
-        )
-
         await call.message.edit_text(
-            "🔄 Регенерация ключей VPN\n\n"
-            "Этот инструмент позволяет массово обновить VPN ключи пользователей "
-            "после изменения портов или других настроек серверов.\n\n"
-            "📋 Процесс:\n"
-            "1. Выбор серверов\n"
-            "2. Выбор протоколов (Outline/Vless/Shadowsocks)\n"
-            "3. Подтверждение\n"
-            "4. Автоматическая регенерация и отправка новых ключей\n\n"
-            "⚠️ Убедитесь, что изменения на серверах уже применены!",
-            reply_markup=kb.as_markup()
+            REGENERATE_INTRO_TEXT,
+            reply_markup=regenerate_keys_kb(back=True)
         )
 
     await call.answer()
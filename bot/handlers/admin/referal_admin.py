@@ -1,16 +1,22 @@
-import io
+import asyncio
+import html
 import logging
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from functools import lru_cache
 
 from aiogram import Router, F
+from aiogram.enums import ParseMode
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
-from aiogram.types import CallbackQuery, Message, BufferedInputFile
-from aiogram.utils.formatting import Text, Code
+from aiogram.types import CallbackQuery, Message, InputFile, InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from bot.database.methods.delete import delete_promo_code
 from bot.database.methods.get import (
-    get_all_promo_code,
+    get_all_promo_code_with_counts,
+    get_promo_by_id,
     get_all_application_referral,
     get_application_referral_check_false,
     get_promo_code,
@@ -22,17 +28,19 @@ from bot.keyboards.inline.admin_inline import (
     promocode_menu,
     promocode_delete,
     application_referral_menu, application_success,
-    admin_back_inline_menu
+    admin_back_inline_menu, admin_main_inline_menu
 )
 from bot.keyboards.reply.admin_reply import back_admin_menu, admin_menu
 from bot.misc.callbackData import (
     PromocodeDelete,
     PromocodeAction,
+    PromocodeExpires,
     AplicationReferral,
     ApplicationSuccess,
     AdminMenuNav
 )
-from bot.misc.language import Localization, get_lang
+from bot.misc.broadcast import send_limited
+from bot.misc.language import Localization
 
 log = logging.getLogger(__name__)
 
@@ -41,6 +49,86 @@ btn_text = Localization.get_reply_button
 
 referral_router = Router()
 
+# Тексты кнопок на всех языках для фильтров
+PROMO_BTN_TEXTS = frozenset(btn_text('admin_promo_btn'))
+REFF_SYSTEM_BTN_TEXTS = frozenset(btn_text('admin_reff_system_btn'))
+
+# Заявки на вывод отправляем пачками: не больше N карточек в сообщении
+# и не длиннее лимита Telegram на текст
+APPLICATIONS_PER_MESSAGE = 10
+APPLICATIONS_SEPARATOR = '\n\n──────\n\n'
+MESSAGE_MAX_LENGTH = 4096
+
+# Сколько байт файла статистики держим в памяти, прежде чем сбросить на диск
+STATS_SPOOL_SIZE = 1024 * 1024
+
+# Список промокодов со счётчиками кэшируем в процессе (Redis у бота нет);
+# создание и удаление промокода сбрасывают кэш сразу
+PROMO_LIST_CACHE_TTL = 60
+_promo_list_cache = None
+_promo_list_lock = asyncio.Lock()
+
+
+def _promo_list_fresh():
+    if _promo_list_cache is not None and time.monotonic() - _promo_list_cache[0] < PROMO_LIST_CACHE_TTL:
+        return _promo_list_cache[1]
+    return None
+
+
+async def _get_promo_list_cached():
+    global _promo_list_cache
+    promo_list = _promo_list_fresh()
+    if promo_list is not None:
+        return promo_list
+    # Одновременные промахи ждут один запрос к БД и берут его результат из кэша
+    async with _promo_list_lock:
+        promo_list = _promo_list_fresh()
+        if promo_list is None:
+            promo_list = await get_all_promo_code_with_counts()
+            _promo_list_cache = (time.monotonic(), promo_list)
+    return promo_list
+
+
+def forget_promo_list():
+    global _promo_list_cache
+    _promo_list_cache = None
+
+
+def drop_promo_from_list(promo_id: int):
+    """После удаления промокода убираем его из кэша вместо повторного запроса"""
+    global _promo_list_cache
+    if _promo_list_cache is not None:
+        created, promo_list = _promo_list_cache
+        _promo_list_cache = (created, [row for row in promo_list if row[0].id != promo_id])
+
+
+async def remove_promo(promo_id: int) -> str:
+    """
+    Удаление промокода из админки: запрос к БД и обновление кэша списка.
+    Возвращает текст удалённого промокода, ModuleNotFoundError — если его нет
+    """
+    promo_text = await delete_promo_code(promo_id)
+    drop_promo_from_list(promo_id)
+    return promo_text
+
+
+@lru_cache(maxsize=4096)
+def promo_action_data(id_promo: int, action: str) -> str:
+    """Упакованный PromocodeAction: кнопки списка промокодов строятся на каждый клик"""
+    return PromocodeAction(id_promo=id_promo, action=action).pack()
+
+
+class SpooledInputFile(InputFile):
+    """Отправляет открытый бинарный файл (например, SpooledTemporaryFile) чанками"""
+
+    def __init__(self, file, filename: str):
+        super().__init__(filename=filename)
+        self.file = file
+
+    async def read(self, bot):
+        while chunk := self.file.read(self.chunk_size):
+            yield chunk
+
 
 class NewPromo(StatesGroup):
     input_text_promo = State()
@@ -48,18 +136,16 @@ class NewPromo(StatesGroup):
     input_expires = State()  # Срок действия промокода
 
 
-@referral_router.message(F.text.in_(btn_text('admin_promo_btn')))
-async def promo_handler(message: Message, state: FSMContext) -> None:
-    lang = await get_lang(message.from_user.id, state)
+@referral_router.message(F.text.in_(PROMO_BTN_TEXTS))
+async def promo_handler(message: Message, state: FSMContext, lang: str) -> None:
     await message.answer(
         _('control_promo_text', lang),
         reply_markup=await promocode_menu(lang)
     )
 
 
-@referral_router.message(F.text.in_(btn_text('admin_reff_system_btn')))
-async def referral_system_handler(message: Message, state: FSMContext) -> None:
-    lang = await get_lang(message.from_user.id, state)
+@referral_router.message(F.text.in_(REFF_SYSTEM_BTN_TEXTS))
+async def referral_system_handler(message: Message, state: FSMContext, lang: str) -> None:
     await message.answer(
         _('who_width_text', lang),
         reply_markup=await application_referral_menu(lang)
@@ -70,50 +156,104 @@ async def referral_system_handler(message: Message, state: FSMContext) -> None:
 async def callback_work_server(
         call: CallbackQuery,
         callback_data: AplicationReferral,
-        state: FSMContext
+        state: FSMContext,
+        lang: str
 ):
-    lang = await get_lang(call.from_user.id, state)
     if callback_data.type:
         application_referral = await get_all_application_referral()
     else:
         application_referral = await get_application_referral_check_false()
     if len(application_referral) == 0:
         await call.message.answer(_('not_withdrawal', lang))
+    # Карточки склеиваем по APPLICATIONS_PER_MESSAGE в одно сообщение
+    # с общей клавиатурой, пачки отправляем через общий лимитер
+    batches = []
+    texts, unpaid, size = [], [], 0
     for application in application_referral:
-        text_application = await show_application_referral(application, lang)
-        if application.check_payment:
-            await call.message.answer(**text_application.as_kwargs())
-        else:
-            await call.message.answer(
-                **text_application.as_kwargs(),
-                reply_markup=await application_success(
-                    application.id,
-                    call.message.message_id,
-                    lang
-                )
+        text_application = show_application_referral(application, lang)
+        size += len(APPLICATIONS_SEPARATOR) + len(text_application)
+        if texts and (
+                len(texts) >= APPLICATIONS_PER_MESSAGE
+                or size > MESSAGE_MAX_LENGTH
+        ):
+            batches.append((texts, unpaid))
+            texts, unpaid = [], []
+            size = len(APPLICATIONS_SEPARATOR) + len(text_application)
+        texts.append(text_application)
+        if not application.check_payment:
+            unpaid.append(application.id)
+    if texts:
+        batches.append((texts, unpaid))
+    messages = []
+    for texts, unpaid in batches:
+        reply_markup = None
+        if unpaid:
+            reply_markup = await application_success(
+                unpaid,
+                call.message.message_id,
+                lang
             )
+        messages.append((APPLICATIONS_SEPARATOR.join(texts), reply_markup))
+    # По очереди, чтобы пачки пришли в чат в порядке номеров заявок
+    for text, reply_markup in messages:
+        await send_limited(
+            call.bot.send_message,
+            call.message.chat.id,
+            text=text,
+            parse_mode=ParseMode.HTML,
+            reply_markup=reply_markup
+        )
     await call.answer()
 
 
-async def show_application_referral(data, lang):
+@lru_cache(maxsize=1024)
+def _day_text(ordinal: int) -> str:
+    return date.fromordinal(ordinal).strftime('%d.%m.%Y')
+
+
+def fmt_date(value: datetime) -> str:
+    """ДД.ММ.ГГГГ; strftime вызывается один раз на день, дальше из кэша"""
+    return _day_text(value.toordinal())
+
+
+def fmt_datetime(value: datetime) -> str:
+    """ДД.ММ.ГГГГ ЧЧ:ММ для списков использований промокода"""
+    return f"{_day_text(value.toordinal())} {value.hour:02d}:{value.minute:02d}"
+
+
+@lru_cache(maxsize=8)
+def _application_template(lang: str) -> str:
+    """HTML-шаблон карточки заявки на вывод: подписи переводятся один раз на язык"""
+    def label(key):
+        return html.escape(_(key, lang), quote=False).replace('{', '{{').replace('}', '}}')
+    return (
+        label('withdrawal_number_s') + '{id}\n'
+        + label('withdrawal_amount_s') + '<code>{amount}</code>₽\n'
+        + label('withdrawal_info_s') + '{payment_info}\n'
+        + label('withdrawal_user_connect_s') + '{communication}\n'
+        + label('withdrawal_telegram_id_s') + '<code>{user_tgid}</code>\n'
+        + label('withdrawal_condition_s') + '{check_payment}'
+    )
+
+
+def show_application_referral(data, lang) -> str:
+    """Карточка заявки на вывод в HTML"""
     if data.check_payment:
         check_payment = _('withdrawal_success', lang)
     else:
         check_payment = _('withdrawal_payment_expected', lang)
-    return Text(
-        _('withdrawal_number_s', lang), data.id, '\n',
-        _('withdrawal_amount_s', lang), Code(data.amount), '₽\n',
-        _('withdrawal_info_s', lang), data.payment_info, '\n',
-        _('withdrawal_user_connect_s', lang), data.communication, '\n',
-        _('withdrawal_telegram_id_s', lang), Code(data.user_tgid), '\n',
-        _('withdrawal_condition_s', lang), check_payment
+    return _application_template(lang).format(
+        id=data.id,
+        amount=data.amount,
+        payment_info=html.escape(str(data.payment_info), quote=False),
+        communication=html.escape(str(data.communication), quote=False),
+        user_tgid=data.user_tgid,
+        check_payment=html.escape(check_payment, quote=False)
     )
 
 
 @referral_router.callback_query(F.data == 'new_promo')
-async def callback_new_promo(call: CallbackQuery, state: FSMContext):
-    lang = await get_lang(call.from_user.id, state)
-    from bot.keyboards.inline.admin_inline import admin_back_inline_menu
+async def callback_new_promo(call: CallbackQuery, state: FSMContext, lang: str):
     await call.message.edit_text(
         f"{_('create_new_promo_text', lang)}\n\n{_('input_text_promo_message', lang)}",
         reply_markup=await admin_back_inline_menu('promo', lang)
@@ -123,9 +263,7 @@ async def callback_new_promo(call: CallbackQuery, state: FSMContext):
 
 
 @referral_router.message(NewPromo.input_text_promo)
-async def input_name(message: Message, state: FSMContext):
-    lang = await get_lang(message.from_user.id, state)
-    from bot.keyboards.inline.admin_inline import admin_back_inline_menu, admin_main_inline_menu
+async def input_name(message: Message, state: FSMContext, lang: str):
     try:
         await state.update_data(text_promo=message.text.strip())
         await message.answer(
@@ -143,9 +281,7 @@ async def input_name(message: Message, state: FSMContext):
 
 
 @referral_router.message(NewPromo.input_price_promo)
-async def input_price_promo(message: Message, state: FSMContext):
-    lang = await get_lang(message.from_user.id, state)
-    from bot.keyboards.inline.admin_inline import admin_back_inline_menu
+async def input_price_promo(message: Message, state: FSMContext, lang: str):
     try:
         add_days = int(message.text.strip())
     except Exception as e:
@@ -157,10 +293,10 @@ async def input_price_promo(message: Message, state: FSMContext):
 
     # Создаем кнопки для срока действия
     kb = InlineKeyboardBuilder()
-    kb.button(text="7 дней", callback_data="promo_expires:7")
-    kb.button(text="30 дней", callback_data="promo_expires:30")
-    kb.button(text="90 дней", callback_data="promo_expires:90")
-    kb.button(text="♾ Бессрочный", callback_data="promo_expires:0")
+    kb.button(text="7 дней", callback_data=PromocodeExpires(days=7))
+    kb.button(text="30 дней", callback_data=PromocodeExpires(days=30))
+    kb.button(text="90 дней", callback_data=PromocodeExpires(days=90))
+    kb.button(text="♾ Бессрочный", callback_data=PromocodeExpires(days=0))
     kb.adjust(2)
 
     await message.answer(
@@ -170,13 +306,14 @@ async def input_price_promo(message: Message, state: FSMContext):
     await state.set_state(NewPromo.input_expires)
 
 
-@referral_router.callback_query(F.data.startswith("promo_expires:"))
-async def input_expires_promo(call: CallbackQuery, state: FSMContext):
-    from datetime import datetime, timedelta
-    from bot.keyboards.inline.admin_inline import promocode_menu
-
-    lang = await get_lang(call.from_user.id, state)
-    days = int(call.data.split(":")[1])
+@referral_router.callback_query(PromocodeExpires.filter())
+async def input_expires_promo(
+        call: CallbackQuery,
+        callback_data: PromocodeExpires,
+        state: FSMContext,
+        lang: str
+):
+    days = callback_data.days
 
     data = await state.get_data()
     text_promo = data.get('text_promo')
@@ -189,8 +326,9 @@ async def input_expires_promo(call: CallbackQuery, state: FSMContext):
 
     try:
         await add_promo(text_promo, add_days, expires_at)
+        forget_promo_list()
 
-        expires_text = f"до {expires_at.strftime('%d.%m.%Y')}" if expires_at else "бессрочно"
+        expires_text = f"до {fmt_date(expires_at)}" if expires_at else "бессрочно"
         await call.message.edit_text(
             f"✅ Промокод <code>{text_promo}</code> создан!\n\n"
             f"📅 Дней подписки: {add_days}\n"
@@ -209,11 +347,8 @@ async def input_expires_promo(call: CallbackQuery, state: FSMContext):
 
 
 @referral_router.callback_query(F.data.startswith('show_promo'))
-async def callback_show_promo(call: CallbackQuery, state: FSMContext):
-    from datetime import datetime
-
-    lang = await get_lang(call.from_user.id, state)
-    all_promo = await get_all_promo_code()
+async def callback_show_promo(call: CallbackQuery, state: FSMContext, lang: str):
+    all_promo = await _get_promo_list_cached()
 
     # Определяем фильтр (active/archived/all)
     filter_type = 'active'  # по умолчанию
@@ -222,14 +357,19 @@ async def callback_show_promo(call: CallbackQuery, state: FSMContext):
 
     now = datetime.now()
 
-    # Разделяем промокоды на активные и архивные
+    # Один проход: статус считаем сразу и делим на активные и архивные.
+    # Флаг архива не берём из SQL: список кэшируется, а срок действия
+    # должен сверяться с моментом показа
     active_promos = []
     archived_promos = []
-    for promo in all_promo:
-        if promo.expires_at and promo.expires_at < now:
-            archived_promos.append(promo)
+    for promo, usage_count in all_promo:
+        if promo.expires_at is None:
+            active_promos.append((promo, usage_count, "♾", "♾"))
+        elif promo.expires_at < now:
+            archived_promos.append((promo, usage_count, "❌", "❌"))
         else:
-            active_promos.append(promo)
+            days_left = (promo.expires_at - now).days
+            active_promos.append((promo, usage_count, f"⏰{days_left}д", "⏰"))
 
     # Выбираем какие показывать
     if filter_type == 'active':
@@ -239,47 +379,28 @@ async def callback_show_promo(call: CallbackQuery, state: FSMContext):
         display_promos = archived_promos
         title = "📦 <b>Архивные промокоды</b>"
     else:
-        display_promos = all_promo
+        display_promos = active_promos + archived_promos
+        display_promos.sort(key=lambda item: item[0].id)
         title = "🎟 <b>Все промокоды</b>"
 
+    lines = [f"{title}\n\n"]
     if len(display_promos) == 0:
-        text = f"{title}\n\n❌ Нет промокодов"
-    else:
-        text = f"{title}\n\n"
-        for promo in display_promos:
-            usage_count = len(promo.person) if promo.person else 0
-            # Статус промокода
-            if promo.expires_at:
-                if promo.expires_at < now:
-                    status = "❌"
-                else:
-                    days_left = (promo.expires_at - now).days
-                    status = f"⏰{days_left}д"
-            else:
-                status = "♾"
-            text += (
-                f"{status} <code>{promo.text}</code> — "
-                f"{promo.add_days} дн. — "
-                f"исп. {usage_count}\n"
-            )
-
-    text += "\n<i>Нажмите на промокод для деталей</i>"
-
-    # Кнопки промокодов
+        lines.append("❌ Нет промокодов")
     kb = InlineKeyboardBuilder()
-    for promo in display_promos:
-        usage_count = len(promo.person) if promo.person else 0
-        # Иконка статуса в кнопке
-        if promo.expires_at and promo.expires_at < now:
-            icon = "❌"
-        elif promo.expires_at:
-            icon = "⏰"
-        else:
-            icon = "♾"
+    for promo, usage_count, status, icon in display_promos:
+        lines.append(
+            f"{status} <code>{promo.text}</code> — "
+            f"{promo.add_days} дн. — "
+            f"исп. {usage_count}\n"
+        )
+        # Кнопка промокода с иконкой статуса
         kb.button(
             text=f"{icon} {promo.text} ({usage_count})",
-            callback_data=PromocodeAction(id_promo=promo.id, action='view')
+            callback_data=promo_action_data(promo.id, 'view')
         )
+    lines.append("\n<i>Нажмите на промокод для деталей</i>")
+    text = "".join(lines)
+
     kb.adjust(2)
 
     # Кнопки фильтров
@@ -299,37 +420,57 @@ async def callback_show_promo(call: CallbackQuery, state: FSMContext):
 async def callback_promo_action(
         call: CallbackQuery,
         callback_data: PromocodeAction,
-        state: FSMContext
+        state: FSMContext,
+        lang: str
 ):
-    lang = await get_lang(call.from_user.id, state)
     promo_id = callback_data.id_promo
     action = callback_data.action
 
-    # Получаем промокод
-    all_promos = await get_all_promo_code()
-    promo = next((p for p in all_promos if p.id == promo_id), None)
+    if action == 'confirm_delete':
+        # Удаляем промокод: текст для ответа вернёт сам DELETE, читать промокод заранее не нужно
+        try:
+            promo_text = await remove_promo(promo_id)
+        except ModuleNotFoundError:
+            await call.answer("❌ Промокод не найден", show_alert=True)
+            return
+        except Exception as e:
+            log.error(f"Error deleting promo: {e}")
+            await call.answer("❌ Ошибка удаления", show_alert=True)
+            return
+        await call.answer(f"✅ Промокод {promo_text} удалён", show_alert=True)
+        # Возвращаемся к списку (из кэша, без повторного запроса)
+        await callback_show_promo(call, state, lang)
+        return
+
+    # Получаем промокод; для просмотра и выгрузки параллельно читаем использования
+    usages = None
+    if action in ('view', 'stats'):
+        promo, usages = await asyncio.gather(
+            get_promo_by_id(promo_id),
+            get_promo_usage_with_dates(promo_id)
+        )
+    else:
+        promo = await get_promo_by_id(promo_id)
 
     if not promo:
         await call.answer("❌ Промокод не найден", show_alert=True)
         return
 
     if action == 'view':
-        from datetime import datetime
         now = datetime.now()
 
         # Показываем детали промокода с датами использования
-        usages = await get_promo_usage_with_dates(promo.id)
         usage_count = len(usages)
 
         # Статус промокода
         if promo.expires_at:
             if promo.expires_at < now:
                 status = "❌ <b>Истёк</b>"
-                expires_text = promo.expires_at.strftime("%d.%m.%Y")
+                expires_text = fmt_date(promo.expires_at)
             else:
                 days_left = (promo.expires_at - now).days
                 status = f"✅ <b>Активен</b> (ещё {days_left} дн.)"
-                expires_text = promo.expires_at.strftime("%d.%m.%Y")
+                expires_text = fmt_date(promo.expires_at)
         else:
             status = "♾ <b>Бессрочный</b>"
             expires_text = None
@@ -342,7 +483,7 @@ async def callback_promo_action(
         if expires_text:
             text += f"📆 Действует до: {expires_text}\n"
         if promo.created_at:
-            text += f"🕐 Создан: {promo.created_at.strftime('%d.%m.%Y')}\n"
+            text += f"🕐 Создан: {fmt_date(promo.created_at)}\n"
         text += f"👥 Использован: <b>{usage_count}</b> раз\n"
 
         # Показываем кто использовал с датой (до 10 пользователей в сообщении)
@@ -350,7 +491,7 @@ async def callback_promo_action(
             text += "\n<b>Использовали:</b>\n"
             for i, (tgid, username, fullname, used_at) in enumerate(usages[:10], 1):
                 user_name = f"@{username}" if username else f"ID:{tgid}"
-                date_str = used_at.strftime("%d.%m.%Y %H:%M") if used_at else "—"
+                date_str = fmt_datetime(used_at) if used_at else "—"
                 text += f"  {i}. {user_name} — {date_str}\n"
             if len(usages) > 10:
                 text += f"  <i>...и ещё {len(usages) - 10}</i>\n"
@@ -359,11 +500,11 @@ async def callback_promo_action(
         if usage_count > 10:
             kb.button(
                 text=f"📄 Скачать полный список ({usage_count})",
-                callback_data=PromocodeAction(id_promo=promo.id, action='stats')
+                callback_data=promo_action_data(promo.id, 'stats')
             )
         kb.button(
             text="🗑 Удалить",
-            callback_data=PromocodeAction(id_promo=promo.id, action='delete')
+            callback_data=promo_action_data(promo.id, 'delete')
         )
         kb.button(
             text="⬅️ К списку",
@@ -371,8 +512,11 @@ async def callback_promo_action(
         )
         kb.adjust(1)
 
-        await call.message.edit_text(text, reply_markup=kb.as_markup())
-        await call.answer()
+        # Редактирование и ответ на callback независимы
+        await asyncio.gather(
+            call.message.edit_text(text, reply_markup=kb.as_markup()),
+            call.answer()
+        )
 
     elif action == 'delete':
         # Спрашиваем подтверждение
@@ -386,80 +530,83 @@ async def callback_promo_action(
         kb = InlineKeyboardBuilder()
         kb.button(
             text="✅ Да, удалить",
-            callback_data=PromocodeAction(id_promo=promo.id, action='confirm_delete')
+            callback_data=promo_action_data(promo.id, 'confirm_delete')
         )
         kb.button(
             text="❌ Отмена",
-            callback_data=PromocodeAction(id_promo=promo.id, action='view')
+            callback_data=promo_action_data(promo.id, 'view')
         )
         kb.adjust(2)
 
         await call.message.edit_text(text, reply_markup=kb.as_markup())
         await call.answer()
 
-    elif action == 'confirm_delete':
-        # Удаляем промокод
-        try:
-            promo_text = promo.text
-            await delete_promo_code(promo_id)
-            await call.answer(f"✅ Промокод {promo_text} удалён", show_alert=True)
-            # Возвращаемся к списку
-            await callback_show_promo(call, state)
-        except Exception as e:
-            log.error(f"Error deleting promo: {e}")
-            await call.answer("❌ Ошибка удаления", show_alert=True)
-
     elif action == 'stats':
         # Формируем файл со статистикой с датами
-        usages = await get_promo_usage_with_dates(promo.id)
         if not usages:
             await call.answer("❌ Нет данных об использовании", show_alert=True)
             return
 
-        str_stats = f"Промокод: {promo.text}\n"
-        str_stats += f"Дней: {promo.add_days}\n"
-        str_stats += f"Использований: {len(usages)}\n"
-        str_stats += "=" * 40 + "\n\n"
-        str_stats += "Кто использовал:\n\n"
-
-        for i, (tgid, username, fullname, used_at) in enumerate(usages, 1):
-            date_str = used_at.strftime("%d.%m.%Y %H:%M") if used_at else "—"
-            str_stats += (
-                f"{i}. @{username or 'N/A'}\n"
-                f"   ID: {tgid}\n"
-                f"   Имя: {fullname or 'N/A'}\n"
-                f"   Дата: {date_str}\n\n"
-            )
+        # Сначала отвечаем на callback, чтобы у админа пропал индикатор загрузки,
+        # и только потом собираем и загружаем файл
+        await call.answer()
 
-        file_stream = io.BytesIO(str_stats.encode()).getvalue()
-        input_file = BufferedInputFile(file_stream, f'promo_{promo.text}_stats.txt')
+        # Файл собирается в отдельном потоке, чтобы большая выгрузка
+        # не останавливала обработку остальных апдейтов
+        spool = await asyncio.to_thread(build_promo_stats_file, promo.text, promo.add_days, usages)
+        input_file = SpooledInputFile(spool, f'promo_{promo.text}_stats.txt')
 
-        await call.message.answer_document(
-            input_file,
-            caption=f"📊 Статистика промокода <code>{promo.text}</code>"
-        )
-        await call.answer()
+        try:
+            await call.message.answer_document(
+                input_file,
+                caption=f"📊 Статистика промокода <code>{promo.text}</code>"
+            )
+        except Exception as e:
+            log.error(f"Error sending promo stats: {e}")
+            await call.message.answer("❌ Не удалось отправить файл статистики")
+        finally:
+            spool.close()
+
+
+def build_promo_stats_file(promo_text, add_days, usages):
+    """
+    Пишет статистику промокода построчно в SpooledTemporaryFile: до STATS_SPOOL_SIZE
+    файл живёт в памяти, дальше уходит на диск. Возвращает файл, перемотанный в начало
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=STATS_SPOOL_SIZE, mode='w+b')
+    spool.write((
+        f"Промокод: {promo_text}\n"
+        f"Дней: {add_days}\n"
+        f"Использований: {len(usages)}\n"
+        f"{'=' * 40}\n\n"
+        "Кто использовал:\n\n"
+    ).encode())
+    for i, (tgid, username, fullname, used_at) in enumerate(usages, 1):
+        date_str = fmt_datetime(used_at) if used_at else "—"
+        spool.write((
+            f"{i}. @{username or 'N/A'}\n"
+            f"   ID: {tgid}\n"
+            f"   Имя: {fullname or 'N/A'}\n"
+            f"   Дата: {date_str}\n\n"
+        ).encode())
+    spool.seek(0)
+    return spool
 
 
 @referral_router.callback_query(PromocodeDelete.filter())
 async def callback_delete_promo(
         call: CallbackQuery,
         callback_data: PromocodeDelete,
-        state: FSMContext
+        state: FSMContext,
+        lang: str
 ):
-    lang = await get_lang(call.from_user.id, state)
     try:
         id_promo = callback_data.id_promo
-        await delete_promo_code(id_promo)
+        await remove_promo(id_promo)
         await call.message.answer(_('promo_delete_text', lang))
     except Exception as e:
         await call.message.answer(_('error_promo_delete_text', lang))
         log.error(e, 'error delete promo code')
-    try:
-        mes_id = callback_data.mes_id
-        # await call.message.edit_text(_('promo_delete_text', lang), str(mes_id))
-    except Exception as e:
-        log.error(e, 'error edit message')
     await call.answer()
 
 
@@ -467,21 +614,25 @@ async def callback_delete_promo(
 async def callback_success_application(
         call: CallbackQuery,
         callback_data: ApplicationSuccess,
-        state: FSMContext
+        state: FSMContext,
+        lang: str
 ):
-    lang = await get_lang(call.from_user.id, state)
     try:
         await succes_aplication(callback_data.id_application)
         await call.message.answer(_('application_paid', lang))
     except Exception as e:
         await call.message.answer(_('application_error_save', lang))
-        log.error(e, 'error save application')
+        log.error(f'error save application: {e}')
+    # В сообщении может быть несколько заявок: убираем только кнопку
+    # оплаченной, остальные остаются доступны
     try:
-        mes_id = callback_data.mes_id
-        await call.message.edit_text(
-            _('application_success_text', lang),
-            str(mes_id)
+        rows = [
+            [button for button in row if button.callback_data != call.data]
+            for row in call.message.reply_markup.inline_keyboard
+        ]
+        await call.message.edit_reply_markup(
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[row for row in rows if row])
         )
     except Exception as e:
-        log.error(e, 'error edit message')
+        log.error(f'error edit message: {e}')
     await call.answer()
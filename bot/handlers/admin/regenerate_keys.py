@@ -20,6 +20,7 @@ from bot.keyboards.inline.admin_inline import (
     regenerate_confirm_menu
 )
 from bot.keyboards.reply.admin_reply import admin_menu
+from bot.misc.VPN import ServerManagerPool
 from bot.misc.VPN.ServerManager import ServerManager
 from bot.misc.callbackData import (
     RegenerateKeys,
@@ -91,94 +92,93 @@ async def regenerate_keys_for_users(
         server = servers_dict[server_id]
 
         try:
-            # Подключаемся к серверу один раз для всех пользователей
-            server_manager = ServerManager(server)
-            await server_manager.login()
-
-            for user in server_users:
-                try:
-                    # 1. Удаляем старого клиента
-                    try:
-                        await server_manager.delete_client(user.tgid)
-                    except Exception as e:
-                        log.warning(f"Could not delete old client for user {user.tgid}: {e}")
-                        # Продолжаем даже если не удалось удалить
-
-                    # 2. Создаем нового клиента
-                    await server_manager.add_client(user.tgid)
-
-                    # 3. Генерируем новый ключ
-                    new_key = await server_manager.get_key(user.tgid, CONFIG.name)
-
-                    if not new_key:
-                        raise Exception("Не удалось сгенерировать ключ")
-
-                    # 4. Отправляем пользователю новый ключ
-                    vpn_type_name = ServerManager.VPN_TYPES.get(server.type_vpn).NAME_VPN
-                    message_text = (
-                        f"🔄 Обновление VPN соединения\n\n"
-                        f"Произошло обновление сервера {server.name}. "
-                        f"Ваш VPN ключ был обновлен.\n\n"
-                        f"🔑 Новый ключ:\n"
-                        f"<code>{new_key}</code>\n\n"
-                        f"📱 Инструкция:\n"
-                        f"1. Удалите старый ключ из приложения\n"
-                        f"2. Добавьте новый ключ\n"
-                        f"3. Подключитесь\n\n"
-                        f"❓ Если возникли проблемы, напишите в поддержку"
-                    )
-
+            # Своя свежая сессия на весь проход: блокировку общего кэша
+            # не держим, пока идут отправки в Telegram и паузы
+            async with ServerManagerPool.fresh_manager(server) as server_manager:
+                for user in server_users:
                     try:
-                        await bot.send_message(
-                            user.tgid,
-                            message_text,
-                            parse_mode='HTML'
+                        # 1. Удаляем старого клиента
+                        try:
+                            await server_manager.delete_client(user.tgid)
+                        except Exception as e:
+                            log.warning(f"Could not delete old client for user {user.tgid}: {e}")
+                            # Продолжаем даже если не удалось удалить
+
+                        # 2. Создаем нового клиента
+                        await server_manager.add_client(user.tgid)
+
+                        # 3. Генерируем новый ключ
+                        new_key = await server_manager.get_key(user.tgid, CONFIG.name)
+
+                        if not new_key:
+                            raise Exception("Не удалось сгенерировать ключ")
+
+                        # 4. Отправляем пользователю новый ключ
+                        vpn_type_name = ServerManager.VPN_TYPES.get(server.type_vpn).NAME_VPN
+                        message_text = (
+                            f"🔄 Обновление VPN соединения\n\n"
+                            f"Произошло обновление сервера {server.name}. "
+                            f"Ваш VPN ключ был обновлен.\n\n"
+                            f"🔑 Новый ключ:\n"
+                            f"<code>{new_key}</code>\n\n"
+                            f"📱 Инструкция:\n"
+                            f"1. Удалите старый ключ из приложения\n"
+                            f"2. Добавьте новый ключ\n"
+                            f"3. Подключитесь\n\n"
+                            f"❓ Если возникли проблемы, напишите в поддержку"
                         )
-                        success_count += 1
+
+                        try:
+                            await bot.send_message(
+                                user.tgid,
+                                message_text,
+                                parse_mode='HTML'
+                            )
+                            success_count += 1
+                        except Exception as e:
+                            log.warning(f"Could not send message to user {user.tgid}: {e}")
+                            # Ключ создан, но сообщение не отправлено
+                            errors.append({
+                                'user': user,
+                                'error': f'Ключ создан, но не отправлен: {str(e)}'
+                            })
+                            error_count += 1
+
                     except Exception as e:
-                        log.warning(f"Could not send message to user {user.tgid}: {e}")
-                        # Ключ создан, но сообщение не отправлено
+                        log.error(f"Failed to regenerate key for user {user.tgid}: {e}")
                         errors.append({
                             'user': user,
-                            'error': f'Ключ создан, но не отправлен: {str(e)}'
+                            'error': str(e)
                         })
                         error_count += 1
 
-                except Exception as e:
-                    log.error(f"Failed to regenerate key for user {user.tgid}: {e}")
-                    errors.append({
-                        'user': user,
-                        'error': str(e)
-                    })
-                    error_count += 1
-
-                processed += 1
-
-                # Обновляем прогресс каждые 10 пользователей или в конце
-                if processed % 10 == 0 or processed == total:
-                    percentage = int((processed / total) * 100)
-                    progress_bar = '▓' * (percentage // 5) + '░' * (20 - percentage // 5)
-
-                    elapsed_time = int(time.time() - start_time)
-                    avg_time_per_user = elapsed_time / processed if processed > 0 else 0
-                    remaining_time = int(avg_time_per_user * (total - processed))
-
-                    try:
-                        await progress_message.edit_text(
-                            f"🔄 Регенерация ключей...\n\n"
-                            f"📊 Прогресс:\n"
-                            f"{progress_bar} {percentage}%\n\n"
-                            f"✅ Обработано: {processed}/{total}\n"
-                            f"⏳ Осталось: {total - processed}\n"
-                            f"❌ Ошибок: {error_count}\n\n"
-                            f"Текущий сервер: {server.name}\n"
-                            f"⏱️ Осталось времени: ~{remaining_time // 60}м {remaining_time % 60}с"
-                        )
-                    except Exception as e:
-                        log.warning(f"Could not update progress message: {e}")
-
-                # Небольшая задержка, чтобы не перегружать API
-                await asyncio.sleep(0.05)
+                    processed += 1
+
+                    # Обновляем прогресс каждые 10 пользователей или в конце
+                    if processed % 10 == 0 or processed == total:
+                        percentage = int((processed / total) * 100)
+                        progress_bar = '▓' * (percentage // 5) + '░' * (20 - percentage // 5)
+
+                        elapsed_time = int(time.time() - start_time)
+                        avg_time_per_user = elapsed_time / processed if processed > 0 else 0
+                        remaining_time = int(avg_time_per_user * (total - processed))
+
+                        try:
+                            await progress_message.edit_text(
+                                f"🔄 Регенерация ключей...\n\n"
+                                f"📊 Прогресс:\n"
+                                f"{progress_bar} {percentage}%\n\n"
+                                f"✅ Обработано: {processed}/{total}\n"
+                                f"⏳ Осталось: {total - processed}\n"
+                                f"❌ Ошибок: {error_count}\n\n"
+                                f"Текущий сервер: {server.name}\n"
+                                f"⏱️ Осталось времени: ~{remaining_time // 60}м {remaining_time % 60}с"
+                            )
+                        except Exception as e:
+                            log.warning(f"Could not update progress message: {e}")
+
+                    # Небольшая задержка, чтобы не перегружать API
+                    await asyncio.sleep(0.05)
 
         except Exception as e:
             log.error(f"Failed to connect to server {server.name}: {e}")
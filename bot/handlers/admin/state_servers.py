@@ -78,7 +78,7 @@ async def input_password_vds(message: Message, state: FSMContext):
     await state.update_data(vds_password=message.text.strip())
     groups = await get_all_groups()
     if len(groups) == 0:
-        await state.update_data(group=None)
+        await state.update_data(group=None, group_id=None)
         await input_type_vpn(message, state, lang)
         return
     groups_obj = await groups_obj_list(groups)
@@ -100,7 +100,7 @@ async def input_password_vds(message: Message, state: FSMContext):
         await message.answer(_('server_input_number_group_error', lang))
         return
     if group_id == 0:
-        await state.update_data(group=None)
+        await state.update_data(group=None, group_id=None)
     else:
         group = await get_group(group_id)
         if group is None:
@@ -109,7 +109,7 @@ async def input_password_vds(message: Message, state: FSMContext):
                 .format(group_id=group_id)
             )
             return
-        await state.update_data(group=group.name)
+        await state.update_data(group=group.name, group_id=group.id)
     await input_type_vpn(message, state, lang)
 
 
@@ -3,6 +3,7 @@ Win-back промокоды - админ панель
 Управление промокодами для возврата ушедших клиентов
 """
 import logging
+import time
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
@@ -25,10 +26,10 @@ from bot.database.methods.winback import (
     toggle_winback_promo,
     get_promo_statistics,
     get_all_promos_statistics,
-    get_churned_users_by_segment,
     get_churned_users_stats,
-    create_promo_usage,
-    get_users_for_autosend
+    count_segment_users,
+    iter_segment_users,
+    create_promo_usage
 )
 from bot.misc.language import get_lang
 from bot.misc.util import CONFIG
@@ -801,30 +802,21 @@ async def send_promo_confirm(callback: CallbackQuery):
     promo_type = getattr(promo, 'promo_type', 'winback') or 'winback'
     delay_days = getattr(promo, 'delay_days', 0) or 0
 
-    # Получить пользователей для рассылки в зависимости от типа
+    # Количество получателей в зависимости от типа
+    users_count = await count_segment_users(promo)
     if promo_type == 'welcome':
-        from bot.database.methods.winback import get_new_users_for_welcome_promo
-        users = await get_new_users_for_welcome_promo(
-            exclude_already_sent_promo_id=promo.id,
-            delay_days=delay_days
-        )
         segment_text = f"🆕 Новые пользователи (задержка: {delay_days} дн.)"
     else:
-        users = await get_churned_users_by_segment(
-            min_days=promo.min_days_expired,
-            max_days=promo.max_days_expired,
-            exclude_already_sent_promo_id=promo.id
-        )
         segment_text = f"📅 Сегмент: {promo.min_days_expired}-{promo.max_days_expired} дней без подписки"
 
-    if not users:
+    if not users_count:
         await callback.answer("Нет пользователей для рассылки", show_alert=True)
         return
 
     kb = await confirm_menu("send", promo_id)
     await callback.message.edit_text(
         f"📤 <b>Рассылка промокода {promo.code}</b>\n\n"
-        f"👥 Получателей: <b>{len(users)}</b>\n"
+        f"👥 Получателей: <b>{users_count}</b>\n"
         f"{segment_text}\n"
         f"💰 Скидка: {promo.discount_percent}%\n\n"
         f"Отправить?",
@@ -847,36 +839,25 @@ async def send_promo_execute(callback: CallbackQuery, bot: Bot):
         return
 
     promo_type = getattr(promo, 'promo_type', 'winback') or 'winback'
-    delay_days = getattr(promo, 'delay_days', 0) or 0
 
-    # Получить пользователей в зависимости от типа
-    if promo_type == 'welcome':
-        from bot.database.methods.winback import get_new_users_for_welcome_promo
-        users = await get_new_users_for_welcome_promo(
-            exclude_already_sent_promo_id=promo.id,
-            delay_days=delay_days
-        )
-    else:
-        users = await get_churned_users_by_segment(
-            min_days=promo.min_days_expired,
-            max_days=promo.max_days_expired,
-            exclude_already_sent_promo_id=promo.id
-        )
+    # Размер сегмента - одним COUNT(*), сами пользователи читаются пачками
+    current_time = int(time.time())
+    users_count = await count_segment_users(promo, current_time)
 
-    if not users:
+    if not users_count:
         await callback.answer("Нет пользователей для рассылки", show_alert=True)
         return
 
     await callback.message.edit_text(
         f"📤 Рассылка промокода {promo.code}...\n\n"
-        f"Отправляю {len(users)} пользователям...",
+        f"Отправляю {users_count} пользователям...",
         parse_mode="HTML"
     )
 
     success_count = 0
     error_count = 0
 
-    for user in users:
+    async for user in iter_segment_users(promo, current_time):
         try:
             # Создать запись об отправке
             usage = await create_promo_usage(promo.id, user.tgid, promo.valid_days)
@@ -925,13 +906,9 @@ async def manual_send_menu(callback: CallbackQuery):
     kb = InlineKeyboardBuilder()
     for promo in promos:
         # Подсчитать пользователей в сегменте
-        users = await get_churned_users_by_segment(
-            promo.min_days_expired,
-            promo.max_days_expired,
-            exclude_already_sent_promo_id=promo.id
-        )
+        users_count = await count_segment_users(promo)
         kb.row(InlineKeyboardButton(
-            text=f"{promo.code} - {len(users)} чел.",
+            text=f"{promo.code} - {users_count} чел.",
             callback_data=f"{WINBACK_PREFIX}send:{promo.id}"
         ))
 
@@ -31,7 +31,7 @@ from bot.keyboards.reply.user_reply import (
 )
 from bot.misc.VPN.ServerManager import ServerManager
 from bot.misc.callbackData import ChooseServer, ChoosingLang, ChooseTypeVpn, DownloadClient, DownloadHiddify, MainMenuAction, TrafficSourceSurvey
-from bot.misc.language import Localization, get_lang
+from bot.misc.language import Localization, get_lang, forget_lang
 from bot.misc.util import CONFIG
 from .payment_user import callback_user
 from .referral_user import referral_router, message_admin
@@ -587,6 +587,7 @@ async def deposit_balance(
 ) -> None:
     lang = callback_data.lang
     await update_lang(lang, call.from_user.id)
+    forget_lang(call.from_user.id)
     await state.update_data(lang=lang)
     person = await get_person(call.from_user.id)
     await call.message.answer(
@@ -1510,7 +1511,7 @@ async def handle_main_menu_action(callback: CallbackQuery, callback_data: MainMe
 
         # Get Outline servers (type_vpn=0)
         try:
-            outline_servers = await get_free_servers(person.group, type_vpn=0)
+            outline_servers = await get_free_servers(person.group_id, type_vpn=0)
         except Exception as e:
             log.error(f"Error getting Outline servers: {e}")
             await callback.message.answer(
@@ -1961,7 +1962,7 @@ async def handle_main_menu_action(callback: CallbackQuery, callback_data: MainMe
         person = await get_person(callback.from_user.id)
 
         try:
-            outline_servers = await get_free_servers(person.group, type_vpn=0)
+            outline_servers = await get_free_servers(person.group_id, type_vpn=0)
         except Exception as e:
             await callback.message.answer(
                 "❌ Outline серверы временно недоступны\n\n"
@@ -2325,7 +2326,7 @@ async def admin_menu_nav_handler(
         missing_user_menu
     )
     from bot.keyboards.inline.user_inline import user_menu_inline
-    from bot.database.methods.get import get_all_user, get_all_subscription, get_all_server
+    from bot.database.methods.get import get_users_stats_rows, get_all_subscription, get_all_server
 
     try:
         # Главное админ меню
@@ -2412,7 +2413,7 @@ async def admin_menu_nav_handler(
         # Меню статистики пользователей
         elif menu == 'show_users':
             if action == 'all':
-                users = await get_all_user()
+                users = await get_users_stats_rows()
                 import time
                 current_time = int(time.time())
                 time_30_days_ago = current_time - (30 * 86400)
@@ -56,7 +56,7 @@ async def outline_menu(message: Message, state: FSMContext) -> None:
     # Get Outline servers (type_vpn=0)
     try:
         outline_servers = await get_free_servers(
-            person.group,
+            person.group_id,
             type_vpn=0  # Outline only
         )
     except Exception as e:
@@ -1,3 +1,6 @@
+import inspect
+from functools import wraps
+
 from aiogram.types import InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder, InlineKeyboardButton
 
@@ -23,6 +26,30 @@ from bot.misc.language import Localization
 _ = Localization.text
 
 
+def static_markup(func):
+    """
+    Кэширует клавиатуру, которая зависит только от аргументов (язык, пункт меню).
+    Ключ кэша - аргументы, приведённые к сигнатуре функции, поэтому
+    f('ru') и f(lang='ru') попадают в одну запись. Вызывающему отдаётся
+    копия: обработчики могут дописывать в неё кнопки, не портя кэш
+    """
+    cache = {}
+    signature = inspect.signature(func)
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = tuple(bound.arguments.items())
+        markup = cache.get(key)
+        if markup is None:
+            markup = cache[key] = await func(*bound.args, **bound.kwargs)
+        return markup.model_copy(deep=True)
+
+    wrapper.cache_clear = cache.clear
+    return wrapper
+
+
 async def choosing_connection() -> InlineKeyboardMarkup:
     kb = InlineKeyboardBuilder()
     kb.button(
@@ -219,6 +246,7 @@ async def server_selection_menu(servers, lang) -> InlineKeyboardMarkup:
     return kb.as_markup()
 
 
+@static_markup
 async def promocode_menu(lang) -> InlineKeyboardMarkup:
     kb = InlineKeyboardBuilder()
     kb.button(
@@ -237,6 +265,7 @@ async def promocode_menu(lang) -> InlineKeyboardMarkup:
     return kb.as_markup()
 
 
+@static_markup
 async def application_referral_menu(lang) -> InlineKeyboardMarkup:
     kb = InlineKeyboardBuilder()
     kb.button(
@@ -270,18 +299,20 @@ async def promocode_delete(id_promo, mes_id, lang) -> InlineKeyboardMarkup:
 
 
 async def application_success(
-        id_application,
+        id_applications,
         mes_id,
         lang
 ) -> InlineKeyboardMarkup:
+    """Кнопки оплаты для сообщения с одной или несколькими заявками"""
     kb = InlineKeyboardBuilder()
-    kb.button(
-        text=_('applications_success_btn', lang),
-        callback_data=ApplicationSuccess(
-            id_application=id_application,
-            mes_id=mes_id
+    for id_application in id_applications:
+        kb.button(
+            text=f"{_('applications_success_btn', lang)} №{id_application}",
+            callback_data=ApplicationSuccess(
+                id_application=id_application,
+                mes_id=mes_id
+            )
         )
-    )
     kb.button(
         text='⬅️ Назад',
         callback_data=AdminMenuNav(menu='referral').pack()
@@ -446,6 +477,7 @@ async def regenerate_confirm_menu(lang) -> InlineKeyboardMarkup:
 # INLINE ADMIN MENUS (replacement for reply keyboards)
 # =====================================================
 
+@static_markup
 async def admin_main_inline_menu(lang) -> InlineKeyboardMarkup:
     """Главное inline меню администратора (замена reply keyboard)"""
     kb = InlineKeyboardBuilder()
@@ -507,6 +539,7 @@ async def admin_main_inline_menu(lang) -> InlineKeyboardMarkup:
     return kb.as_markup()
 
 
+@static_markup
 async def admin_users_inline_menu(lang) -> InlineKeyboardMarkup:
     """Inline меню управления пользователями"""
     kb = InlineKeyboardBuilder()
@@ -533,6 +566,7 @@ async def admin_users_inline_menu(lang) -> InlineKeyboardMarkup:
     return kb.as_markup()
 
 
+@static_markup
 async def admin_groups_inline_menu(lang) -> InlineKeyboardMarkup:
     """Inline меню управления группами"""
     kb = InlineKeyboardBuilder()
@@ -557,6 +591,7 @@ async def admin_groups_inline_menu(lang) -> InlineKeyboardMarkup:
     return kb.as_markup()
 
 
+@static_markup
 async def admin_static_users_inline_menu(lang) -> InlineKeyboardMarkup:
     """Inline меню статических пользователей"""
     kb = InlineKeyboardBuilder()
@@ -583,6 +618,7 @@ async def admin_static_users_inline_menu(lang) -> InlineKeyboardMarkup:
     return kb.as_markup()
 
 
+@static_markup
 async def admin_show_users_inline_menu(lang) -> InlineKeyboardMarkup:
     """Inline меню просмотра пользователей"""
     kb = InlineKeyboardBuilder()
@@ -629,6 +665,7 @@ async def admin_show_users_inline_menu(lang) -> InlineKeyboardMarkup:
     return kb.as_markup()
 
 
+@static_markup
 async def admin_servers_inline_menu(lang) -> InlineKeyboardMarkup:
     """Inline меню управления серверами"""
     kb = InlineKeyboardBuilder()
@@ -661,6 +698,7 @@ async def admin_servers_inline_menu(lang) -> InlineKeyboardMarkup:
     return kb.as_markup()
 
 
+@static_markup
 async def admin_back_inline_menu(back_to: str, lang) -> InlineKeyboardMarkup:
     """Универсальная кнопка возврата"""
     kb = InlineKeyboardBuilder()
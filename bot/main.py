@@ -1,5 +1,4 @@
 import logging
-import asyncio
 try:
     from zoneinfo import ZoneInfo
 except ImportError:
@@ -26,6 +25,8 @@ from bot.misc.backup_script import backup_and_upload_task, backup_task
 from bot.misc.check_and_proceed_subscriptions import process_subscriptions
 from bot.misc.commands import set_commands
 from bot.misc.loop import loop
+from bot.misc.mailing_worker import start_mailing_worker, stop_mailing_worker
+from bot.misc.VPN import ServerManagerPool
 from bot.misc.notification_script import notify
 from bot.misc.winback_sender import winback_autosend
 from bot.misc.traffic_monitor import update_all_users_traffic, check_and_block_exceeded_users, reset_monthly_traffic, send_setup_reminders, send_reengagement_reminders, send_daily_stats, snapshot_daily_traffic, check_servers_health, check_servers_speed, reset_monthly_bypass_traffic
@@ -49,6 +50,12 @@ async def start_bot():
     )
 
     dp.update.outer_middleware(LastInteractionMiddleware())
+    # Воркер рассылок живёт столько же, сколько polling
+    dp.startup.register(start_mailing_worker)
+    dp.shutdown.register(stop_mailing_worker)
+    # Сессии панелей из кэша ServerManagerPool закрываем сами,
+    # иначе aiohttp ругается на незакрытые сессии при выходе
+    dp.shutdown.register(ServerManagerPool.close_all)
 
     await create_all_table()
     if CONFIG.import_bd:
@@ -208,6 +215,4 @@ async def start_bot():
 
     logging.getLogger('apscheduler.executors.default').setLevel(logging.WARNING)
     scheduler.start()
-    await asyncio.gather(
-        dp.start_polling(bot),
-    )
+    await dp.start_polling(bot)
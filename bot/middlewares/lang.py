@@ -0,0 +1,21 @@
+from typing import Callable, Dict, Any, Awaitable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from bot.misc.language import get_lang
+
+
+class LangMiddleware(BaseMiddleware):
+    """Определяет язык пользователя один раз на апдейт и передаёт его в хендлер как lang"""
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any],
+    ) -> Any:
+        user = data.get('event_from_user')
+        if user is not None:
+            data['lang'] = await get_lang(user.id, data.get('state'))
+        return await handler(event, data)
@@ -24,3 +24,7 @@ class BaseVpn(ABC):
     @abstractmethod
     async def get_key_user(self, name, name_key):
         pass
+
+    async def close(self):
+        """Закрывает HTTP-сессию с панелью, если клиент держит её между запросами"""
+        pass
@@ -19,6 +19,11 @@ class Outline(BaseVpn):
         self.client_outline = OutlineVPN(api_url=self.api_url)
         await self.client_outline.init(self.cert_sha256)
 
+    async def close(self):
+        client = getattr(self, 'client_outline', None)
+        if client is not None and client.session is not None:
+            await client.session.close()
+
     async def get_all_user_server(self):
         return await self.client_outline.get_keys()
 
@@ -15,6 +15,12 @@ class ServerManager:
     async def login(self):
         await self.client.login()
 
+    async def close(self):
+        try:
+            await self.client.close()
+        except Exception as e:
+            print(e, 'ServerManager.py close')
+
     async def get_all_user(self):
         try:
             return await self.client.get_all_user_server()
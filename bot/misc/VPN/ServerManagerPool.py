@@ -0,0 +1,163 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Tuple
+
+from bot.misc.VPN.ServerManager import ServerManager
+
+# Сколько секунд держим авторизованный ServerManager (сессия панели)
+MANAGER_TTL = 600
+MANAGER_MAXSIZE = 64
+
+_managers: Dict[tuple, Tuple[float, ServerManager]] = {}
+_locks: Dict[tuple, asyncio.Lock] = {}
+# Сколько корутин сейчас держат или ждут блокировку сервера
+_users: Dict[tuple, int] = {}
+
+
+def _server_key(server) -> tuple:
+    # В ключ входят параметры подключения: после редактирования сервера
+    # старая сессия больше не подходит
+    return (
+        server.id, server.type_vpn, server.ip, server.panel,
+        server.login, server.password, server.inbound_id,
+        server.connection_method, server.outline_link,
+    )
+
+
+async def _close(entries):
+    for _, manager in entries:
+        await manager.close()
+
+
+async def _drop(key):
+    """Убирает менеджер из кэша и закрывает его сессию"""
+    cached = _managers.pop(key, None)
+    if cached is not None:
+        await _close([cached])
+
+
+def _pop_idle(keys):
+    """
+    Забирает из кэша менеджеры, которыми сейчас никто не пользуется,
+    вместе с их блокировками. Закрыть их должен вызывающий
+    """
+    entries = []
+    for key in keys:
+        if key in _users:
+            continue
+        entries.append(_managers.pop(key))
+        _locks.pop(key, None)
+    return entries
+
+
+async def _cleanup():
+    """Закрывает просроченные менеджеры и освобождает место под новый"""
+    now = time.monotonic()
+    expired = [key for key, (created, _) in _managers.items() if now - created >= MANAGER_TTL]
+    entries = _pop_idle(expired)
+    if len(_managers) >= MANAGER_MAXSIZE:
+        # Вытесняем самый старый из свободных; если заняты все — кэш временно растёт
+        idle = [key for key in _managers if key not in _users]
+        if idle:
+            entries += _pop_idle([min(idle, key=lambda k: _managers[k][0])])
+    await _close(entries)
+
+
+async def _login(server) -> ServerManager:
+    manager = ServerManager(server)
+    try:
+        await manager.login()
+    except Exception:
+        await manager.close()
+        raise
+    return manager
+
+
+async def _get_manager(key, server) -> ServerManager:
+    cached = _managers.get(key)
+    if cached is not None:
+        if time.monotonic() - cached[0] < MANAGER_TTL:
+            return cached[1]
+        await _drop(key)
+    await _cleanup()
+    manager = await _login(server)
+    _managers[key] = (time.monotonic(), manager)
+    return manager
+
+
+@asynccontextmanager
+async def _server_lock(key):
+    """
+    Блокировка сервера. Клиент панели не рассчитан на параллельные запросы.
+    Блокировка удаляется вместе с записью кэша, когда ей никто не пользуется
+    """
+    lock = _locks.setdefault(key, asyncio.Lock())
+    _users[key] = _users.get(key, 0) + 1
+    try:
+        async with lock:
+            yield
+    finally:
+        _users[key] -= 1
+        if not _users[key]:
+            del _users[key]
+            if key not in _managers:
+                _locks.pop(key, None)
+
+
+async def invalidate(server):
+    key = _server_key(server)
+    async with _server_lock(key):
+        await _drop(key)
+
+
+@asynccontextmanager
+async def get_manager(server):
+    """
+    Авторизованный ServerManager из кэша.
+    Клиент панели не рассчитан на параллельные запросы,
+    поэтому на время работы сервер блокируется.
+    """
+    key = _server_key(server)
+    async with _server_lock(key):
+        yield await _get_manager(key, server)
+
+
+@asynccontextmanager
+async def fresh_manager(server):
+    """
+    Отдельный ServerManager со свежей авторизацией, без кэша и блокировки.
+    Для долгих массовых операций (регенерация ключей, удаление всех клиентов),
+    чтобы не держать блокировку сервера на минуты. Сессия закрывается на выходе
+    """
+    manager = await _login(server)
+    try:
+        yield manager
+    finally:
+        await manager.close()
+
+
+async def call(server, method: str, *args):
+    """
+    Вызывает метод ServerManager на закэшированной сессии.
+    Методы ServerManager глушат ошибки и возвращают None/False —
+    в этом случае сессия могла истечь: логинимся заново и повторяем один раз.
+    """
+    key = _server_key(server)
+    async with _server_lock(key):
+        manager = await _get_manager(key, server)
+        result = await getattr(manager, method)(*args)
+        if result is None or result is False:
+            await _drop(key)
+            manager = await _get_manager(key, server)
+            result = await getattr(manager, method)(*args)
+        return result
+
+
+async def close_all():
+    """Закрывает сессии всех закэшированных менеджеров (при остановке бота)"""
+    entries = list(_managers.values())
+    _managers.clear()
+    for key in [key for key in _locks if key not in _users]:
+        del _locks[key]
+    await _close(entries)
@@ -0,0 +1,60 @@
+"""
+Массовая отправка сообщений с учётом лимитов Telegram.
+"""
+import asyncio
+import logging
+import time
+
+from aiogram.exceptions import TelegramRetryAfter
+
+log = logging.getLogger(__name__)
+
+# Глобальный лимит Telegram ~30 сообщений в секунду, оставляем запас
+MESSAGES_PER_SECOND = 28
+# Сколько запросов к Telegram одновременно в полёте
+MAX_IN_FLIGHT = 50
+
+
+class RateLimiter:
+    """Равномерно распределяет вызовы: не чаще rate в секунду на процесс"""
+
+    def __init__(self, rate: float):
+        self._interval = 1 / rate
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self._interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+telegram_limiter = RateLimiter(MESSAGES_PER_SECOND)
+_in_flight = asyncio.Semaphore(MAX_IN_FLIGHT)
+
+
+async def send_limited(send, chat_id, *args, **kwargs) -> bool:
+    """
+    Отправляет одно сообщение через send (bot.send_message, bot.send_photo...)
+    с учётом лимита. При TelegramRetryAfter ждёт указанное время и повторяет.
+    Возвращает True при успехе
+    """
+    while True:
+        async with _in_flight, telegram_limiter:
+            try:
+                await send(chat_id, *args, **kwargs)
+                return True
+            except TelegramRetryAfter as e:
+                retry_after = e.retry_after
+            except Exception as e:
+                log.info(f'Could not send message to {chat_id}: {e}')
+                return False
+        log.warning(f'Flood control, retry in {retry_after}s')
+        await asyncio.sleep(retry_after)
+
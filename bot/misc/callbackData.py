@@ -87,6 +87,10 @@ class PromocodeAction(CallbackData, prefix='promo_action'):
     action: str  # 'view', 'stats', 'delete', 'confirm_delete'
 
 
+class PromocodeExpires(CallbackData, prefix='promo_expires'):
+    days: int  # 0 — бессрочный
+
+
 class ApplyPromoCode(CallbackData, prefix='apply_promo'):
     code: str  # Промокод для автоматического применения
 
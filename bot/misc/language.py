@@ -1,6 +1,9 @@
 import gettext
+import time
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
+from typing import Dict, Tuple
 
 from aiogram.fsm.context import FSMContext
 
@@ -8,16 +11,39 @@ from bot.database.methods.get import get_person_lang
 from bot.misc.util import CONFIG
 
 
+# Язык пользователя из БД кэшируется на процесс: state.clear() стирает его из FSM,
+# и без кэша следующий апдейт снова шёл бы в базу
+LANG_CACHE_TTL = 60
+LANG_CACHE_MAXSIZE = 10000
+_lang_cache: Dict[int, Tuple[float, str]] = {}
+
+
+async def _get_person_lang_cached(user_id):
+    cached = _lang_cache.get(user_id)
+    if cached is not None and time.monotonic() - cached[0] < LANG_CACHE_TTL:
+        return cached[1]
+    lang = await get_person_lang(user_id)
+    if len(_lang_cache) >= LANG_CACHE_MAXSIZE:
+        _lang_cache.clear()
+    _lang_cache[user_id] = (time.monotonic(), lang)
+    return lang
+
+
+def forget_lang(user_id):
+    """Сбросить закэшированный язык после его смены пользователем"""
+    _lang_cache.pop(user_id, None)
+
+
 async def get_lang(user_id, state: FSMContext=None):
     if state is not None:
         data = await state.get_data()
         lang = data.get('lang')
         if lang is None:
-            lang = await get_person_lang(user_id)
+            lang = await _get_person_lang_cached(user_id)
             await state.update_data(lang=lang)
         return lang
     else:
-        return await get_person_lang(user_id)
+        return await _get_person_lang_cached(user_id)
 
 
 @dataclass
@@ -29,24 +55,32 @@ class Localization:
     PATH = Path(__file__).resolve().parent.parent / 'locale'
 
     @classmethod
-    def get_reply_button(cls, key_text) -> list:
-        buttons_text = []
-        for lang_key in cls.ALL_Languages.keys():
-            lang = gettext.translation(
-                'bot',
-                localedir=cls.PATH,
-                languages=[lang_key]
-            )
-            lang.install()
-            buttons_text.append(lang.gettext(key_text))
-        return buttons_text
+    @lru_cache(maxsize=None)
+    def get_reply_button(cls, key_text) -> tuple:
+        # Набор ключей конечен: результат кэшируется на всё время работы
+        return tuple(
+            cls._translation(lang_key).gettext(key_text)
+            for lang_key in cls.ALL_Languages.keys()
+        )
 
     @classmethod
+    @lru_cache(maxsize=4096)
     def text(cls, key_text, language=CONFIG.languages):
-        lang = gettext.translation(
+        return cls._translation(language).gettext(key_text)
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def _translation(cls, language):
+        return gettext.translation(
             'bot',
             localedir=cls.PATH,
             languages=[language]
         )
-        lang.install()
-        return lang.gettext(key_text)
+
+    @classmethod
+    def cache_clear(cls):
+        """Сбросить кэш переводов (после обновления .mo файлов)"""
+        cls.get_reply_button.cache_clear()
+        cls.text.cache_clear()
+        cls._translation.cache_clear()
+        gettext._translations.clear()
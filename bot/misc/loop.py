@@ -17,7 +17,8 @@ from bot.database.methods.update import (
     person_two_days_true,
     person_three_days_true,
     update_last_expiry_notification,
-    server_space_update, add_time_person, reduce_balance_person
+    server_space_update, add_time_person, reduce_balance_person,
+    add_balance_person
 )
 from bot.misc.VPN.ServerManager import ServerManager
 from bot.misc.subscription import activate_subscription
@@ -171,15 +172,14 @@ async def check_auto_renewal(person, bot, text):
         for price, mount_count in month_count.items():
             price = int(price)
             if person.balance >= price:
+                # Сначала списываем: время выдаётся только если списание прошло
+                if not await reduce_balance_person(price, person.tgid):
+                    # Баланс успели потратить - пробуем следующий тариф
+                    continue
                 if await add_time_person(
                         person.tgid,
                         mount_count * CONFIG.COUNT_SECOND_MOTH
                 ):
-                    await reduce_balance_person(
-                        price,
-                        person.tgid
-                    )
-
                     # Активируем ключи на всех серверах (ВАЖНО!)
                     try:
                         await activate_subscription(person.tgid)
@@ -220,6 +220,8 @@ async def check_auto_renewal(person, bot, text):
                     )
                     return True
                 else:
+                    # Время не выдано - возвращаем списанное
+                    await add_balance_person(person.tgid, price)
                     for admin_id in CONFIG.admins_ids:
                         try:
                             await bot.send_message(
@@ -0,0 +1,157 @@
+"""
+Фоновая отправка рассылок из админки.
+Обработчик только создаёт задание (mailing_jobs + mailing_targets) и сразу
+отвечает; воркер рассылает пачками через общий лимитер Telegram, отмечает
+статус каждого получателя и обновляет сообщение с прогрессом у админа.
+Незаконченные задания подхватываются после перезапуска бота.
+"""
+import asyncio
+import logging
+import time
+from functools import partial
+
+from aiogram import Bot
+from aiogram.types import ReplyKeyboardRemove
+
+from bot.database.methods.get import (
+    get_unfinished_mailing_jobs,
+    get_pending_mailing_tgids,
+    get_mailing_job_counts,
+    get_server_id
+)
+from bot.database.methods.update import mailing_targets_set_status, mailing_job_finish
+from bot.database.models.main import MailingTargets
+from bot.keyboards.inline.admin_inline import admin_main_inline_menu
+from bot.misc.broadcast import send_limited
+from bot.misc.language import Localization
+
+log = logging.getLogger(__name__)
+
+_ = Localization.text
+
+# Как часто проверять новые задания, если никто не разбудил воркер
+POLL_INTERVAL = 30
+# Сколько получателей берём из БД и отправляем за раз. Статусы пишутся
+# сразу после каждой пачки, поэтому при падении посреди рассылки
+# повторно сообщение получат не больше BATCH_SIZE человек
+BATCH_SIZE = 50
+# Не чаще раза в N секунд редактируем сообщение с прогрессом
+PROGRESS_INTERVAL = 15
+
+REMOVE_KEYBOARD = ReplyKeyboardRemove()
+VPN_NAMES = {0: 'Outline 🪐', 1: 'Vless 🐊', 2: 'Shadowsocks 🦈'}
+
+_new_job = asyncio.Event()
+_worker_task: asyncio.Task | None = None
+
+
+def wake_mailing_worker() -> None:
+    """Сообщает воркеру о новом задании, чтобы не ждать POLL_INTERVAL"""
+    _new_job.set()
+
+
+def _job_sender(bot: Bot, job):
+    if job.photo_file_id:
+        return partial(
+            bot.send_photo,
+            photo=job.photo_file_id,
+            caption=job.text or '',
+            reply_markup=REMOVE_KEYBOARD
+        )
+    return partial(bot.send_message, text=job.text, reply_markup=REMOVE_KEYBOARD)
+
+
+async def _update_progress(bot: Bot, job, counts) -> None:
+    if job.progress_message_id is None:
+        return
+    try:
+        await bot.edit_message_text(
+            f'📨 Рассылка #{job.id}: обработано '
+            f'{counts.sent + counts.failed} из {counts.total}',
+            chat_id=job.created_by,
+            message_id=job.progress_message_id
+        )
+    except Exception as e:
+        log.info(f'Could not update mailing progress #{job.id}: {e}')
+
+
+async def _send_result(bot: Bot, job) -> None:
+    counts = await get_mailing_job_counts(job.id)
+    result_text = _('result_mailing_text', job.lang).format(
+        all_count=counts.total,
+        suc_count=counts.sent,
+        count_not_suc=counts.failed
+    )
+    # Добавляем информацию о фильтрах
+    if job.option == 'vpn_type':
+        result_text += f'\n\n📡 Фильтр: {VPN_NAMES.get(job.vpn_type, "Неизвестный")}'
+    elif job.option == 'server':
+        server = await get_server_id(job.server_id)
+        result_text += f'\n\n🌍 Фильтр: Сервер {server.name if server else job.server_id}'
+    await _update_progress(bot, job, counts)
+    await bot.send_message(
+        job.created_by,
+        result_text,
+        reply_markup=await admin_main_inline_menu(job.lang)
+    )
+
+
+async def run_mailing_job(bot: Bot, job) -> None:
+    send = _job_sender(bot, job)
+    last_progress = time.monotonic()
+    while True:
+        tgids = await get_pending_mailing_tgids(job.id, BATCH_SIZE)
+        if not tgids:
+            break
+        results = await asyncio.gather(
+            *(send_limited(send, tgid) for tgid in tgids)
+        )
+        sent = [tgid for tgid, ok in zip(tgids, results) if ok]
+        failed = [tgid for tgid, ok in zip(tgids, results) if not ok]
+        await mailing_targets_set_status(job.id, sent, MailingTargets.SENT)
+        await mailing_targets_set_status(job.id, failed, MailingTargets.FAILED)
+        if time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+            await _update_progress(bot, job, await get_mailing_job_counts(job.id))
+            last_progress = time.monotonic()
+    await mailing_job_finish(job.id)
+    log.info(f'Mailing #{job.id} finished')
+    try:
+        await _send_result(bot, job)
+    except Exception as e:
+        log.error(f'Could not send mailing result #{job.id}: {e}')
+
+
+async def mailing_worker(bot: Bot) -> None:
+    """Бесконечный цикл: отправляет незаконченные задания по очереди"""
+    while True:
+        _new_job.clear()
+        try:
+            for job in await get_unfinished_mailing_jobs():
+                await run_mailing_job(bot, job)
+        except Exception as e:
+            log.error(f'Mailing worker error: {e}')
+        try:
+            await asyncio.wait_for(_new_job.wait(), POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def start_mailing_worker(bot: Bot) -> None:
+    """dp.startup: запускает воркер рассылок фоновой задачей"""
+    global _worker_task
+    if _worker_task is None or _worker_task.done():
+        _worker_task = asyncio.create_task(mailing_worker(bot))
+
+
+async def stop_mailing_worker() -> None:
+    """dp.shutdown: останавливает воркер; недоотправленное задание
+    продолжится после перезапуска"""
+    global _worker_task
+    if _worker_task is None:
+        return
+    _worker_task.cancel()
+    try:
+        await _worker_task
+    except asyncio.CancelledError:
+        pass
+    _worker_task = None
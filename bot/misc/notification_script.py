@@ -5,7 +5,7 @@ from aiogram import Bot
 from aiogram.types import InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from bot.database.methods.get import get_all_user
+from bot.database.methods.get import get_users_for_renew_notification
 from bot.misc.language import Localization, get_lang
 
 _ = Localization.text
@@ -21,15 +21,12 @@ def subscription_button(lang):
 
 
 async def notify(bot: Bot):
-    users = await get_all_user()
+    # Пользователи с автооплатой или без подписки отфильтрованы в запросе
+    users = await get_users_for_renew_notification()
     moscow_tz = ZoneInfo('Europe/Moscow')
     today = datetime.now(moscow_tz).date()
 
     for user in users:
-        # Пропускаем пользователей с активными платежами или без подписки
-        if user.payment_method_id is not None or user.subscription is None:
-            continue
-
         try:
             end_date = datetime.fromtimestamp(user.subscription, moscow_tz).date()
             days_left = (end_date - today).days
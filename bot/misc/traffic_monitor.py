@@ -23,6 +23,9 @@ DEFAULT_TRAFFIC_LIMIT = 500 * 1024 * 1024 * 1024  # 536870912000
 # Количество дней до автоматического сброса трафика
 TRAFFIC_RESET_DAYS = 30
 
+# Размер пачки строк при потоковом чтении пользователей
+STREAM_BATCH_SIZE = 5000
+
 # Cache for server traffic data
 # Key: server_id, Value: {email: bytes}
 # Used when server is temporarily unavailable to preserve last known values
@@ -434,17 +437,32 @@ async def check_and_block_exceeded_users(bot) -> List[int]:
 
     blocked_users = []
     warned_users = []
+    # (user, current, limit[, percent]) — collected while streaming,
+    # processed after the session is closed
+    to_block = []
+    to_warn = []
 
     async with AsyncSession(autoflush=False, bind=engine()) as db:
-        # Get all active users to check both 90% and 100% thresholds
-        stmt = select(Persons).filter(
+        # Get all active users to check both 90% and 100% thresholds.
+        # Only the columns used below, streamed in batches: the full
+        # result set is never materialized at once. The stream only
+        # collects candidates: panel calls and Telegram sends happen after
+        # the session is closed, so the cursor is not held open during them
+        stmt = select(
+            Persons.tgid,
+            Persons.lang,
+            Persons.payment_method_id,
+            Persons.total_traffic_bytes,
+            Persons.traffic_offset_bytes,
+            Persons.traffic_limit_bytes,
+            Persons.traffic_warning_sent,
+        ).filter(
             Persons.subscription_active == True
         )
-        result = await db.execute(stmt)
-        all_users = result.scalars().all()
+        result = await db.stream(stmt)
 
-        for user in all_users:
-            try:
+        async for batch in result.partitions(STREAM_BATCH_SIZE):
+            for user in batch:
                 limit = user.traffic_limit_bytes or DEFAULT_TRAFFIC_LIMIT
 
                 # Use total_traffic_bytes - offset (consistent with update_all_user_traffic)
@@ -452,79 +470,93 @@ async def check_and_block_exceeded_users(bot) -> List[int]:
                 current = max(0, (user.total_traffic_bytes or 0) - offset)
                 percent = (current / limit * 100) if limit > 0 else 0
 
-                # Check if 100% exceeded - block user
                 if current >= limit:
-                    log.warning(
-                        f"[Traffic] Blocking user {user.tgid}: "
-                        f"{format_bytes(current)} >= {format_bytes(limit)}"
-                    )
+                    to_block.append((user, current, limit))
+                elif percent >= 90 and not user.traffic_warning_sent:
+                    to_warn.append((user, current, limit, percent))
 
-                    # Expire subscription (disable keys)
-                    await expire_subscription(user.tgid)
-
-                    # Build payment keyboard with main menu button
-                    lang = user.lang or 'ru'
-                    kb = await renew(CONFIG, lang, user.tgid, user.payment_method_id)
-                    # Add main menu button
-                    kb.inline_keyboard.append([
-                        InlineKeyboardButton(
-                            text="🏠 Главное меню",
-                            callback_data=MainMenuAction(action='back_to_menu').pack()
-                        )
-                    ])
+    # Check if 100% exceeded - block user
+    for user, current, limit in to_block:
+        try:
+            log.warning(
+                f"[Traffic] Blocking user {user.tgid}: "
+                f"{format_bytes(current)} >= {format_bytes(limit)}"
+            )
 
-                    # Notify user
-                    try:
-                        await bot.send_message(
-                            user.tgid,
-                            f"🚫 <b>Лимит трафика исчерпан!</b>\n\n"
-                            f"📊 Использовано: {format_bytes(current)}\n"
-                            f"📦 Лимит: {format_bytes(limit)}\n\n"
-                            f"VPN отключен. Для продолжения использования продлите подписку 👇",
-                            reply_markup=kb
-                        )
-                    except Exception as e:
-                        log.error(f"[Traffic] Could not notify user {user.tgid}: {e}")
+            # Expire subscription (disable keys)
+            await expire_subscription(user.tgid)
+
+            # Build payment keyboard with main menu button
+            lang = user.lang or 'ru'
+            kb = await renew(CONFIG, lang, user.tgid, user.payment_method_id)
+            # Add main menu button
+            kb.inline_keyboard.append([
+                InlineKeyboardButton(
+                    text="🏠 Главное меню",
+                    callback_data=MainMenuAction(action='back_to_menu').pack()
+                )
+            ])
 
-                    blocked_users.append(user.tgid)
+            # Notify user
+            try:
+                await bot.send_message(
+                    user.tgid,
+                    f"🚫 <b>Лимит трафика исчерпан!</b>\n\n"
+                    f"📊 Использовано: {format_bytes(current)}\n"
+                    f"📦 Лимит: {format_bytes(limit)}\n\n"
+                    f"VPN отключен. Для продолжения использования продлите подписку 👇",
+                    reply_markup=kb
+                )
+            except Exception as e:
+                log.error(f"[Traffic] Could not notify user {user.tgid}: {e}")
 
-                # Check if 90% reached and warning not yet sent
-                elif percent >= 90 and not user.traffic_warning_sent:
-                    log.info(f"[Traffic] Sending 90% warning to user {user.tgid}: {percent:.1f}%")
-
-                    # Build payment keyboard with main menu button
-                    lang = user.lang or 'ru'
-                    kb = await renew(CONFIG, lang, user.tgid, user.payment_method_id)
-                    # Add main menu button
-                    kb.inline_keyboard.append([
-                        InlineKeyboardButton(
-                            text="🏠 Главное меню",
-                            callback_data=MainMenuAction(action='back_to_menu').pack()
-                        )
-                    ])
+            blocked_users.append(user.tgid)
+        except Exception as e:
+            log.error(f"[Traffic] Error checking user {user.tgid}: {e}")
 
-                    # Send warning
-                    try:
-                        await bot.send_message(
-                            user.tgid,
-                            f"⚠️ <b>Внимание! Лимит трафика почти исчерпан</b>\n\n"
-                            f"📊 Использовано: {format_bytes(current)} / {format_bytes(limit)} ({percent:.0f}%)\n"
-                            f"📦 Осталось: {format_bytes(limit - current)}\n\n"
-                            f"При исчерпании лимита VPN будет отключен.\n"
-                            f"💡 Лимит сбрасывается раз в 30 дней или при оплате.\n\n"
-                            f"Продлите подписку, чтобы сбросить лимит 👇",
-                            reply_markup=kb
-                        )
-                        # Mark warning as sent
-                        user.traffic_warning_sent = True
-                        warned_users.append(user.tgid)
-                    except Exception as e:
-                        log.error(f"[Traffic] Could not send 90% warning to user {user.tgid}: {e}")
+    # Check if 90% reached and warning not yet sent
+    for user, current, limit, percent in to_warn:
+        try:
+            log.info(f"[Traffic] Sending 90% warning to user {user.tgid}: {percent:.1f}%")
+
+            # Build payment keyboard with main menu button
+            lang = user.lang or 'ru'
+            kb = await renew(CONFIG, lang, user.tgid, user.payment_method_id)
+            # Add main menu button
+            kb.inline_keyboard.append([
+                InlineKeyboardButton(
+                    text="🏠 Главное меню",
+                    callback_data=MainMenuAction(action='back_to_menu').pack()
+                )
+            ])
 
+            # Send warning
+            try:
+                await bot.send_message(
+                    user.tgid,
+                    f"⚠️ <b>Внимание! Лимит трафика почти исчерпан</b>\n\n"
+                    f"📊 Использовано: {format_bytes(current)} / {format_bytes(limit)} ({percent:.0f}%)\n"
+                    f"📦 Осталось: {format_bytes(limit - current)}\n\n"
+                    f"При исчерпании лимита VPN будет отключен.\n"
+                    f"💡 Лимит сбрасывается раз в 30 дней или при оплате.\n\n"
+                    f"Продлите подписку, чтобы сбросить лимит 👇",
+                    reply_markup=kb
+                )
+                warned_users.append(user.tgid)
             except Exception as e:
-                log.error(f"[Traffic] Error checking user {user.tgid}: {e}")
+                log.error(f"[Traffic] Could not send 90% warning to user {user.tgid}: {e}")
+        except Exception as e:
+            log.error(f"[Traffic] Error checking user {user.tgid}: {e}")
 
-        await db.commit()
+    # Mark warning as sent
+    if warned_users:
+        async with AsyncSession(autoflush=False, bind=engine()) as db:
+            await db.execute(
+                update(Persons)
+                .where(Persons.tgid.in_(warned_users))
+                .values(traffic_warning_sent=True)
+            )
+            await db.commit()
 
     if warned_users:
         log.info(f"[Traffic] Sent 90% warnings to {len(warned_users)} users")
@@ -794,7 +826,7 @@ async def send_setup_reminders(bot) -> Dict[str, int]:
             Persons.subscription_active == True,
             (Persons.total_traffic_bytes == 0) | (Persons.total_traffic_bytes == None),
             (Persons.setup_reminder_count < 2) | (Persons.setup_reminder_count == None),
-            (Persons.bot_blocked == False) | (Persons.bot_blocked == None)
+            Persons.bot_blocked == False
         )
         result = await db.execute(stmt)
         users = result.scalars().all()
@@ -899,7 +931,7 @@ async def send_reengagement_reminders(bot) -> Dict[str, int]:
             Persons.total_traffic_bytes > 0,  # Used VPN before
             Persons.traffic_last_change < week_ago,  # Stopped using > 7 days
             (Persons.reengagement_reminder_sent == False) | (Persons.reengagement_reminder_sent == None),
-            (Persons.bot_blocked == False) | (Persons.bot_blocked == None)
+            Persons.bot_blocked == False
         )
         result = await db.execute(stmt)
         users = result.scalars().all()
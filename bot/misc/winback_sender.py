@@ -5,6 +5,7 @@ Win-back автоматическая рассылка промокодов.
 """
 import asyncio
 import logging
+import time
 from typing import Optional
 
 from aiogram import Bot
@@ -12,10 +13,11 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from bot.database.methods.winback import (
     get_all_winback_promos,
-    get_churned_users_by_segment,
-    get_new_users_for_welcome_promo,
+    count_segment_users,
+    iter_segment_users,
     create_promo_usage,
-    get_promo_statistics
+    get_promo_statistics,
+    invalidate_churned_users_stats
 )
 from bot.misc.util import CONFIG
 
@@ -39,6 +41,7 @@ async def mark_user_bot_blocked(user_tgid: int):
                 )
             )
             await db.commit()
+            invalidate_churned_users_stats()
             log.info(f"[Winback] Marked user {user_tgid} as bot_blocked")
     except Exception as e:
         log.error(f"[Winback] Failed to mark user {user_tgid} as bot_blocked: {e}")
@@ -166,6 +169,8 @@ async def winback_autosend(bot: Bot):
         total_sent = 0
         total_errors = 0
         results_by_promo = {}
+        # Единый момент отсчёта для всех сегментов рассылки
+        current_time = int(time.time())
 
         for promo in auto_promos:
             promo_type = getattr(promo, 'promo_type', 'winback') or 'winback'
@@ -174,33 +179,23 @@ async def winback_autosend(bot: Bot):
                 delay_days = getattr(promo, 'delay_days', 0) or 0
                 log.info(f"[Winback] Processing WELCOME promo '{promo.code}' "
                          f"(discount: {promo.discount_percent}%, delay: {delay_days} days)")
-                # Для welcome - новые пользователи (retention=0)
-                users = await get_new_users_for_welcome_promo(
-                    exclude_already_sent_promo_id=promo.id,
-                    delay_days=delay_days
-                )
             else:
                 log.info(f"[Winback] Processing promo '{promo.code}' "
                          f"(segment: {promo.min_days_expired}-{promo.max_days_expired} days, "
                          f"discount: {promo.discount_percent}%)")
-                # Для winback - ушедшие пользователи
-                users = await get_churned_users_by_segment(
-                    min_days=promo.min_days_expired,
-                    max_days=promo.max_days_expired,
-                    exclude_already_sent_promo_id=promo.id
-                )
-
-            if not users:
-                log.info(f"[Winback] No users for promo '{promo.code}'")
-                results_by_promo[promo.code] = {'sent': 0, 'errors': 0, 'users_in_segment': 0}
-                continue
 
-            log.info(f"[Winback] Found {len(users)} users for promo '{promo.code}'")
+            # Welcome - новые пользователи (retention=0), winback - ушедшие.
+            # Сегмент может быть большим, поэтому читаем его пачками по tgid,
+            # не держа соединение во время отправки
+            users = iter_segment_users(promo, current_time)
 
+            users_in_segment = 0
             sent_count = 0
             error_count = 0
 
-            for user in users:
+            async for user in users:
+                users_in_segment += 1
+
                 # Создать запись об отправке
                 usage = await create_promo_usage(
                     promo_id=promo.id,
@@ -233,12 +228,16 @@ async def winback_autosend(bot: Bot):
                 # Небольшая задержка между отправками
                 await asyncio.sleep(0.05)
 
+            if not users_in_segment:
+                log.info(f"[Winback] No users for promo '{promo.code}'")
+
             results_by_promo[promo.code] = {
                 'sent': sent_count,
                 'errors': error_count,
-                'users_in_segment': len(users)
+                'users_in_segment': users_in_segment
             }
-            log.info(f"[Winback] Promo '{promo.code}': sent {sent_count}, errors {error_count}")
+            log.info(f"[Winback] Promo '{promo.code}': {users_in_segment} users in segment, "
+                     f"sent {sent_count}, errors {error_count}")
 
         # Итоговый лог
         log.info(f"[Winback] Automatic distribution completed: "
@@ -296,14 +295,11 @@ async def manual_send_promo_to_segment(
     if not promo:
         return {'success': False, 'error': 'Промокод не найден'}
 
-    # Получить пользователей в сегменте
-    users = await get_churned_users_by_segment(
-        min_days=promo.min_days_expired,
-        max_days=promo.max_days_expired,
-        exclude_already_sent_promo_id=promo.id
-    )
+    # Размер сегмента - одним COUNT(*), сами пользователи читаются пачками
+    current_time = int(time.time())
+    users_count = await count_segment_users(promo, current_time)
 
-    if not users:
+    if not users_count:
         return {'success': True, 'sent': 0, 'errors': 0, 'message': 'Нет пользователей в сегменте'}
 
     # Отправить уведомление о начале
@@ -311,7 +307,7 @@ async def manual_send_promo_to_segment(
         await bot.send_message(
             admin_tgid,
             f"🚀 Начинаю рассылку промокода <code>{promo.code}</code>...\n"
-            f"👥 Пользователей в сегменте: {len(users)}",
+            f"👥 Пользователей в сегменте: {users_count}",
             parse_mode="HTML"
         )
     except:
@@ -320,7 +316,7 @@ async def manual_send_promo_to_segment(
     sent_count = 0
     error_count = 0
 
-    for user in users:
+    async for user in iter_segment_users(promo, current_time):
         # Создать запись об отправке
         usage = await create_promo_usage(
             promo_id=promo.id,
@@ -352,5 +348,5 @@ async def manual_send_promo_to_segment(
         'success': True,
         'sent': sent_count,
         'errors': error_count,
-        'total_users': len(users)
+        'total_users': users_count
     }
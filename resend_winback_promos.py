@@ -56,7 +56,7 @@ async def resend_unused_promos():
             ).filter(
                 WinbackPromoUsage.promo_id == promo.id,
                 WinbackPromoUsage.used_at.is_(None),  # Не использовали
-                or_(Persons.bot_blocked == False, Persons.bot_blocked.is_(None)),
+                Persons.bot_blocked == False,
                 or_(Persons.banned == False, Persons.banned.is_(None)),
                 # ИСПРАВЛЕНИЕ: только с истёкшей подпиской
                 or_(Persons.subscription.is_(None), Persons.subscription < current_time)
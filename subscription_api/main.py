@@ -22,7 +22,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from bot.misc.subscription import verify_subscription_token
 from bot.database.methods.get import get_person
-from sqlalchemy import select
+from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from bot.database.main import engine
 from bot.database.models.main import Persons, Servers, SubscriptionLogs
@@ -413,15 +413,15 @@ async def get_stats():
         async with AsyncSession(autoflush=False, bind=engine()) as db:
             # Count active subscriptions
             result = await db.execute(
-                select(Persons).filter(Persons.subscription_active == True)
+                select(func.count()).select_from(Persons).filter(Persons.subscription_active == True)
             )
-            active_count = len(result.scalars().all())
+            active_count = result.scalar()
 
             # Count total subscription logs
             result = await db.execute(
-                select(SubscriptionLogs)
+                select(func.count()).select_from(SubscriptionLogs)
             )
-            total_accesses = len(result.scalars().all())
+            total_accesses = result.scalar()
 
             return {
                 "active_subscriptions": active_count,
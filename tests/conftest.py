@@ -0,0 +1,24 @@
+"""
+Shared pytest setup.
+
+bot.misc.util builds CONFIG at import time and requires the bot's env vars.
+Unit tests do not need real credentials, so missing variables are taken from
+.env-example (variables that are already set are not overridden).
+
+Tests that need PostgreSQL run only when TEST_DATABASE_URL is set, e.g.
+TEST_DATABASE_URL=postgresql+asyncpg://postgres@localhost:5432/vpn_bot_test
+The database is recreated from the models, so never point it at production.
+"""
+import os
+import sys
+
+from dotenv import load_dotenv
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+load_dotenv(os.path.join(ROOT, '.env-example'))
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+if TEST_DATABASE_URL:
+    import bot.database.main as db_main
+    db_main.ENGINE = TEST_DATABASE_URL
@@ -0,0 +1,84 @@
+"""
+Tests for admin inline menu branches (bot/handlers/admin/main.py: admin_menu_navigation)
+that used to fail at runtime on wrong names: the group name state,
+the static users count and the two traffic statistics screens.
+"""
+import asyncio
+from types import SimpleNamespace
+
+from bot.handlers.admin import main as admin_main
+from bot.handlers.admin.group_mangment import Group
+from bot.misc.callbackData import AdminMenuNav
+
+
+class FakeState:
+    def __init__(self):
+        self.states = []
+
+    async def set_state(self, state):
+        self.states.append(state)
+
+
+class FakeMessage:
+    def __init__(self):
+        self.texts = []
+
+    async def edit_text(self, text, **kwargs):
+        self.texts.append(text)
+
+
+async def noop(*args, **kwargs):
+    pass
+
+
+def navigate(menu, action):
+    message = FakeMessage()
+    state = FakeState()
+    call = SimpleNamespace(message=message, from_user=SimpleNamespace(id=1), answer=noop)
+    asyncio.run(admin_main.admin_menu_navigation(
+        call, AdminMenuNav(menu=menu, action=action), state, 'ru'
+    ))
+    return message.texts, state.states
+
+
+def test_add_group_waits_for_group_name():
+    texts, states = navigate('groups', 'add')
+    assert states == [Group.name_input]
+    assert len(texts) == 1
+
+
+def test_static_users_are_counted(monkeypatch):
+    async def get_all_static_user():
+        return [object(), object(), object()]
+    monkeypatch.setattr(admin_main, 'get_all_static_user', get_all_static_user)
+
+    texts, _ = navigate('static_users', 'show')
+    assert texts == ['📌 Статических пользователей: 3']
+
+
+def test_traffic_statistics_and_bypass_traffic(monkeypatch):
+    async def get_traffic_statistics(use_offset):
+        return {
+            'users_with_traffic': 2,
+            'total_traffic': 3 * 1024 ** 3,
+            'avg_traffic': 1536 * 1024 ** 2,
+            'top_users': [{'username': 'alice', 'tgid': 1, 'traffic': 2048}],
+        }
+
+    async def get_all_bypass_traffic():
+        return {10: 5 * 1024 ** 2}
+
+    async def get_bypass_servers():
+        return [object()]
+    monkeypatch.setattr(admin_main, 'get_traffic_statistics', get_traffic_statistics)
+    monkeypatch.setattr(admin_main, 'get_all_bypass_traffic', get_all_bypass_traffic)
+    monkeypatch.setattr(admin_main, 'get_bypass_servers', get_bypass_servers)
+
+    texts, _ = navigate('show_users', 'traffic_current')
+    assert '📈 Общий трафик: 3.00 GB' in texts[0]
+    assert '1. @alice: 2.00 KB' in texts[0]
+
+    # The bypass screen uses the module-level format_bytes in the same function
+    texts, _ = navigate('show_users', 'traffic_bypass')
+    assert 'Ошибка' not in texts[0]
+    assert 'ID:10' in texts[0]
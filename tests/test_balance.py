@@ -0,0 +1,38 @@
+"""
+Tests for balance debits (bot/database/methods/update.py: reduce_balance_person).
+Runs only when TEST_DATABASE_URL is set.
+"""
+import asyncio
+import os
+
+import pytest
+
+pytestmark = pytest.mark.skipif(
+    not os.getenv('TEST_DATABASE_URL'), reason='TEST_DATABASE_URL is not set'
+)
+
+
+def test_concurrent_debits_never_overdraw():
+    from sqlalchemy import delete
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from bot.database.main import engine
+    from bot.database.methods.get import get_person
+    from bot.database.methods.update import reduce_balance_person
+    from bot.database.models.main import Persons, create_all_table
+
+    async def main():
+        await create_all_table()
+        async with AsyncSession(autoflush=False, bind=engine()) as db:
+            await db.execute(delete(Persons).where(Persons.tgid == 7000))
+            db.add(Persons(tgid=7000, banned=False, balance=100))
+            await db.commit()
+
+        results = await asyncio.gather(*(reduce_balance_person(30, 7000) for _ in range(5)))
+        assert results.count(True) == 3
+        assert (await get_person(7000)).balance == 10
+        # Unknown user: nothing to debit
+        assert await reduce_balance_person(1, 7999) is False
+        await engine().dispose()
+
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+"""
+Tests for the shared Telegram rate limiter (bot/misc/broadcast.py)
+"""
+import asyncio
+import time
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from bot.misc import broadcast
+
+
+@pytest.fixture(autouse=True)
+def fresh_limiter(monkeypatch):
+    # A fresh limiter per test, so its lock is not bound to another event loop
+    monkeypatch.setattr(broadcast, 'telegram_limiter', broadcast.RateLimiter(10_000))
+
+
+def retry_after(seconds):
+    return TelegramRetryAfter(
+        method=SendMessage(chat_id=1, text='x'),
+        message='Too Many Requests',
+        retry_after=seconds
+    )
+
+
+def test_retry_after_is_waited_and_retried(monkeypatch):
+    calls = []
+    sleeps = []
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+        await real_sleep(0)
+    monkeypatch.setattr(broadcast.asyncio, 'sleep', fake_sleep)
+
+    async def send(chat_id, text):
+        calls.append(chat_id)
+        if len(calls) < 3:
+            raise retry_after(7)
+
+    assert asyncio.run(broadcast.send_limited(send, 42, text='hi')) is True
+    assert calls == [42, 42, 42]
+    assert sleeps.count(7) == 2
+
+
+def test_other_errors_are_not_retried():
+    calls = []
+
+    async def send(chat_id, text):
+        calls.append(chat_id)
+        raise RuntimeError('Forbidden: bot was blocked by the user')
+
+    assert asyncio.run(broadcast.send_limited(send, 42, text='hi')) is False
+    assert calls == [42]
+
+
+def test_rate_limiter_spaces_calls():
+    limiter = broadcast.RateLimiter(50)  # one call per 20 ms
+    stamps = []
+
+    async def main():
+        async def tick():
+            async with limiter:
+                stamps.append(time.monotonic())
+        await asyncio.gather(*(tick() for _ in range(6)))
+
+    asyncio.run(main())
+    stamps.sort()
+    # 6 calls -> 5 intervals of at least ~20 ms
+    assert stamps[-1] - stamps[0] >= 5 * 0.02 * 0.9
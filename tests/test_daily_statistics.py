@@ -0,0 +1,45 @@
+"""
+Tests for the daily statistics upsert (bot/database/methods/insert.py: crate_or_update_stats).
+Runs only when TEST_DATABASE_URL is set.
+"""
+import asyncio
+import os
+from datetime import date
+
+import pytest
+
+pytestmark = pytest.mark.skipif(
+    not os.getenv('TEST_DATABASE_URL'), reason='TEST_DATABASE_URL is not set'
+)
+
+
+def test_second_write_of_a_day_updates_the_row():
+    from sqlalchemy import delete, select
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from bot.database.main import engine
+    from bot.database.methods.insert import crate_or_update_stats
+    from bot.database.models.main import DailyStatistics, create_all_table
+
+    day = date(2026, 1, 2)
+
+    async def main():
+        await create_all_table()
+        async with AsyncSession(autoflush=False, bind=engine()) as db:
+            await db.execute(delete(DailyStatistics).where(DailyStatistics.date == day))
+            await db.commit()
+
+        # False - the row for the day was created, True - it existed and was updated
+        assert await crate_or_update_stats(day, 1, 2, 3, 4, 5, 6, 7) is False
+        assert await crate_or_update_stats(day, 10, 20, 30, 40, 50, 60, 70) is True
+
+        async with AsyncSession(autoflush=False, bind=engine()) as db:
+            rows = (await db.execute(
+                select(DailyStatistics).where(DailyStatistics.date == day)
+            )).scalars().all()
+        assert len(rows) == 1
+        assert rows[0].today_active_persons_count == 10
+        assert rows[0].referral_balance_sum == 70
+        await engine().dispose()
+
+    asyncio.run(main())
@@ -0,0 +1,151 @@
+"""
+Tests for the background mailing worker (bot/misc/mailing_worker.py)
+
+The claim -> send -> mark flow runs against an in-memory queue; the last test
+repeats it on PostgreSQL through the real mailing_jobs/mailing_targets methods
+when TEST_DATABASE_URL is set.
+"""
+import asyncio
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from bot.database.models.main import MailingTargets
+from bot.misc import broadcast, mailing_worker
+
+
+class Crash(BaseException):
+    """Process dies mid-send: not an Exception, so send_limited does not swallow it"""
+
+
+class FakeQueue:
+    """In-memory mailing_targets for one job"""
+
+    def __init__(self, tgids):
+        self.status = {tgid: MailingTargets.PENDING for tgid in tgids}
+        self.finished = False
+
+    async def get_pending(self, job_id, limit):
+        pending = sorted(t for t, s in self.status.items() if s == MailingTargets.PENDING)
+        return pending[:limit]
+
+    async def set_status(self, job_id, tgids, status):
+        for tgid in tgids:
+            self.status[tgid] = status
+
+    async def finish(self, job_id):
+        self.finished = True
+
+    async def counts(self, job_id):
+        values = list(self.status.values())
+        return SimpleNamespace(
+            total=len(values),
+            sent=values.count(MailingTargets.SENT),
+            failed=values.count(MailingTargets.FAILED),
+        )
+
+
+class FakeBot:
+    def __init__(self, fail=(), crash_after=None):
+        self.sent = []
+        self.fail = set(fail)
+        self.crash_after = crash_after
+
+    async def send_message(self, chat_id, **kwargs):
+        if self.crash_after is not None and len(self.sent) >= self.crash_after:
+            raise Crash()
+        if chat_id in self.fail:
+            raise RuntimeError('bot was blocked by the user')
+        self.sent.append(chat_id)
+
+
+def make_job():
+    return SimpleNamespace(
+        id=1, option='all', server_id=None, vpn_type=None, text='hello',
+        photo_file_id=None, created_by=1, lang='ru', progress_message_id=None,
+    )
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    queue = FakeQueue(range(1000, 1130))
+    monkeypatch.setattr(mailing_worker, 'get_pending_mailing_tgids', queue.get_pending)
+    monkeypatch.setattr(mailing_worker, 'mailing_targets_set_status', queue.set_status)
+    monkeypatch.setattr(mailing_worker, 'mailing_job_finish', queue.finish)
+    monkeypatch.setattr(mailing_worker, 'get_mailing_job_counts', queue.counts)
+
+    async def no_result(bot, job):
+        pass
+    monkeypatch.setattr(mailing_worker, '_send_result', no_result)
+    # A fresh limiter per test: no pacing, and its lock is not bound
+    # to the event loop of a previous test
+    monkeypatch.setattr(broadcast, 'telegram_limiter', broadcast.RateLimiter(10_000))
+    return queue
+
+
+def test_every_target_is_sent_once_and_marked(queue):
+    bot = FakeBot(fail={1005, 1100})
+    asyncio.run(mailing_worker.run_mailing_job(bot, make_job()))
+
+    assert sorted(bot.sent) == [t for t in range(1000, 1130) if t not in (1005, 1100)]
+    assert queue.status[1005] == queue.status[1100] == MailingTargets.FAILED
+    assert list(queue.status.values()).count(MailingTargets.SENT) == 128
+    assert queue.finished
+
+
+def test_crash_repeats_at_most_one_batch(queue):
+    # The process dies in the middle of the third batch
+    crash_at = mailing_worker.BATCH_SIZE * 2 + 10
+    bot = FakeBot(crash_after=crash_at)
+    with pytest.raises(Crash):
+        asyncio.run(mailing_worker.run_mailing_job(bot, make_job()))
+    assert not queue.finished
+    delivered_before_crash = set(bot.sent)
+    marked = {t for t, s in queue.status.items() if s == MailingTargets.SENT}
+    assert marked == set(sorted(delivered_before_crash)[:mailing_worker.BATCH_SIZE * 2])
+
+    # Restart: the job resumes from the targets that were not marked
+    restarted = FakeBot()
+    asyncio.run(mailing_worker.run_mailing_job(restarted, make_job()))
+    repeated = delivered_before_crash & set(restarted.sent)
+    assert len(repeated) <= mailing_worker.BATCH_SIZE
+    assert delivered_before_crash | set(restarted.sent) == set(range(1000, 1130))
+    assert queue.finished
+
+
+@pytest.mark.skipif(not os.getenv('TEST_DATABASE_URL'), reason='TEST_DATABASE_URL is not set')
+def test_mailing_job_on_postgres(monkeypatch):
+    from sqlalchemy import delete
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from bot.database.main import engine
+    from bot.database.methods.get import get_mailing_job_counts, get_unfinished_mailing_jobs
+    from bot.database.methods.insert import add_mailing_job
+    from bot.database.models.main import MailingJobs, Persons, create_all_table
+
+    async def no_result(bot, job):
+        pass
+    monkeypatch.setattr(mailing_worker, '_send_result', no_result)
+
+    async def main():
+        await create_all_table()
+        async with AsyncSession(autoflush=False, bind=engine()) as db:
+            await db.execute(delete(MailingJobs))
+            await db.execute(delete(Persons).where(Persons.tgid.between(5000, 5199)))
+            db.add_all(Persons(tgid=tgid, banned=False) for tgid in range(5000, 5120))
+            await db.commit()
+
+        job_id, count = await add_mailing_job('all', None, None, 'hello', None, 1, 'ru')
+        assert count >= 120
+        bot = FakeBot(fail={5007})
+        for job in await get_unfinished_mailing_jobs():
+            await mailing_worker.run_mailing_job(bot, job)
+
+        counts = await get_mailing_job_counts(job_id)
+        assert (counts.total, counts.sent, counts.failed) == (count, count - 1, 1)
+        assert len(bot.sent) == len(set(bot.sent)) == count - 1
+        assert await get_unfinished_mailing_jobs() == []
+        await engine().dispose()
+
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+"""
+Tests for batched withdrawal application messages
+(bot/handlers/admin/referal_admin.py: callback_work_server, callback_success_application)
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from bot.handlers.admin import referal_admin
+from bot.misc import broadcast
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, **kwargs):
+        self.sent.append(kwargs)
+
+
+async def noop(*args, **kwargs):
+    pass
+
+
+def application(i, paid=False, payment_info='card'):
+    return SimpleNamespace(
+        id=i, check_payment=paid, amount=100, payment_info=payment_info,
+        communication='@user', user_tgid=5000 + i
+    )
+
+
+def make_call(bot):
+    return SimpleNamespace(
+        bot=bot,
+        message=SimpleNamespace(chat=SimpleNamespace(id=77), message_id=9, answer=noop),
+        answer=noop
+    )
+
+
+@pytest.fixture(autouse=True)
+def fresh_limiter(monkeypatch):
+    monkeypatch.setattr(broadcast, 'telegram_limiter', broadcast.RateLimiter(10_000))
+
+
+def run_work_server(monkeypatch, applications):
+    async def get_all():
+        return applications
+    monkeypatch.setattr(referal_admin, 'get_all_application_referral', get_all)
+    bot = FakeBot()
+    asyncio.run(referal_admin.callback_work_server(
+        make_call(bot), SimpleNamespace(type=True), None, 'ru'
+    ))
+    return bot.sent
+
+
+def paid_buttons(markup):
+    return [row[0].text for row in markup.inline_keyboard][:-1]
+
+
+def test_applications_are_batched_in_order(monkeypatch):
+    sent = run_work_server(monkeypatch, [application(i, paid=i % 3 == 0) for i in range(25)])
+
+    assert [m['text'].count(referal_admin.APPLICATIONS_SEPARATOR) + 1 for m in sent] == [10, 10, 5]
+    # One "paid" button per unpaid application of the batch, in id order
+    first = paid_buttons(sent[0]['reply_markup'])
+    assert [int(text.rsplit('№', 1)[1]) for text in first] == [1, 2, 4, 5, 7, 8]
+    assert sent[2]['reply_markup'].inline_keyboard[-1][0].text == '⬅️ Назад'
+
+
+def test_batch_respects_message_length(monkeypatch):
+    sent = run_work_server(
+        monkeypatch, [application(i, payment_info='x' * 1500) for i in range(5)]
+    )
+    assert len(sent) > 1
+    assert all(len(m['text']) <= referal_admin.MESSAGE_MAX_LENGTH for m in sent)
+
+
+def test_fully_paid_batch_has_no_keyboard(monkeypatch):
+    sent = run_work_server(monkeypatch, [application(i, paid=True) for i in range(3)])
+    assert len(sent) == 1
+    assert sent[0]['reply_markup'] is None
+
+
+def test_paid_button_is_removed_from_batch(monkeypatch):
+    sent = run_work_server(monkeypatch, [application(i) for i in range(3)])
+    markup = sent[0]['reply_markup']
+    pressed = markup.inline_keyboard[1][0].callback_data
+    edited = []
+
+    async def edit_reply_markup(reply_markup):
+        edited.append(reply_markup)
+    monkeypatch.setattr(referal_admin, 'succes_aplication', noop)
+    call = SimpleNamespace(
+        data=pressed,
+        message=SimpleNamespace(reply_markup=markup, answer=noop, edit_reply_markup=edit_reply_markup),
+        answer=noop
+    )
+    asyncio.run(referal_admin.callback_success_application(
+        call, SimpleNamespace(id_application=1, mes_id=9), None, 'ru'
+    ))
+    assert [int(text.rsplit('№', 1)[1]) for text in paid_buttons(edited[0])] == [0, 2]
@@ -0,0 +1,146 @@
+"""
+Tests for the cached panel sessions (bot/misc/VPN/ServerManagerPool.py)
+with a fake ServerManager instead of a real panel.
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from bot.misc.VPN import ServerManagerPool as pool
+
+
+class FakeManager:
+    """Counts logins and closes; get_all_user answers from a per-test script"""
+    created = []
+
+    def __init__(self, server):
+        self.server = server
+        self.logins = 0
+        self.closed = False
+        self.calls = 0
+        FakeManager.created.append(self)
+
+    async def login(self):
+        self.logins += 1
+        if self.server.ip == 'bad':
+            raise RuntimeError('login failed')
+
+    async def close(self):
+        self.closed = True
+
+    async def get_all_user(self):
+        self.calls += 1
+        return self.server.answers.pop(0) if self.server.answers else ['client']
+
+
+def server(server_id, ip='10.0.0.1', answers=None):
+    return SimpleNamespace(
+        id=server_id, type_vpn=1, ip=ip, panel='3x-ui', login='admin', password='secret',
+        inbound_id=1, connection_method=None, outline_link=None, answers=list(answers or []),
+    )
+
+
+@pytest.fixture(autouse=True)
+def fake_pool(monkeypatch):
+    FakeManager.created = []
+    monkeypatch.setattr(pool, 'ServerManager', FakeManager)
+    monkeypatch.setattr(pool, '_managers', {})
+    monkeypatch.setattr(pool, '_locks', {})
+    monkeypatch.setattr(pool, '_users', {})
+
+
+def test_cache_hit_reuses_the_manager():
+    async def main():
+        srv = server(1)
+        async with pool.get_manager(srv) as first:
+            pass
+        assert await pool.call(srv, 'get_all_user') == ['client']
+        async with pool.get_manager(srv) as second:
+            pass
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first is second
+    assert len(FakeManager.created) == 1
+    assert first.logins == 1
+
+
+@pytest.mark.parametrize('failed', [None, False])
+def test_failed_call_relogins_and_retries_once(failed):
+    srv = server(1, answers=[failed, ['client']])
+    assert asyncio.run(pool.call(srv, 'get_all_user')) == ['client']
+
+    old, new = FakeManager.created
+    assert old.closed and not new.closed
+    assert (old.calls, new.calls) == (1, 1)
+    assert new.logins == 1
+
+
+def test_retry_happens_only_once():
+    srv = server(1, answers=[None, None, ['client']])
+    assert asyncio.run(pool.call(srv, 'get_all_user')) is None
+    assert len(FakeManager.created) == 2
+    assert sum(m.calls for m in FakeManager.created) == 2
+
+
+def test_ttl_expiry_closes_the_evicted_session():
+    async def main():
+        srv = server(1)
+        await pool.call(srv, 'get_all_user')
+        key = pool._server_key(srv)
+        created, manager = pool._managers[key]
+        pool._managers[key] = (created - pool.MANAGER_TTL - 1, manager)
+        await pool.call(srv, 'get_all_user')
+        return manager, pool._managers[key][1]
+
+    expired, current = asyncio.run(main())
+    assert expired.closed
+    assert current is not expired and not current.closed
+
+
+def test_full_cache_evicts_and_closes_the_oldest(monkeypatch):
+    monkeypatch.setattr(pool, 'MANAGER_MAXSIZE', 2)
+
+    async def main():
+        for server_id in (1, 2, 3):
+            await pool.call(server(server_id), 'get_all_user')
+            await asyncio.sleep(0)
+
+    asyncio.run(main())
+    first, second, third = FakeManager.created
+    assert first.closed and not second.closed and not third.closed
+    assert len(pool._managers) == 2
+
+
+def test_failed_login_closes_the_session_and_leaves_no_lock():
+    with pytest.raises(RuntimeError):
+        asyncio.run(pool.call(server(1, ip='bad'), 'get_all_user'))
+    assert FakeManager.created[0].closed
+    assert pool._managers == {} and pool._locks == {} and pool._users == {}
+
+
+def test_close_all_leaves_no_locks_or_managers():
+    async def main():
+        async def hold(server_id):
+            async with pool.get_manager(server(server_id)):
+                await asyncio.sleep(0.01)
+        await asyncio.gather(*(hold(i) for i in range(5)), hold(0))
+        assert len(pool._managers) == len(pool._locks) == 5
+        await pool.close_all()
+
+    asyncio.run(main())
+    assert all(m.closed for m in FakeManager.created)
+    assert pool._managers == {} and pool._locks == {} and pool._users == {}
+
+
+def test_fresh_manager_is_not_cached_and_is_closed():
+    async def main():
+        async with pool.fresh_manager(server(1)) as manager:
+            assert not manager.closed
+        return manager
+
+    manager = asyncio.run(main())
+    assert manager.closed
+    assert pool._managers == {}
+
@@ -0,0 +1,61 @@
+"""
+Tests for the keyboard cache (bot/keyboards/inline/admin_inline.py: static_markup)
+"""
+import asyncio
+
+from aiogram.types import InlineKeyboardButton
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from bot.keyboards.inline.admin_inline import admin_back_inline_menu, static_markup
+
+
+def make_menu():
+    builds = []
+
+    @static_markup
+    async def menu(back_to, lang='ru'):
+        builds.append((back_to, lang))
+        kb = InlineKeyboardBuilder()
+        kb.button(text=f'{back_to}:{lang}', callback_data='x')
+        return kb.as_markup()
+
+    return menu, builds
+
+
+def test_positional_and_keyword_calls_share_one_entry():
+    menu, builds = make_menu()
+
+    async def main():
+        await menu('main')
+        await menu('main', 'ru')
+        await menu('main', lang='ru')
+        await menu(back_to='main', lang='ru')
+        await menu('main', lang='en')
+
+    asyncio.run(main())
+    assert builds == [('main', 'ru'), ('main', 'en')]
+
+
+def test_callers_can_mutate_their_copy():
+    menu, _ = make_menu()
+
+    async def main():
+        first = await menu('main')
+        first.inline_keyboard.append([InlineKeyboardButton(text='extra', callback_data='y')])
+        first.inline_keyboard[0][0].text = 'changed'
+        return await menu('main')
+
+    second = asyncio.run(main())
+    assert [[b.text for b in row] for row in second.inline_keyboard] == [['main:ru']]
+
+
+def test_admin_keyboard_accepts_keywords():
+    async def main():
+        return (
+            await admin_back_inline_menu('main', 'ru'),
+            await admin_back_inline_menu(back_to='main', lang='ru'),
+        )
+
+    positional, keyword = asyncio.run(main())
+    assert positional == keyword
+    assert positional is not keyword
@@ -0,0 +1,74 @@
+"""
+Tests for win-back segment selection (bot/database/methods/winback.py):
+COUNT(*) of a segment and keyset iteration over it, for both promo types.
+Runs only when TEST_DATABASE_URL is set.
+"""
+import asyncio
+import os
+import time
+
+import pytest
+
+pytestmark = pytest.mark.skipif(
+    not os.getenv('TEST_DATABASE_URL'), reason='TEST_DATABASE_URL is not set'
+)
+
+
+def test_segment_count_and_iteration(monkeypatch):
+    from sqlalchemy import delete
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from bot.database.main import engine
+    from bot.database.methods import winback
+    from bot.database.models.main import Persons, WinbackPromo, WinbackPromoUsage, create_all_table
+
+    # Small pages, so the iterator has to follow the keyset several times
+    monkeypatch.setattr(winback, 'SEGMENT_BATCH_LIMIT', 7)
+    now = int(time.time())
+
+    async def main():
+        await create_all_table()
+        async with AsyncSession(autoflush=False, bind=engine()) as db:
+            await db.execute(delete(WinbackPromoUsage))
+            await db.execute(delete(WinbackPromo).where(WinbackPromo.code.in_(['TESTHOT', 'TESTNEW'])))
+            await db.execute(delete(Persons).where(Persons.tgid.between(6000, 6099)))
+            churned = WinbackPromo(
+                code='TESTHOT', discount_percent=10, promo_type='winback',
+                min_days_expired=0, max_days_expired=30
+            )
+            welcome = WinbackPromo(code='TESTNEW', discount_percent=10, promo_type='welcome', delay_days=0)
+            db.add_all([churned, welcome])
+            # Odd tgids bought before (churned), even ones never did (welcome)
+            db.add_all(
+                Persons(
+                    tgid=6000 + i, banned=False, bot_blocked=False,
+                    subscription=now - (i + 1) * 3600, retention=i % 2
+                )
+                for i in range(40)
+            )
+            await db.commit()
+            await db.refresh(churned)
+            await db.refresh(welcome)
+
+        async def segment(promo):
+            users = [p.tgid async for p in winback.iter_segment_users(promo, now)]
+            return [t for t in users if 6000 <= t < 6100]
+
+        churned_tgids = await segment(churned)
+        welcome_tgids = await segment(welcome)
+        assert churned_tgids == list(range(6001, 6040, 2))
+        assert welcome_tgids == list(range(6000, 6040, 2))
+        assert await winback.count_segment_users(churned, now) >= len(churned_tgids)
+
+        # The bounded getter returns one page
+        page = await winback.get_churned_users_by_segment(0, 30, current_time=now, limit=5)
+        assert len(page) <= 5
+
+        # Users who already got the promo drop out of both count and iteration
+        before = await winback.count_segment_users(churned, now)
+        await winback.create_promo_usage(promo_id=churned.id, user_tgid=6001, valid_days=7)
+        assert await winback.count_segment_users(churned, now) == before - 1
+        assert 6001 not in await segment(churned)
+        await engine().dispose()
+
+    asyncio.run(main())